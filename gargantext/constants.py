@@ -373,6 +373,14 @@ DETECT_LANG = False
 # Defaults INDEXED Fields for ngrams extraction
 # put longest field first in order to make detection language more efficient
 DEFAULT_INDEX_FIELDS            = ('abstract','title' )
+# also keep a full-text vector of these fields for each doc
+# (table nodes_tsvectors, cf. dbmigrate.py) => faster indexing of new ngrams
+TSVECTOR_INDEXING               = False
+# keep the MElt preprocessing scripts running between texts instead of
+# one run per text (check it with the installed MElt version first!)
+MELT_PIPELINES                  = False
+MELT_PIPELINE_TIMEOUT           = 60         # seconds for a text to come back
+                                             # (else one run per text again)
 # Grammar rules for chunking
 RULE_JJNN   = "{<JJ.*>*<NN.*|>+<JJ.*>*}"
 RULE_JJDTNN = "{<JJ.*>*<NN.*>+((<P|IN> <DT>? <JJ.*>* <NN.*>+ <JJ.*>*)|(<JJ.*>))*}"
@@ -397,7 +405,19 @@ DOWNLOAD_DIRECTORY = UPLOAD_DIRECTORY
 # Processing -----------------------------------------------------------
 # about batch processing...
 BATCH_PARSING_SIZE          = 256    # how many new docs before db write
+BATCH_INDEXING_SIZE         = 1000   # how many docs fetched at once for hyperdata indexing
 BATCH_NGRAMSEXTRACTION_SIZE = 3000   # how many new node-ngram relations before INTEGRATE
+NGRAMSEXTRACTION_WORKERS    = 1      # how many tagging processes (1 <=> no pool)
+NGRAMSEXTRACTION_CHUNK_SIZE = 64     # how many docs sent at once to a tagging process
+NGRAMS_CACHE_SIZE           = 500000 # how many {terms => id} kept in RAM by a process
+STEMS_CACHE_SIZE            = 200000 # how many {word => stem} kept in RAM per language
+BATCH_GROUPING_SIZE         = 10000  # how many ngrams fetched at once for compute_groups
+BATCH_METRICS_SIZE          = 10000  # how many (doc, ngram form) counts fetched at once for the metrics
+COOC_PARTITION_SIZE         = 10000  # how many docs per partition of the cooc counts
+COOC_WORKERS                = 4      # how many partitions counted at once (<=> db connections)
+COOC_WORK_MEM_MB            = 1024   # postgres work_mem of a cooc count (shared by its connections)
+COOCS_IN_PROCESS            = False  # coocs counted by the worker (sparse Xt.X) instead of SQL
+BATCH_COOCS_PAIRS_SIZE      = 50000  # how many (doc, ngram) pairs fetched at once for the coocs in process
 
 
 # Scrapers config
@@ -421,3 +441,15 @@ graph_constraints = {'corpusMax' : 0
                     ,'corpusMin' : 0
                     ,'mapList'   : 50
                     }
+
+# Graph computations cache (per process) : max number of results per layer
+#   cooc     => cooc matrices (by corpus, dates, lists and threshold)
+#   distance => clustered graphs (+ distance)
+#   json     => node-link data (+ bridgeness)
+GRAPH_CACHE_SIZES = {'cooc'     : 8
+                    ,'distance' : 16
+                    ,'json'     : 64
+                    }
+
+# Community detection (see graph/communities.py): 'csr' or 'networkx'
+GRAPH_COMMUNITY_BACKEND = 'csr'
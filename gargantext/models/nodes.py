@@ -6,7 +6,7 @@ from datetime import datetime
 
 from .users import User
 
-__all__ = ['Node', 'NodeNode']
+__all__ = ['Node', 'NodeNode', 'NodeTsvector']
 
 class NodeType(TypeDecorator):
     """Define a new type of column to describe a Node's type.
@@ -192,3 +192,14 @@ class NodeNode(Base):
     node1_id = Column(Integer, ForeignKey(Node.id, ondelete='CASCADE'), primary_key=True)
     node2_id = Column(Integer, ForeignKey(Node.id, ondelete='CASCADE'), primary_key=True)
     score    = Column(Float(precision=24))
+
+class NodeTsvector(Base):
+    """Full-text vector of the DEFAULT_INDEX_FIELDS of a DOCUMENT node
+    (optional, cf. TSVECTOR_INDEXING and toolchain.tsvector_indexing)
+    """
+    __tablename__ = 'nodes_tsvectors'
+    __table_args__ = (
+        Index('nodes_tsvectors_tsv_idx', 'tsv', postgresql_using='gin'),
+    )
+    node_id = Column(Integer, ForeignKey(Node.id, ondelete='CASCADE'), primary_key=True)
+    tsv     = Column(TSVECTOR)
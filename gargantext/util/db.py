@@ -31,8 +31,8 @@ session = scoped_session(sessionmaker(bind=engine))
 # tools to build models
 ########################################################################
 from sqlalchemy.types import *
-from sqlalchemy.schema import Column, ForeignKey, UniqueConstraint
-from sqlalchemy.dialects.postgresql import JSONB, DOUBLE_PRECISION
+from sqlalchemy.schema import Column, ForeignKey, UniqueConstraint, Index
+from sqlalchemy.dialects.postgresql import JSONB, DOUBLE_PRECISION, TSVECTOR
 from sqlalchemy.ext.mutable import MutableDict, MutableList
 Double = DOUBLE_PRECISION
 
@@ -174,3 +174,89 @@ def bulk_insert_ifnotexists(model, uniquekey, fields, data, cursor=None, do_stat
     cursor.close()
 
 
+def bulk_upsert(model, uniquekeys, fields, data, cursor=None, accumulate=False):
+    """
+    Inserts bulk data, or updates the rows that already exist with the same
+    uniquekeys (ex: ('node1_id', 'node2_id', 'ngram_id') for NodeNodeNgram)
+
+    The data goes through a temporary table (COPY) and then a single
+    INSERT ... ON CONFLICT (postgres >= 9.5)
+
+    Option:
+        accumulate: the new values are added to the previous ones
+                    instead of replacing them (ex: for counts deltas)
+    """
+    if cursor is None:
+        db, cursor = get_cursor()
+        mustcommit = True
+    else:
+        mustcommit = False
+
+    sql_columns = ', '.join(
+        '%s %s' % (field, getattr(model, field).type) for field in fields
+    )
+    cursor.execute('CREATE TEMPORARY TABLE __tmp_upsert__ (%s)' % (sql_columns, ))
+    bulk_insert('__tmp_upsert__', fields, data, cursor=cursor)
+
+    if accumulate:
+        update_template = '{0} = {table}.{0} + EXCLUDED.{0}'
+    else:
+        update_template = '{0} = EXCLUDED.{0}'
+
+    cursor.execute('''
+        INSERT INTO {table} ({columns})
+        SELECT {columns}
+        FROM __tmp_upsert__
+        ON CONFLICT ({keys}) DO UPDATE SET {updates}
+    '''.format(
+        table = model.__tablename__,
+        columns = ', '.join(fields),
+        keys = ', '.join(uniquekeys),
+        updates = ', '.join(
+            update_template.format(field, table=model.__tablename__)
+            for field in fields if field not in uniquekeys
+        ),
+    ))
+    cursor.execute('DROP TABLE __tmp_upsert__')
+    if mustcommit:
+        db.commit()
+
+
+def bulk_insert_ignore(model, uniquekeys, fields, data, cursor=None):
+    """
+    Inserts bulk data but skips the rows that already exist with the same
+    uniquekeys (ex: ('node_id', 'ngram_id') for NodeNgram)
+
+    The data goes through a temporary table (COPY) and then a single
+    INSERT ... ON CONFLICT DO NOTHING (postgres >= 9.5)
+
+    Returns the number of rows really inserted
+    """
+    if cursor is None:
+        db, cursor = get_cursor()
+        mustcommit = True
+    else:
+        mustcommit = False
+
+    sql_columns = ', '.join(
+        '%s %s' % (field, getattr(model, field).type) for field in fields
+    )
+    cursor.execute('CREATE TEMPORARY TABLE __tmp_ignore__ (%s)' % (sql_columns, ))
+    bulk_insert('__tmp_ignore__', fields, data, cursor=cursor)
+
+    cursor.execute('''
+        INSERT INTO {table} ({columns})
+        SELECT {columns}
+        FROM __tmp_ignore__
+        ON CONFLICT ({keys}) DO NOTHING
+    '''.format(
+        table = model.__tablename__,
+        columns = ', '.join(fields),
+        keys = ', '.join(uniquekeys),
+    ))
+    n_inserted = cursor.rowcount
+    cursor.execute('DROP TABLE __tmp_ignore__')
+    if mustcommit:
+        db.commit()
+
+    return n_inserted
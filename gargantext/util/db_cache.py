@@ -4,9 +4,11 @@ keys, without querying the database.
 """
 
 from sqlalchemy import or_
+from collections import OrderedDict
 
 from gargantext.util.db import *
 from gargantext import models
+from gargantext.constants import NGRAMS_CACHE_SIZE
 
 
 class ModelCache(dict):
@@ -69,3 +71,74 @@ class Cache:
             setattr(cache, modelname, new_modelcache)
 
 cache = Cache()
+
+
+class NgramsIdsCache(OrderedDict):
+    """
+    Process-level LRU dict {terms => ngram_id} in front of the ngrams table
+
+    Used to avoid bulk_insert_ifnotexists (temporary table + lock on the
+    whole ngrams table) for the terms that we already know.
+    """
+
+    def __init__(self, max_size=NGRAMS_CACHE_SIZE):
+        super().__init__()
+        self.max_size = max_size
+
+    def remember(self, terms, ngram_id):
+        self[terms] = ngram_id
+        self.move_to_end(terms)
+        while len(self) > self.max_size:
+            self.popitem(last=False)
+
+    def preload(self, limit=None):
+        """
+        Fills the cache with (at most limit) ngrams from the DB
+        """
+        self.clear()
+        query = session.query(models.Ngram.terms, models.Ngram.id)
+        for terms, ngram_id in query.limit(limit or self.max_size).yield_per(10000):
+            self.remember(terms, ngram_id)
+
+    def ids_ifnotexists(self, ngrams_data, cursor):
+        """
+        Same as bulk_insert_ifnotexists(Ngram, 'terms', ('terms','n'), ...)
+        but only the unseen terms go through the temporary table
+
+        @param ngrams_data   a set like {('single word', 2), ('apple', 1),...}
+        @return              a dict {terms => id}
+        """
+        result = {}
+        unseen = {}
+        for terms, n in ngrams_data:
+            if terms in self:
+                self.move_to_end(terms)
+                result[terms] = self[terms]
+            else:
+                unseen[terms] = n
+
+        # 1) most unseen terms already exist: simple lookup without lock
+        if len(unseen):
+            cursor.execute(
+                "SELECT terms, id FROM ngrams WHERE terms = ANY(%s)",
+                (list(unseen.keys()),)
+            )
+            for terms, ngram_id in cursor.fetchall():
+                result[terms] = ngram_id
+                del unseen[terms]
+
+        # 2) the new ones are really inserted
+        if len(unseen):
+            result.update(bulk_insert_ifnotexists(
+                model = models.Ngram,
+                uniquekey = 'terms',
+                fields = ('terms', 'n'),
+                data = unseen.items(),
+                cursor = cursor,
+            ))
+
+        for terms, ngram_id in result.items():
+            self.remember(terms, ngram_id)
+        return result
+
+ngrams_ids_cache = NgramsIdsCache()
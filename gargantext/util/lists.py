@@ -2,7 +2,7 @@
 """
 
 
-__all__ = ['Translations', 'WeightedMatrix', 'UnweightedList', 'WeightedList', 'WeightedIndex']
+__all__ = ['Translations', 'WeightedMatrix', 'SparseWeightedMatrix', 'UnweightedList', 'WeightedList', 'WeightedIndex']
 
 
 from gargantext.util.db import session, bulk_insert
@@ -10,6 +10,9 @@ from gargantext.util.db import session, bulk_insert
 from collections import defaultdict
 from math import sqrt
 
+import numpy as np
+from scipy import sparse
+
 
 
 class _BaseClass:
@@ -236,6 +239,9 @@ class WeightedMatrix(_BaseClass):
 
     def __radd__(self, other):
         result = NotImplemented
+        if isinstance(other, SparseWeightedMatrix):
+            # (NotImplemented would make python compute other + self)
+            other = WeightedMatrix(other)
         if isinstance(other, WeightedMatrix):
             result = WeightedMatrix()
             for key1, key2, value in self:
@@ -246,6 +252,9 @@ class WeightedMatrix(_BaseClass):
 
     def __rsub__(self, other):
         result = NotImplemented
+        if isinstance(other, SparseWeightedMatrix):
+            # (NotImplemented would make python compute other - self)
+            other = WeightedMatrix(other)
         if isinstance(other, (UnweightedList, WeightedList)):
             result = WeightedMatrix()
             for key1, key2, value in self:
@@ -300,6 +309,226 @@ class WeightedMatrix(_BaseClass):
                 result.items[key1, key2] = value / sqrt(other.items[key1] * other.items[key2])
         return result
 
+    def to_sparse(self):
+        return SparseWeightedMatrix(self)
+
+
+class SparseWeightedMatrix(_BaseClass):
+    """
+    Same as WeightedMatrix (same constructor sources, same operators, same
+    save) but backed by a scipy CSR matrix over a compact index of ngram ids:
+        self.index  : sorted array of the ngram ids (row/col i <=> index[i])
+        self.matrix : NxN csr_matrix of the weights
+
+    The operators are vectorized but give the same results as WeightedMatrix
+    (ex: like there, '+' and '-' between matrices keep only the pairs of the
+    left operand)
+
+    Conversions:
+        WeightedMatrix(sparse_wm)  or  sparse_wm.to_weighted_matrix()
+        SparseWeightedMatrix(wm)   or  wm.to_sparse()
+    """
+
+    def __init__(self, source=None):
+        self.index = np.array([], dtype=np.int64)
+        self.matrix = sparse.csr_matrix((0, 0))
+        if source is None:
+            return
+        elif isinstance(source, int):
+            self.id = source
+            from gargantext.models import NodeNgramNgram
+            query = (session
+                .query(NodeNgramNgram.ngram1_id, NodeNgramNgram.ngram2_id, NodeNgramNgram.weight)
+                .filter(NodeNgramNgram.node_id == source)
+            )
+            self._set_triples(query.all())
+        elif isinstance(source, SparseWeightedMatrix):
+            self.index = source.index.copy()
+            self.matrix = source.matrix.copy()
+        elif isinstance(source, WeightedMatrix):
+            self._set_triples(source)
+        elif hasattr(source, '__iter__'):
+            self._set_triples(source)
+        else:
+            raise TypeError
+
+    def _set_triples(self, triples):
+        """(key1, key2, value) rows => index + matrix
+        (NB: duplicate pairs are summed)
+        """
+        triples = list(triples)
+        keys1 = np.array([row[0] for row in triples], dtype=np.int64)
+        keys2 = np.array([row[1] for row in triples], dtype=np.int64)
+        values = np.array([row[2] for row in triples], dtype=np.float64)
+        self._set_arrays(keys1, keys2, values)
+
+    def _set_arrays(self, keys1, keys2, values, index=None):
+        if index is None:
+            index = np.union1d(keys1, keys2)
+        self.index = index
+        n = len(index)
+        self.matrix = sparse.coo_matrix(
+            (values, (np.searchsorted(index, keys1), np.searchsorted(index, keys2))),
+            shape = (n, n)
+        ).tocsr()
+        self.matrix.sum_duplicates()
+
+    def _new(self, matrix, index=None):
+        result = SparseWeightedMatrix()
+        result.index = self.index if index is None else index
+        result.matrix = matrix.tocsr()
+        result.matrix.eliminate_zeros()
+        return result
+
+    def _projected(self, other):
+        """other's matrix on our index (the pairs of other out of it are lost)
+        """
+        if not isinstance(other, SparseWeightedMatrix):
+            other = SparseWeightedMatrix(other)
+        coo = other.matrix.tocoo()
+        keys1 = other.index[coo.row]
+        keys2 = other.index[coo.col]
+        keep = np.in1d(keys1, self.index) & np.in1d(keys2, self.index)
+        n = len(self.index)
+        return sparse.coo_matrix(
+            (coo.data[keep], (np.searchsorted(self.index, keys1[keep]),
+                              np.searchsorted(self.index, keys2[keep]))),
+            shape = (n, n)
+        ).tocsr()
+
+    def _in_list(self, other):
+        """boolean mask over our index: is the key in the list ?
+        """
+        keys = np.fromiter(other.items.keys() if isinstance(other, WeightedList) else other.items,
+                           dtype=np.int64)
+        return np.in1d(self.index, keys)
+
+    def _scaled(self, factors):
+        """matrix[i,j] * factors[i] * factors[j]
+        """
+        diagonal = sparse.diags(factors, 0)
+        return diagonal.dot(self.matrix).dot(diagonal)
+
+    @property
+    def items(self):
+        """dict form {(key1, key2): value} (like WeightedMatrix.items)
+
+        NB: a new dict is built at each access (keep it in a variable
+            instead of reading it in a loop)
+        """
+        items = defaultdict(float)
+        for key1, key2, value in self:
+            items[key1, key2] = value
+        return items
+
+    def __iter__(self):
+        coo = self.matrix.tocoo()
+        for i, j, value in zip(coo.row, coo.col, coo.data):
+            yield int(self.index[i]), int(self.index[j]), float(value)
+
+    def __len__(self):
+        return self.matrix.nnz
+
+    def to_weighted_matrix(self):
+        return WeightedMatrix(self)
+
+    def add_triples(self, triples):
+        """Sums some (key1, key2, value) rows into the matrix (in place),
+        new keys and pairs included (unlike '+')
+
+        ex: partial counts merged one at a time (cf. compute_coocs)
+        """
+        coo = self.matrix.tocoo()
+        keys1 = np.concatenate((self.index[coo.row],
+                                np.array([row[0] for row in triples], dtype=np.int64)))
+        keys2 = np.concatenate((self.index[coo.col],
+                                np.array([row[1] for row in triples], dtype=np.int64)))
+        values = np.concatenate((coo.data,
+                                 np.array([row[2] for row in triples], dtype=np.float64)))
+        self._set_arrays(keys1, keys2, values)
+
+    def thresholded(self, threshold):
+        """only the pairs with a value >= threshold
+        (like the threshold param of compute_coocs)
+        """
+        return self._new(self.matrix.multiply(self.matrix >= threshold))
+
+    def save(self, node_id=None):
+        from gargantext.models import NodeNgramNgram
+        if node_id is None:
+            if hasattr(self, 'id'):
+                node_id = self.id
+            else:
+                raise ValueError('Please mention an ID to save the node.')
+        # delete previous data
+        session.query(NodeNgramNgram).filter(NodeNgramNgram.node_id == node_id).delete()
+        session.commit()
+        # insert new data
+        bulk_insert(
+            NodeNgramNgram,
+            ('node_id', 'ngram1_id', 'ngram2_id', 'weight'),
+            ((node_id, key1, key2, value) for key1, key2, value in self)
+        )
+
+    def __radd__(self, other):
+        result = NotImplemented
+        if isinstance(other, (WeightedMatrix, SparseWeightedMatrix)):
+            pattern = (self.matrix != 0).astype(np.float64)
+            result = self._new(self.matrix + self._projected(other).multiply(pattern))
+        return result
+
+    def __rsub__(self, other):
+        result = NotImplemented
+        if isinstance(other, (UnweightedList, WeightedList)):
+            keep = (~ self._in_list(other)).astype(np.float64)
+            result = self._new(self._scaled(keep))
+        elif isinstance(other, (WeightedMatrix, SparseWeightedMatrix)):
+            pattern = (self.matrix != 0).astype(np.float64)
+            result = self._new(self.matrix - self._projected(other).multiply(pattern))
+        return result
+
+    def __rand__(self, other):
+        result = NotImplemented
+        if isinstance(other, (UnweightedList, WeightedList)):
+            keep = self._in_list(other).astype(np.float64)
+            result = self._new(self._scaled(keep))
+        return result
+
+    def __rmul__(self, other):
+        result = NotImplemented
+        if isinstance(other, Translations):
+            # like WeightedMatrix: only the 2nd key is translated
+            coo = self.matrix.tocoo()
+            translated = np.array(
+                [other.items.get(key, key) for key in self.index.tolist()],
+                dtype=np.int64
+            )
+            result = SparseWeightedMatrix()
+            result._set_arrays(self.index[coo.row], translated[coo.col], coo.data)
+        elif isinstance(other, UnweightedList):
+            result = self.__rand__(other)
+        elif isinstance(other, WeightedList):
+            weights = np.array(
+                [other.items.get(key, 0.0) for key in self.index.tolist()],
+                dtype=np.float64
+            )
+            result = self._new(self._scaled(np.sqrt(weights)))
+        return result
+
+    def __rdiv__(self, other):
+        result = NotImplemented
+        if isinstance(other, WeightedList):
+            weights = np.array(
+                [other.items.get(key, 0.0) for key in self.index.tolist()],
+                dtype=np.float64
+            )
+            factors = np.zeros(len(weights))
+            present = self._in_list(other)
+            factors[present] = 1.0 / np.sqrt(weights[present])
+            result = self._new(self._scaled(factors))
+        return result
+
+
 # ?TODO rename Wordlist
 class UnweightedList(_BaseClass):
 
@@ -1,5 +1,5 @@
 from gargantext.util.languages import languages
-from gargantext.constants import LANGUAGES, DEFAULT_MAX_NGRAM_LEN, RULE_JJNN, RULE_NPN
+from gargantext.constants import LANGUAGES, DEFAULT_MAX_NGRAM_LEN, RULE_JJNN
 
 import nltk
 import re
@@ -17,15 +17,12 @@ class NgramsExtractor:
 
     def extract(self, text, rule=RULE_JJNN, label='NP', max_n_words=DEFAULT_MAX_NGRAM_LEN):
         text = self.clean_text(text)
-        grammar = nltk.RegexpParser(label + ': ' + rule)
         tagged_tokens = list(self._tagger.tag_text(text))
-        if len(tagged_tokens):
-            grammar_parsed = grammar.parse(tagged_tokens)
-            for subtree in grammar_parsed.subtrees():
-                if subtree.label() == label:
-                    if len(subtree) < max_n_words:
-                        yield subtree.leaves()
-                            # ex: [('wild', 'JJ'), ('pollinators', 'NNS')]
+        # the grammar is compiled once and cached by the tagger
+        yield from self._tagger.chunk(tagged_tokens, rule, label, max_n_words)
+
+    def extract_many(self, texts, rule=RULE_JJNN, label='NP', max_n_words=DEFAULT_MAX_NGRAM_LEN):
+        return self._tagger.extract_many(texts, rule, label, max_n_words)
 
 
 class NgramsExtractors(dict):
@@ -5,6 +5,8 @@ import csv
 csv.field_size_limit(sys.maxsize)
 import numpy as np
 import os
+from io        import TextIOWrapper
+from itertools import chain, islice
 
 class CSVParser(Parser):
 
@@ -19,15 +21,28 @@ class CSVParser(Parser):
 
 
     def parse(self, filebuf):
+        """
+        Yields the hyperdata of the rows one by one, decoded from the byte
+        stream as they're read (filebuf can also be a member of a zip):
+        only the first sample_size lines are kept to choose the delimiter
+        """
 
-        print("CSV: parsing (assuming UTF-8 and LF line endings)")
+        print("CSV: parsing (assuming UTF-8)")
 
-        contents = filebuf.read().decode("UTF-8").split("\n")
+        # newline='' => the csv module handles the line endings
+        # (and the line breaks in quoted fields)
+        text = TextIOWrapper(filebuf, encoding="UTF-8", newline='')
+        try:
+            yield from self.parse_lines(text)
+        finally:
+            # don't close filebuf along with text
+            text.detach()
 
-        sample_size = 10
-        sample_contents = contents[0:sample_size]
+    def parse_lines(self, lines):
 
-        hyperdata_list = []
+        sample_size = 10
+        sample_contents = list(islice(lines, sample_size))
+        contents = chain(sample_contents, lines)
 
         # # = = = = [ Getting delimiters frequency ] = = = = #
         PossibleDelimiters = [ ',',' ','\t', ';', '|', ':' ]
@@ -77,32 +92,30 @@ class CSVParser(Parser):
             "column": -1
         }
 
-        reader = csv.reader(contents, delimiter=HighestDelim)
+        # (one reader for the whole file: the first non empty row is
+        #  the headers and the next rows are the records)
+        reader = enumerate(csv.reader(contents, delimiter=HighestDelim))
 
-        for rownum, tokens in enumerate(reader):
-            if rownum % 250 == 0:
-                print("CSV row: ", rownum)
+        for rownum, tokens in reader:
             joined_tokens = "".join (tokens)
-            if Coords["row"]<0 and len( joined_tokens )>0 :
+            if len( joined_tokens )>0 :
                 Coords["row"] = rownum
                 for columnum in range(len(tokens)):
                     t = tokens[columnum]
                     if len(t)>0:
                         Coords["column"] = columnum
                         break
+                break
         # # = = = = [ / First data coordinate ] = = = = #
 
 
 
         # # = = = = [ Setting Headers ] = = = = #
         Headers_Int2Str = {}
-        reader = csv.reader(contents, delimiter=HighestDelim)
-        for rownum, tokens in enumerate(reader):
-            if rownum>=Coords["row"]:
-                for columnum in range( Coords["column"],len(tokens) ):
-                    t = tokens[columnum]
-                    Headers_Int2Str[columnum] = t
-                break
+        if Coords["row"] >= 0:
+            for columnum in range( Coords["column"],len(tokens) ):
+                t = tokens[columnum]
+                Headers_Int2Str[columnum] = t
         # print("Headers_Int2Str")
         # print(Headers_Int2Str)
         # # = = = = [ / Setting Headers ] = = = = #
@@ -115,17 +128,14 @@ class CSVParser(Parser):
         # #  }
 
 
-        # # = = = = [ Reading the whole CSV and saving ] = = = = #
-        hyperdata_list = []
-        reader = csv.reader(contents, delimiter=HighestDelim)
-        for rownum, tokens in enumerate(reader):
-            if rownum>Coords["row"]:
-                RecordDict = {}
-                for columnum in range( Coords["column"],len(tokens) ):
-                    data = tokens[columnum]
-                    RecordDict[ Headers_Int2Str[columnum] ] = data
-                if len(RecordDict.keys())>0:
-                    hyperdata_list.append( RecordDict )
-        # # = = = = [ / Reading the whole CSV and saving ] = = = = #
-
-        return hyperdata_list
+        # # = = = = [ Reading the rest of the CSV ] = = = = #
+        for rownum, tokens in reader:
+            if rownum % 250 == 0:
+                print("CSV row: ", rownum)
+            RecordDict = {}
+            for columnum in range( Coords["column"],len(tokens) ):
+                data = tokens[columnum]
+                RecordDict[ Headers_Int2Str[columnum] ] = data
+            if len(RecordDict.keys())>0:
+                yield RecordDict
+        # # = = = = [ / Reading the rest of the CSV ] = = = = #
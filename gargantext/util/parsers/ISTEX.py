@@ -6,11 +6,19 @@ import json
 class ISTexParser(Parser):
 
     def parse(self, filebuf):
+        """
+        Yields the hyperdata of the hits one by one
+
+        NB: the ISTEX export is a single JSON object (no incremental
+            parsing), but each hit is dropped as soon as it's processed
+        """
         contents = filebuf.read().decode("UTF-8")
         data = json.loads(contents)
+        del contents
         filebuf.close()
-        json_docs = data["hits"]
-        hyperdata_list = []
+        # reversed to pop the hits in their order
+        json_docs = data.pop("hits")
+        json_docs.reverse()
         hyperdata_path = {
             "id"                : "id",
             "source"            : "corpusName",
@@ -28,7 +36,8 @@ class ISTexParser(Parser):
 
         suma = 0
         
-        for json_doc in json_docs:
+        while json_docs:
+            json_doc = json_docs.pop()
 
             hyperdata = {}
             for key, path in hyperdata_path.items():
@@ -124,7 +133,7 @@ class ISTexParser(Parser):
                     hyperdata["publication_year"] = str(Decision.year)
                     hyperdata["publication_month"] = str(Decision.month)
                     hyperdata["publication_day"] = str(Decision.day)
-                    hyperdata_list.append(hyperdata)
+                    yield hyperdata
                     # print("\t||",hyperdata["title"])
                     # print("\t\t",Decision)
                     # print("=============================")
@@ -137,5 +146,3 @@ class ISTexParser(Parser):
         # print ("nb_hits:",len(json_docs))
         # print("\t - nb_fails:",suma)
         # print("  -- - - - - - -- - -")
-
-        return hyperdata_list
@@ -1,9 +1,12 @@
 from ._Tagger import Tagger
 from .lib.melttagger.tagger import POSTagger, Token, DAGParser, DAGReader
+from gargantext.constants import MELT_PIPELINES, MELT_PIPELINE_TIMEOUT
 
 import subprocess
+import threading
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 
 # references for tag equivalents:
@@ -50,8 +53,177 @@ _tag_replacements['fr'] = identity_dict({
 _tag_replacements['en'] = identity_dict()
 
 
+# perl buffers its output when it writes to a pipe: this wrapper makes the
+# MElt scripts flush every line, so that they can be kept running
+# (MELT_PIPELINES only: it also assumes that every stage streams line by
+#  line, passes _BLOCK_END unchanged and doesn't need its shebang switches,
+#  otherwise the deadline of _Pipeline.process stops it)
+_PERL_AUTOFLUSH = ('perl', '-MIO::Handle', '-e',
+                   'STDOUT->autoflush(1); $0 = shift; do $0; die $@ if $@;')
+
+# line marking the end of a text in the long-lived pipelines
+_BLOCK_END = '_GARG_BLOCK_END'
+
+
+class _Pipeline:
+    """Long-lived chain of processes (command1 | command2 | ...)
+    to which the texts are sent one block at a time.
+    """
+
+    def __init__(self, commands, encoding='utf8'):
+        self._encoding = encoding
+        self._processes = []
+        stdin = subprocess.PIPE
+        for command in commands:
+            process = subprocess.Popen(
+                _PERL_AUTOFLUSH + tuple(command),
+                bufsize=0,
+                stdin=stdin,
+                stdout=subprocess.PIPE,
+                # errors go straight to our stderr
+            )
+            if self._processes:
+                # now only the next process reads it
+                self._processes[-1].stdout.close()
+            self._processes.append(process)
+            stdin = process.stdout
+        self._input = self._processes[0].stdin
+        self._output = self._processes[-1].stdout
+
+    def _write(self, text):
+        try:
+            self._input.write((text + '\n' + _BLOCK_END + '\n').encode(self._encoding))
+            self._input.flush()
+        except OSError:
+            # the processes were stopped: the reading side reports it
+            pass
+
+    def _terminate(self):
+        for process in self._processes:
+            try:
+                process.kill()
+            except OSError:
+                pass
+
+    def process(self, text, timeout):
+        # we write from another thread so that the processes never wait
+        # for us to read their output while we are still sending
+        writer = threading.Thread(target=self._write, args=(text, ))
+        writer.start()
+        # a stage that buffers its output or alters the marker would make
+        # readline() wait forever: past the deadline the processes are
+        # stopped, so that it returns b'' and the pipeline is given up
+        deadline = threading.Timer(timeout, self._terminate)
+        deadline.daemon = True
+        deadline.start()
+        lines = []
+        for line in iter(self._output.readline, b''):
+            line = line.decode(self._encoding)
+            if _BLOCK_END in line:
+                # the segmenter may have joined the end of the text
+                # and the marker on the same line
+                before = line[:line.index(_BLOCK_END)].rstrip()
+                if before:
+                    lines.append(before + '\n')
+                break
+            lines.append(line)
+        else:
+            deadline.cancel()
+            writer.join()
+            raise RuntimeError('MElt pipeline ended or timed out')
+        deadline.cancel()
+        writer.join()
+        return ''.join(lines)
+
+    def close(self):
+        self._input.close()
+        for process in self._processes:
+            process.wait()
+
+    def kill(self):
+        """Stops a broken pipeline (the processes may be stuck mid-block)
+        """
+        self._terminate()
+        for pipe in (self._input, self._output):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+        for process in self._processes:
+            process.wait()
+
+
+class _PipelinePool:
+    """A few identical _Pipelines started as needed (up to size)
+    and shared by the threads tagging concurrently.
+    """
+
+    def __init__(self, commands, size, encoding='utf8', timeout=MELT_PIPELINE_TIMEOUT):
+        self._commands = commands
+        self._encoding = encoding
+        self._size = size
+        self._timeout = timeout
+        self._started = 0
+        self._idle = []
+        # notified each time a pipeline is given back or a slot is freed
+        self._available = threading.Condition()
+
+    def _acquire(self):
+        with self._available:
+            while not self._idle and self._started >= self._size:
+                self._available.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._started += 1
+        try:
+            return _Pipeline(self._commands, self._encoding)
+        except:
+            self._discard(None)
+            raise
+
+    def _release(self, pipeline):
+        with self._available:
+            self._idle.append(pipeline)
+            self._available.notify()
+
+    def _discard(self, pipeline):
+        # the waiting threads mustn't wait for it: its slot is freed
+        # and one of them will start a new pipeline instead
+        if pipeline is not None:
+            pipeline.kill()
+        with self._available:
+            self._started -= 1
+            self._available.notify()
+
+    def process(self, text):
+        pipeline = self._acquire()
+        try:
+            result = pipeline.process(text, self._timeout)
+        except:
+            self._discard(pipeline)
+            raise
+        self._release(pipeline)
+        return result
+
+    def close(self):
+        """Stops the idle pipelines"""
+        with self._available:
+            idle, self._idle = self._idle, []
+            self._started -= len(idle)
+        for pipeline in idle:
+            pipeline.close()
+
+
+# pipelines shared by all the MeltTaggers of the process {commands: pool}
+_pipelines_pools = {}
+_pipelines_lock = threading.Lock()
+
+
 class MeltTagger(Tagger):
 
+    # how many texts can be preprocessed concurrently (by language)
+    pool_size = 4
+
     def __init__(self, *args, **kwargs):
         self.language = kwargs.pop('language', 'fr')
         self._tag_replacements = _tag_replacements[self.language]
@@ -78,6 +250,19 @@ class MeltTagger(Tagger):
         pass
 
     def _pipe(self, text, commands, encoding='utf8'):
+        if MELT_PIPELINES:
+            with _pipelines_lock:
+                if commands not in _pipelines_pools:
+                    _pipelines_pools[commands] = _PipelinePool(commands, self.pool_size, encoding)
+            try:
+                return _pipelines_pools[commands].process(text)
+            except Exception as error:
+                print('MElt pipeline failed (%s): one run for this text' % error,
+                      file=sys.stderr)
+        return self._run(text, commands, encoding)
+
+    def _run(self, text, commands, encoding='utf8'):
+        # one run of each script for the whole text
         text = text.encode(encoding)
         for command in commands:
             process = subprocess.Popen(
@@ -92,8 +277,7 @@ class MeltTagger(Tagger):
                 print(err.decode(encoding), file=sys.stderr)
         return text.decode(encoding)
 
-    def _tag(self, text):
-        preprocessed = self._pipe(text, self._preprocessing_commands)
+    def _pos_tag(self, preprocessed):
         for sentence in preprocessed.split('\n'):
             words = sentence.split(' ')
             tokens = [Token(word) for word in words]
@@ -102,6 +286,25 @@ class MeltTagger(Tagger):
                 if len(token.string):
                     yield (token.string, token.label, )
 
+    def _tag(self, text):
+        preprocessed = self._pipe(text, self._preprocessing_commands)
+        yield from self._pos_tag(preprocessed)
+
+    def tag_texts(self, texts):
+        # the texts are preprocessed concurrently
+        # (by the pipelines pool if MELT_PIPELINES)
+        with ThreadPoolExecutor(self.pool_size) as executor:
+            preprocessed_texts = list(executor.map(
+                lambda text: self._pipe(text, self._preprocessing_commands),
+                texts
+            ))
+        return [
+            [(form, self._tag_replacements[tag])
+                for form, tag in self._pos_tag(preprocessed)
+                if form != "_SENT_BOUND"]
+            for preprocessed in preprocessed_texts
+        ]
+
     def tag_text(self, text, lemmatize=False):
         # print("IN MeltTagger.tag_text()")
         tagged_tokens = self._tag(text)
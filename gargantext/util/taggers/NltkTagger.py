@@ -15,3 +15,17 @@ class NltkTagger(Tagger):
 
     def tag_tokens(self, tokens, single=True):
         return self.tagr.tag(tokens)
+
+    def tag_texts(self, texts):
+        # all the lines of all the texts are tagged in one tag_sents call
+        sentences = []
+        n_lines = []
+        for text in texts:
+            lines = text.split('\n')
+            n_lines.append(len(lines))
+            sentences += [self._re_sentence.findall(line) for line in lines]
+        tagged_sentences = iter(self.tagr.tag_sents(sentences))
+        return [
+            [token_tag for _ in range(n) for token_tag in next(tagged_sentences)]
+            for n in n_lines
+        ]
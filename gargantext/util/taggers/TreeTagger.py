@@ -2,12 +2,10 @@ from ._Tagger import Tagger
 
 import subprocess
 import threading
-import time
+import queue
 import os
 
 
-# TODO: have a look at "queue" instead of "list" (cf. http://stackoverflow.com/questions/17564804/in-python-how-to-wait-until-only-the-first-thread-is-finished)
-
 class identity_dict(dict):
     def __missing__(self, key):
         return key
@@ -24,22 +22,32 @@ _tag_replacements = identity_dict({
     # Do we also have to take semicolons, comas and other points into account?
 })
 
-def _readOutput(output, buffer):
-    hasStarted = False
-    while True:
-        line = output.readline()
-        if line:
+def _readOutput(output, blocks):
+    """Reads the tagger output for as long as the process lives
+    and puts each complete <block> (list of (token, tag)) in the blocks queue
+    """
+    buffer = None
+    try:
+        for line in iter(output.readline, b''):
             if line == b"<block>\n":
-                hasStarted = True
-                continue
-            if line == b"<block/>\n":
-                break
-            if hasStarted:
-                token, tag = line.decode('utf8').split()[:2]
+                buffer = []
+            elif line == b"<block/>\n":
+                if buffer is not None:
+                    blocks.put(buffer)
+                buffer = None
+            elif buffer is not None:
+                try:
+                    token, tag = line.decode('utf8').split()[:2]
+                except ValueError:
+                    # (UnicodeDecodeError is a ValueError too)
+                    print("TreeTagger: skipped output line %r" % line)
+                    continue
                 tag = _tag_replacements[tag.split(':')[0]]
                 buffer.append((token, tag))
-        else:
-            time.sleep(0.1)
+    finally:
+        # end of output <=> the process has ended
+        # (or the reader failed: nobody must wait for a block forever)
+        blocks.put(None)
 
 
 class TreeTagger(Tagger):
@@ -69,11 +77,14 @@ class TreeTagger(Tagger):
             executable=binaryFile, # As we have it, specify it
             stdin=subprocess.PIPE,  # Get a pipe to write input data to TreeTagger process
             stdout=subprocess.PIPE, # Get a pipe to read processing results from TreeTagger
-            stderr=subprocess.PIPE, # Get a pipe to read processing results from TreeTagger
+            stderr=subprocess.DEVNULL, # (never read: a pipe could fill up and stall it)
         )
         self._input, self._output = self._popen.stdin, self._popen.stdout
-        # self._thread = threading.Thread(target=_readOutput, args=(self._output, self.buffer, )).start()
-        # self.buffer = OutputBuffer()
+        # one reader thread for the whole life of the process
+        self._blocks = queue.Queue()
+        self._thread = threading.Thread(target=_readOutput, args=(self._output, self._blocks, ))
+        self._thread.daemon = True
+        self._thread.start()
 
     def stop(self):
         # terminates the 'treetagger' process
@@ -83,17 +94,26 @@ class TreeTagger(Tagger):
         except:
             pass
 
+    def _flush(self):
+        # sends some dummy tokens, to make treetagger output what it holds
+        for token in "Les sanglots longs des violons de l ' automne bercent mon coeur d ' une langueur monotone .".split():
+            self._input.write(bytes(token + "\n", "utf8"))
+
+    def _get_block(self):
+        block = self._blocks.get()
+        if block is None:
+            raise RuntimeError("TreeTagger process has ended")
+        return block
+
     def tagging_start(self):
         self.buffer = []
-        self._thread = threading.Thread(target=_readOutput, args=(self._output, self.buffer, ))
-        self._thread.start()
         self._input.write(b"<block>\n")
 
     def tagging_end(self):
         self._input.write(b"<block/>\n")
-        # sends some dummy tokens, then wait for the text to be treated
-        self.tag_tokens("Les sanglots longs des violons de l ' automne bercent mon coeur d ' une langueur monotone .".split(), False)
-        self._thread.join()
+        self._flush()
+        # waits for the text to be treated
+        self.buffer = self._get_block()
 
 
     def tag_tokens(self, tokens, single=True):
@@ -112,3 +132,15 @@ class TreeTagger(Tagger):
             self.tag_tokens(tokens, False)
         self.tagging_end()
         return self.buffer
+
+    def tag_texts(self, texts):
+        # all the texts are written one block after the other
+        # and flushed only once
+        for text in texts:
+            self._input.write(b"<block>\n")
+            for line in text.split('\n'):
+                for token in self._re_sentence.findall(line):
+                    self._input.write(bytes(token + "\n", "utf8"))
+            self._input.write(b"<block/>\n")
+        self._flush()
+        return [self._get_block() for text in texts]
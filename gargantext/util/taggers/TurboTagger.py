@@ -25,3 +25,17 @@ class TurboTagger(Tagger):
             print("TurboTagger: problem with the NLPServer (try running gargantext/parsing/Taggers/lib/nlpserver/server.py)")
             # TODO abort workflow?
             return []
+
+    def tag_texts(self, texts):
+        # all the texts are sent in one round-trip
+        if not hasattr(self, '_nlpclient'):
+            self._nlpclient = NLPClient()
+        try:
+            return [
+                [(token, tag, ) for sentence in sentences for token, tag in sentence]
+                for sentences in self._nlpclient.tag_many(texts)
+            ]
+        except ConnectionRefusedError as e:
+            print(e)
+            print("TurboTagger: problem with the NLPServer (try running gargantext/parsing/Taggers/lib/nlpserver/server.py)")
+            return [[] for text in texts]
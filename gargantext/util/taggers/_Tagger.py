@@ -19,6 +19,8 @@ class Tagger:
             | [][.,;"'?!():-_`]             # these are separate tokens
             ''', re.UNICODE | re.MULTILINE | re.DOTALL)
         self.buffer = []
+        # compiled grammars {(rule, label) => nltk.RegexpParser}
+        self._chunkers = {}
         self.start()
 
 
@@ -28,19 +30,43 @@ class Tagger:
         """
         return re.sub(r'<[^>]{0,45}>', '', text)
 
-    def extract(self, text, rule=RULE_JJNN, label='NP', max_n_words=DEFAULT_MAX_NGRAM_LEN):
-        self.text = self.clean_text(text)
-        grammar = nltk.RegexpParser(label + ': ' + rule)
-        tagged_tokens = list(self.tag_text(self.text))
-        # print("the tagged_tokens", tagged_tokens)
+    def chunker(self, rule=RULE_JJNN, label='NP'):
+        """Returns the grammar parser for the given rule.
+        It is compiled only once per tagger.
+        """
+        key = (rule, label)
+        if key not in self._chunkers:
+            self._chunkers[key] = nltk.RegexpParser(label + ': ' + rule)
+        return self._chunkers[key]
+
+    def chunk(self, tagged_tokens, rule=RULE_JJNN, label='NP', max_n_words=DEFAULT_MAX_NGRAM_LEN):
+        """Yields the ngrams matching the rule in an already tagged text.
+        """
         if len(tagged_tokens):
-            grammar_parsed = grammar.parse(tagged_tokens)
+            grammar_parsed = self.chunker(rule, label).parse(tagged_tokens)
             for subtree in grammar_parsed.subtrees():
                 if subtree.label() == label:
                     if len(subtree) < max_n_words:
                         yield subtree.leaves()
                             # ex: [('wild', 'JJ'), ('pollinators', 'NNS')]
 
+    def extract(self, text, rule=RULE_JJNN, label='NP', max_n_words=DEFAULT_MAX_NGRAM_LEN):
+        self.text = self.clean_text(text)
+        tagged_tokens = list(self.tag_text(self.text))
+        # print("the tagged_tokens", tagged_tokens)
+        yield from self.chunk(tagged_tokens, rule, label, max_n_words)
+
+    def extract_many(self, texts, rule=RULE_JJNN, label='NP', max_n_words=DEFAULT_MAX_NGRAM_LEN):
+        """Same as extract() but for a list of texts tagged in one call
+        (cf. tag_texts).
+        Returns a list with the list of ngrams of each text.
+        """
+        texts = [self.clean_text(text) for text in texts]
+        return [
+            list(self.chunk(tagged_tokens, rule, label, max_n_words))
+            for tagged_tokens in self.tag_texts(texts)
+        ]
+
 
     def __del__(self):
         self.stop()
@@ -91,3 +117,10 @@ class Tagger:
             tokens_tags += self.tag_tokens(tokens, False)
         self.tagging_end()
         return tokens_tags
+
+    # Main function for extract_many()
+    def tag_texts(self, texts):
+        """Send several texts to be tagged.
+        This method can be overriden by the taggers having a batch mode.
+        """
+        return [list(self.tag_text(text)) for text in texts]
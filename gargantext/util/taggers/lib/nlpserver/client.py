@@ -1,27 +1,35 @@
 import socket
 import sys
-import re
+import threading
 
 from .settings import server_type_client, server_host, server_port, server_buffer
 from .settings import implemented_methods
 
 
 class NLPClient:
+    """Client for the NLPServer.
+
+    The connection is persistent: it is opened at the first request and
+    reused by the next ones (and reopened once if the server closed it).
+    The *_many methods pipeline several texts in one round-trip.
+    """
 
     def __init__(self):
         self._socket = None
+        self._buffer = b''
         for method_name in dir(self):
             if method_name[0] != '_':
-                if method_name.upper() not in implemented_methods:
+                if method_name.upper().replace('_MANY', '') not in implemented_methods:
                     setattr(self, method_name, self._notimplemented)
 
     def __del__(self):
         self._disconnect()
 
     def _connect(self):
-        self._disconnect()
-        self._socket = socket.socket(*server_type_client)
-        self._socket.connect((server_host, server_port))
+        if self._socket is None:
+            self._socket = socket.socket(*server_type_client)
+            self._socket.connect((server_host, server_port))
+            self._buffer = b''
 
     def _disconnect(self):
         if self._socket is not None:
@@ -36,52 +44,85 @@ class NLPClient:
         )
 
     def _getline(self):
-        """Get one line of text from the buffer
+        """Get one line of text from the connection
+        (what comes after it stays in the buffer for the next lines)
+        """
+        while b'\n' not in self._buffer:
+            more = self._socket.recv(server_buffer)
+            if not more:
+                raise ConnectionAbortedError('NLPServer closed the connection')
+            self._buffer += more
+        line, self._buffer = self._buffer.split(b'\n', 1)
+        return line.decode()
+
+    def _format(self, action, text, language):
+        """One request: a header line, the text lines and an empty line
+        (the text can't contain empty lines because they end the request)
+        """
+        lines = [line for line in text.split('\n') if line.strip()]
+        data = action + ' '
+        data += language + '\n'
+        data += ''.join(line + '\n' for line in lines)
+        data += '\n'
+        return data.encode()
+
+    def _response(self, keys=None):
+        """Read one response: sentences separated by an empty line,
+        and an empty sentence at the end
         """
-        buf = self._socket.recv(server_buffer).decode()
-        done = False
-        while not done:
-            if '\n' in buf:
-                line, buf = buf.split('\n', 1)
-                yield line
+        sentences = []
+        sentence = []
+        while True:
+            line = self._getline()
+            if not line:
+                if not sentence:
+                    break
+                sentences.append(sentence)
+                sentence = []
+                continue
+            values = line.split('\t')
+            if keys is None:
+                sentence.append(values)
             else:
-                more = self._socket.recv(server_buffer).decode()
-                if not more:
-                    done = True
-                else:
-                    buf += more
-        if buf:
-            yield buf
+                sentence.append(dict(zip(keys, values)))
+        return sentences
+
+    def _exchange(self, action, texts, language, keys=None):
+        self._connect()
+        data = b''.join(self._format(action, text, language) for text in texts)
+        # we write from another thread so that the server never waits
+        # for us to read its first responses while we are still sending
+        errors = []
+        def send():
+            try:
+                self._socket.sendall(data)
+            except Exception as error:
+                errors.append(error)
+        sender = threading.Thread(target=send)
+        sender.start()
+        try:
+            responses = [self._response(keys) for text in texts]
+        finally:
+            sender.join()
+        if errors:
+            raise errors[0]
+        return responses
+
+    def _request_many(self, action, texts, language, keys=None):
+        """Generic method to request info from the server for several texts
+        Returns a list with the list of sentences of each text
+        """
+        try:
+            return self._exchange(action, texts, language, keys)
+        except ConnectionError:
+            # the server may have closed our idle connection: retry once
+            self._disconnect()
+            return self._exchange(action, texts, language, keys)
 
     def _request(self, action, text, language, keys=None):
         """Generic method to request info from the server
         """
-        data = action + ' '
-        data += language + '\n'
-        data += re.sub(r'\n+', '\n', text)
-        data += '\n\n'
-        self._connect()
-        self._socket.sendall(data.encode())
-        sentence = []
-        if keys is None:
-            for line in self._getline():
-                if not line:
-                    if not sentence:
-                        break
-                    yield sentence
-                    sentence = []
-                    continue
-                sentence.append(line.split('\t'))
-        else:
-            for line in self._getline():
-                if not line:
-                    if not sentence:
-                        break
-                    yield sentence
-                    sentence = []
-                    continue
-                values = line.split('\t')
-                sentence.append(dict(zip(keys, line.split('\t'))))
+        return self._request_many(action, [text], language, keys)[0]
 
     def tokenize(self, text, language='english', asdict=False):
         keys = ('token', ) if asdict else None
@@ -99,6 +140,22 @@ class NLPClient:
         keys = ('token', 'tag', 'lemma', 'head', 'deprel', ) if asdict else None
         return self._request('PARSE', text, language, keys)
 
+    def tokenize_many(self, texts, language='english', asdict=False):
+        keys = ('token', ) if asdict else None
+        return self._request_many('TOKENIZE', texts, language, keys)
+
+    def tag_many(self, texts, language='english', asdict=False):
+        keys = ('token', 'tag', ) if asdict else None
+        return self._request_many('TAG', texts, language, keys)
+
+    def lemmatize_many(self, texts, language='english', asdict=False):
+        keys = ('token', 'tag', 'lemma') if asdict else None
+        return self._request_many('LEMMATIZE', texts, language, keys)
+
+    def parse_many(self, texts, language='english', asdict=False):
+        keys = ('token', 'tag', 'lemma', 'head', 'deprel', ) if asdict else None
+        return self._request_many('PARSE', texts, language, keys)
+
 
 # Benchmark when the script is called directly
 if __name__ == '__main__':
@@ -114,7 +171,7 @@ if __name__ == '__main__':
         ) + 's')
         print('---------------------------')
         for method_name in dir(client):
-            if method_name[0] != '_':
+            if method_name[0] != '_' and not method_name.endswith('_many'):
                 method = getattr(client, method_name)
                 print('%-16s' % method_name, end='')
                 t0 = time()
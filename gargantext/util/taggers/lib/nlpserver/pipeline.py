@@ -1,5 +1,6 @@
 from settings import *
 from sys import stderr
+import os
 
 def print(text):
     stderr.write(text + '\n')
@@ -33,6 +34,19 @@ if 'PARSE' in implemented_methods:
     print('PARSER LOADED')
 
 
+def tmp_paths():
+    """The temporary files of the current process
+    (the server forks one process per connection)
+    """
+    suffix = '.%d' % os.getpid()
+    return tmp_input_path + suffix, tmp_output_path + suffix
+
+def remove_tmp_files():
+    for path in tmp_paths():
+        if os.path.exists(path):
+            os.remove(path)
+
+
 def split_sentences(text):
     return sentence_tokenizer.tokenize(text)
 
@@ -40,15 +54,16 @@ def tokenize(sentence):
     return word_tokenizer.tokenize(sentence)
 
 def tag_sentence(sentence):
+    input_path, output_path = tmp_paths()
     # Write tokens to input file
-    f_input = open(tmp_input_path, 'w')
+    f_input = open(input_path, 'w')
     for token in tokenize(sentence):
         f_input.write(token + '\t_\n')
     f_input.close()
     # Tag tokens
-    tagger.tag(b_tmp_input_path, b_tmp_output_path)
+    tagger.tag(input_path.encode(), output_path.encode())
     # Iterate through tagged tokens
-    f_output = open(tmp_output_path)
+    f_output = open(output_path)
     for line in f_output:
         line = line.rstrip('\n')
         if line == '':
@@ -58,15 +73,16 @@ def tag_sentence(sentence):
     f_output.close()
 
 def tag_lemmatize_sentence(sentence):
+    input_path, output_path = tmp_paths()
     # Write tokens to input file
-    f_input = open(tmp_input_path, 'w')
+    f_input = open(input_path, 'w')
     for token in tokenize(sentence):
         f_input.write(token + '\t_\n')
     f_input.close()
     # Tag tokens
-    tagger.tag(b_tmp_input_path, b_tmp_output_path)
+    tagger.tag(input_path.encode(), output_path.encode())
     # Iterate through tagged tokens
-    f_output = open(tmp_output_path)
+    f_output = open(output_path)
     for line in f_output:
         line = line.rstrip('\n')
         if line == '':
@@ -77,11 +93,14 @@ def tag_lemmatize_sentence(sentence):
     f_output.close()
 
 def parse_sentence(sentence):
+    input_path, output_path = tmp_paths()
+    # (the tagging of the sentence uses the temporary files too)
+    tagged = list(tag_lemmatize_sentence(sentence))
     # Write tokens to input file
-    f_input = open(tmp_input_path, 'w')
+    f_input = open(input_path, 'w')
     # Iterate through tagged tokens, prepare input
     i = 0
-    for token, tag, lemma in tag_lemmatize_sentence(sentence):
+    for token, tag, lemma in tagged:
         i += 1
         f_input.write(
             # position
@@ -98,9 +117,9 @@ def parse_sentence(sentence):
         )
     f_input.close()
     # Parse sentence
-    parser.parse(b_tmp_input_path, b_tmp_output_path)
+    parser.parse(input_path.encode(), output_path.encode())
     # Iterate through parsed stuff
-    f_output = open(tmp_output_path)
+    f_output = open(output_path)
     for line in f_output:
         line = line.rstrip('\n')
         if line == '':
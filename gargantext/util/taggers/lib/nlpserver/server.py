@@ -1,9 +1,11 @@
 #!python3
 
 import pipeline
+import socket
 import socketserver
 
 from settings import server_type_server, server_host, server_port, server_timeout
+from settings import server_idle_timeout
 from settings import b_implemented_methods
 
 
@@ -14,18 +16,32 @@ actions = {
 }
 
 class NLPServer(socketserver.StreamRequestHandler):
+    """Handles all the requests of a connection, until the client closes it
+    (the requests may be pipelined: their responses are written in order)
+    """
+
+    # idle connections are closed after this delay
+    timeout = server_idle_timeout
 
     def handle(self):
+        try:
+            while True:
+                firstline = self.rfile.readline()
+                if not firstline:
+                    # connection closed by the client
+                    break
+                if not firstline.strip():
+                    # empty lines between requests are ignored
+                    continue
+                self.handle_request(firstline)
+        except socket.timeout:
+            pass
+        finally:
+            pipeline.remove_tmp_files()
+
+    def handle_request(self, firstline):
         # What kind of request are we handling?
-        firstline = self.rfile.readline()
         parameters = firstline.split()
-        if len(parameters) != 2:
-            self.wfile.write(b'\n\n')
-            return
-        action, language = parameters
-        if action not in b_implemented_methods:
-            self.wfile.write(b'\n\n')
-            return
         # Get the text data
         text = ''
         while True:
@@ -34,31 +50,34 @@ class NLPServer(socketserver.StreamRequestHandler):
                 break
             text += line
             text += '\n'
+        # (an empty response if we can't handle it)
+        if len(parameters) != 2:
+            self.wfile.write(b'\n')
+            return
+        action, language = parameters
+        if action not in b_implemented_methods:
+            self.wfile.write(b'\n')
+            return
         # Execute the action
         method = actions.get(action, None)
-        if method is None:
-            for sentence in pipeline.split_sentences(text):
-                for token in pipeline.tokenize(sentence):
-                    self.wfile.write(
-                        token.encode() + b'\n'
-                    )
-                self.wfile.write(b'\n')
-            self.wfile.write(b'\n')
-        else:
-            for sentence in pipeline.split_sentences(text):
-                for row in method(sentence):
-                    self.wfile.write(
-                        (
-                            '\t'.join(row)
-                        ).encode() + b'\n'
-                    )
-                self.wfile.write(b'\n')
+        for sentence in pipeline.split_sentences(text):
+            if method is None:
+                rows = [(token, ) for token in pipeline.tokenize(sentence)]
+            else:
+                rows = list(method(sentence))
+            if not rows:
+                # an empty sentence would read as the end of the response
+                continue
+            for row in rows:
+                self.wfile.write(
+                    (
+                        '\t'.join(row)
+                    ).encode() + b'\n'
+                )
             self.wfile.write(b'\n')
+        self.wfile.write(b'\n')
 
-    def handle_timeout(self):
-        self.request.sendall(b'\n\n')
 
-        
 if __name__ == '__main__':
     print('STARTING TCP SERVER')
     server = server_type_server((server_host, server_port), NLPServer)
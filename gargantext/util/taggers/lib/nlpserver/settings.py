@@ -5,9 +5,12 @@ import socketserver
 # Server parameters
 server_host = 'localhost'
 server_port = 7777
-server_type_server = socketserver.TCPServer
+# connections are persistent: one process per connection
+# (each process has its own temporary files, cf. pipeline.tmp_paths)
+server_type_server = socketserver.ForkingTCPServer
 server_type_client = socket.AF_INET, socket.SOCK_STREAM
 server_timeout = 2.0
+server_idle_timeout = 60.0
 server_buffer = 4096
 
 # Implemented methods (other are treated as 'tokenize')
@@ -25,7 +28,6 @@ b_tagger_model = tagger_model.encode()
 b_parser_model = parser_model.encode()
 
 # Temporary files access
+# (prefixes: the pid of the process handling the connection is appended)
 tmp_input_path = '/tmp/nlpserver_input.tmp'
 tmp_output_path = '/tmp/nlpserver_output.tmp'
-b_tmp_input_path = tmp_input_path.encode()
-b_tmp_output_path = tmp_output_path.encode()
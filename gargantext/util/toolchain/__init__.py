@@ -1,2 +1,3 @@
 from .main import parse_extract_indexhyperdata
 from .main import parse_extract
+from .main import update_corpus
@@ -1,7 +1,8 @@
 from gargantext.models     import Node, NodeNgram, NodeNodeNgram
-from gargantext.util.db    import session
+from gargantext.util.db    import session, bulk_insert
 from gargantext.util.lists import UnweightedList
 from sqlalchemy            import desc
+from .ngrams_extraction    import new_ngrams_subquery
 from gargantext.constants  import DEFAULT_RANK_CUTOFF_RATIO, \
                                   DEFAULT_RANK_HARD_LIMIT
 
@@ -9,7 +10,8 @@ def do_mainlist(corpus,
                     overwrite_id  = None,
                     ranking_scores_id=None, stoplist_id=None,
                     hard_limit=DEFAULT_RANK_HARD_LIMIT,
-                    ratio_limit=DEFAULT_RANK_CUTOFF_RATIO
+                    ratio_limit=DEFAULT_RANK_CUTOFF_RATIO,
+                    from_doc_id=None
                     ):
     """
     Select top n terms according to a global tfidf ranking and stoplist filter.
@@ -27,6 +29,10 @@ def do_mainlist(corpus,
         - a stoplist for filtering some ngrams
         - overwrite_id: optional id of a pre-existing MAINLIST node for this corpus
                      (the Node and its previous NodeNgram rows will be replaced)
+        - from_doc_id: optional incremental mode (needs overwrite_id)
+                     the previous mainlist is kept (with the user's changes)
+                     and if the limit grew, the free places go to the best
+                     ngrams new in the docs with id >= from_doc_id
 
       + 2 limits to set the amount of picked terms:
         - ratio_limit ∈ [0,1]: a ratio relative to the number of distinct ngrams
@@ -35,6 +41,8 @@ def do_mainlist(corpus,
           (default: 1000)
 
     """
+    if from_doc_id and not overwrite_id:
+        raise ValueError("MAINLIST: from_doc_id needs the overwrite_id to update")
 
     # retrieve helper nodes if not provided
     if not ranking_scores_id:
@@ -78,6 +86,32 @@ def do_mainlist(corpus,
     # apply ratio to find smallest limit
     our_limit = min(hard_limit, round(nb_ngrams * ratio_limit))
 
+    if from_doc_id:
+        previous_size = (session.query(NodeNgram)
+                            .filter(NodeNgram.node_id == overwrite_id)
+                            .count()
+                        )
+        n_added = our_limit - previous_size
+        print("MAINLIST: adding %i new ngrams to the %i previous ones"
+                % (max(n_added, 0), previous_size))
+        if n_added > 0:
+            new_top_ngrams = (ordered_filtered_tfidf
+                                .filter(NodeNodeNgram.ngram_id.in_(
+                                    new_ngrams_subquery(corpus, from_doc_id)
+                                ))
+                                .filter(~ NodeNodeNgram.ngram_id.in_(
+                                    session.query(NodeNgram.ngram_id)
+                                           .filter(NodeNgram.node_id == overwrite_id)
+                                ))
+                                .limit(n_added)
+                             )
+            bulk_insert(
+                NodeNgram,
+                ('node_id', 'ngram_id', 'weight'),
+                ((overwrite_id, row[0], 1.0) for row in new_top_ngrams)
+            )
+        return overwrite_id
+
     print("MAINLIST: keeping %i ngrams out of %i" % (our_limit,nb_ngrams))
 
     # DB retrieve up to limit => MAINLIST
@@ -4,10 +4,115 @@ Creates a filtering list for corpus ngrams.
 """
 
 from gargantext.models        import User, Node, Ngram, NodeNgram
-from gargantext.util.db       import session, func
+from gargantext.util.db       import session, func, bulk_insert
 from gargantext.constants     import LISTTYPES
 from re                       import compile
 from sqlalchemy               import desc
+from .ngrams_extraction       import new_ngrams_subquery
+
+# the filters on the terms
+# NB: they're used with re.match (ie anchored at the start of the terms)
+STOPLIST_REGEXES = [
+      "^.{1,2}$"
+    , "(.*)\d(.*)"
+    # , "(.*)(\.)(.*)"         trop fort (enlève les sigles !)
+    , "(.*)(\,)(.*)"
+    , "(.*)(< ?/?p ?>)(.*)"       # marques de paragraphes
+    , "(.*)\b(xx|xi|xv)\b(.*)"
+    , "(.*)(result)(.*)"
+    , "(.*)(year|année|nombre|moitié)(.*)"
+    , "(.*)(temps)(.*)"
+    , "(.*)(%)(.*)"
+    , "(.*)(\{)(.*)"
+    , "(.*)(terme)(.*)"
+    , "(.*)(différent)(.*)"
+    , "(.*)(travers)(.*)"
+    # academic stamps
+    , ".*elsevier.*"
+    , ".*wiley.*"
+    , ".*springer.*"
+    , ".*university press.*"
+    # academic terms when alone ~~> usually not informative
+    , "hypothes[ie]s$"
+    , "analys[ie]s$"
+    , "bas[ie]s$"
+    , "online$"
+    , "importance$"
+    , "uses?$"
+    , "cases?$"
+    , "effects?$"
+    , "times?$"
+    , "methods?$"
+    , "types?$"
+    , "evidences?$"
+    , "findings?$"
+    , "relations?$"
+    , "terms?$"
+    , "procedures?$"
+    , "factors?$"
+    , "reports?$"
+    , "changes?$"
+    , "facts?$"
+    , "others?$"
+    , "applications?$"
+    , "periods?$"
+    , "investigations?$"
+    , "orders?$"
+    , "forms?$"
+    , "conditions?$"
+    , "situations?$"
+    , "papers?$"
+    , "relationships?$"
+    , "values?$"
+    , "areas?$"
+    , "techniques?$"
+    , "means?$"
+    , "conclusions?$"
+    , "comparisons?$"
+    , "parts?$"
+    , "amounts?$"
+    , "aims?$"
+    , "lacks?$"
+    , "issues?$"
+    , "ways?$"
+    , "ranges?$"
+    , "models?$"
+    , "articles?$"
+    , "series?$"
+    , "totals?$"
+    , "influences?$"
+    , "journals?$"
+    , "rules?$"
+    , "persons?$"
+    , "abstracts?$"
+    , "(?:book)? reviews?$"
+    , "process(?:es)?$"
+    , "approach(?:es)?$"
+    , "theor(?:y|ies)?$"
+    , "methodolog(?:y|ies)?$"
+    , "similarit(?:y|ies)?$"
+    , "possibilit(?:y|ies)?$"
+    , "stud(?:y|ies)?$"
+    # non-thematic or non-NP expressions
+    , "none$"
+    , "other(?: hand)?$"
+    , "whereas$"
+    , "usually$"
+    , "and$"
+    # , "vol$"
+    , "eds?$"
+    , "ltd$"
+    , "copyright$"
+    , "e-?mails?$"
+    , ".*="
+    , "=.*"
+    , "further(?:more)?$"
+    , "(.*)(:|\|)(.*)"
+]
+
+# all the filters in one precompiled alternation
+_stoplist_regex = compile('|'.join('(?:%s)' % regex for regex in STOPLIST_REGEXES))
+
 
 def is_stop_word(ngram, stop_words=None):
     '''
@@ -17,115 +122,65 @@ def is_stop_word(ngram, stop_words=None):
     '''
     word = ngram[1]
 
-    if word in stop_words:
+    if stop_words and word in stop_words:
         return(True)
 
-    compiled_regexes = []   # to compile them only once
-    for regex in [
-              "^.{1,2}$"
-            , "(.*)\d(.*)"
-            # , "(.*)(\.)(.*)"         trop fort (enlève les sigles !)
-            , "(.*)(\,)(.*)"
-            , "(.*)(< ?/?p ?>)(.*)"       # marques de paragraphes
-            , "(.*)\b(xx|xi|xv)\b(.*)"
-            , "(.*)(result)(.*)"
-            , "(.*)(year|année|nombre|moitié)(.*)"
-            , "(.*)(temps)(.*)"
-            , "(.*)(%)(.*)"
-            , "(.*)(\{)(.*)"
-            , "(.*)(terme)(.*)"
-            , "(.*)(différent)(.*)"
-            , "(.*)(travers)(.*)"
-            # academic stamps
-            , ".*elsevier.*"
-            , ".*wiley.*"
-            , ".*springer.*"
-            , ".*university press.*"
-            # academic terms when alone ~~> usually not informative
-            , "hypothes[ie]s$"
-            , "analys[ie]s$"
-            , "bas[ie]s$"
-            , "online$"
-            , "importance$"
-            , "uses?$"
-            , "cases?$"
-            , "effects?$"
-            , "times?$"
-            , "methods?$"
-            , "types?$"
-            , "evidences?$"
-            , "findings?$"
-            , "relations?$"
-            , "terms?$"
-            , "procedures?$"
-            , "factors?$"
-            , "reports?$"
-            , "changes?$"
-            , "facts?$"
-            , "others?$"
-            , "applications?$"
-            , "periods?$"
-            , "investigations?$"
-            , "orders?$"
-            , "forms?$"
-            , "conditions?$"
-            , "situations?$"
-            , "papers?$"
-            , "relationships?$"
-            , "values?$"
-            , "areas?$"
-            , "techniques?$"
-            , "means?$"
-            , "conclusions?$"
-            , "comparisons?$"
-            , "parts?$"
-            , "amounts?$"
-            , "aims?$"
-            , "lacks?$"
-            , "issues?$"
-            , "ways?$"
-            , "ranges?$"
-            , "models?$"
-            , "articles?$"
-            , "series?$"
-            , "totals?$"
-            , "influences?$"
-            , "journals?$"
-            , "rules?$"
-            , "persons?$"
-            , "abstracts?$"
-            , "(?:book)? reviews?$"
-            , "process(?:es)?$"
-            , "approach(?:es)?$"
-            , "theor(?:y|ies)?$"
-            , "methodolog(?:y|ies)?$"
-            , "similarit(?:y|ies)?$"
-            , "possibilit(?:y|ies)?$"
-            , "stud(?:y|ies)?$"
-            # non-thematic or non-NP expressions
-            , "none$"
-            , "other(?: hand)?$"
-            , "whereas$"
-            , "usually$"
-            , "and$"
-            # , "vol$"
-            , "eds?$"
-            , "ltd$"
-            , "copyright$"
-            , "e-?mails?$"
-            , ".*="
-            , "=.*"
-            , "further(?:more)?$"
-            , "(.*)(:|\|)(.*)"
-            ] :
-        compiled_regexes.append(compile(regex))
-
-    for format_regex in compiled_regexes:
-        if format_regex.match(word):
-            # print("STOPLIST += '%s' (regex: %s)" % (word, format_regex.pattern))
-            return(True)
-
-    return False
+    return _stoplist_regex.match(word) is not None
+
+
+class StoplistMatcher:
+    """
+    Tells if some terms are stop words in one pass:
+      - set lookup in the stop words (ex: the root stoplist terms)
+      - then the STOPLIST_REGEXES all at once
+
+    The matcher of the gargantua root stoplist is shared and cached at module
+    level: cf. root_stoplist_matcher()
+    """
+    def __init__(self, stop_words=()):
+        self.stop_words = frozenset(stop_words)
+
+    def match(self, word):
+        return word in self.stop_words or _stoplist_regex.match(word) is not None
+
+    __call__ = match
+
+
+# cached matcher for the root stoplist (and the state of that list when read)
+_root_matcher = None
+_root_signature = None
+
+def root_stoplist_matcher():
+    """
+    StoplistMatcher with the terms of the STOPLIST of the gargantua user
+
+    The matcher is only rebuilt when the root STOPLIST node changed
+    (its id, number of ngrams or sum of ngram ids)
+    """
+    global _root_matcher, _root_signature
+
+    gargantua_id = session.query(User.id).filter(User.username=="gargantua").first()
+    rootStopList_id = session.query(Node.id).filter(
+            Node.user_id  == gargantua_id,
+            Node.typename == "STOPLIST"
+            ).first()
+    signature = (
+        rootStopList_id,
+        session.query(func.count(NodeNgram.ngram_id), func.sum(NodeNgram.ngram_id))
+               .filter(NodeNgram.node_id == rootStopList_id)
+               .first()
+    )
+
+    if _root_matcher is None or signature != _root_signature:
+        ## stop_words :: [String]
+        stop_words = (session.query(Ngram.terms)
+                             .join(NodeNgram, NodeNgram.ngram_id == Ngram.id)
+                             .filter(NodeNgram.node_id == rootStopList_id)
+                     )
+        _root_matcher = StoplistMatcher(row[0] for row in stop_words)
+        _root_signature = signature
+
+    return _root_matcher
 
 def create_gargantua_resources():
     gargantua_id = session.query(User.id).filter(User.username=="gargantua").first()
@@ -138,14 +193,20 @@ def create_gargantua_resources():
     session.add(stopList)
     session.commit()
 
-def do_stoplist(corpus, overwrite_id=None):
+def do_stoplist(corpus, overwrite_id=None, from_doc_id=None):
     '''
     Create list of stop words.
     TODO do a function to get all stop words with social scores
 
     Parameters:
         - overwrite_id: optional preexisting STOPLIST node to overwrite
+        - from_doc_id: optional incremental mode (needs overwrite_id)
+                       only the ngrams new in the docs with id >= from_doc_id
+                       are filtered and they're added to the previous stoplist
+                       (so the user's changes on the older ones are kept)
     '''
+    if from_doc_id and not overwrite_id:
+        raise ValueError("do_stoplist: from_doc_id needs the overwrite_id to update")
 
     # Get preexisting StopList if provided in overwrite_id param
     if overwrite_id:
@@ -161,21 +222,8 @@ def do_stoplist(corpus, overwrite_id=None):
         stoplist_id = stoplist.id
 
     # Get common resources, all common StopWords on the platform
-    ## First get the id of the StopList of Gargantua super user
-    gargantua_id = session.query(User.id).filter(User.username=="gargantua").first()
-    rootStopList_id = session.query(Node.id).filter(
-            Node.user_id  == gargantua_id,
-            Node.typename == "STOPLIST"
-            ).first()
-    ## Then get all the stop words
-    ## stop_words :: [String]
-    stop_words = (session.query(Ngram.terms)
-                         .join(NodeNgram, NodeNgram.ngram_id == Ngram.id)
-                         .filter(NodeNgram.node_id == rootStopList_id)
-                         .all()
-                 )
-
-    # print([n for n in stop_words])
+    # (matcher with the StopList of Gargantua super user)
+    is_stop = root_stoplist_matcher()
 
     ## Get the ngrams
     ## ngrams :: [(Int, String, Int)]
@@ -186,15 +234,24 @@ def do_stoplist(corpus, overwrite_id=None):
                      Node.typename == "DOCUMENT")
             .group_by( Ngram.id )
             #.limit(limit)
-            .all()
             )
+    if from_doc_id:
+        ngrams = ngrams.filter(Ngram.id.in_(new_ngrams_subquery(corpus, from_doc_id)))
+    ngrams = ngrams.all()
 
-    ngrams_to_stop = filter(
-            lambda x: is_stop_word(x,stop_words=stop_words), ngrams
-        )
+    ngrams_to_stop = [ngram for ngram in ngrams if is_stop(ngram[1])]
 
     # print([n for n in ngrams_to_stop])
 
+    if from_doc_id:
+        # add to the previous rows
+        bulk_insert(
+            NodeNgram,
+            ('node_id', 'ngram_id', 'weight'),
+            ((stoplist_id, n[0], 1.0) for n in ngrams_to_stop)
+        )
+        return stoplist_id
+
     stop = LISTTYPES["STOPLIST"]({ n[0] : -1 for n in ngrams_to_stop})
     # stop = LISTTYPES["STOPLIST"]([n[0] for n in ngrams_to_stop])
     stop.save(stoplist_id)
@@ -8,14 +8,18 @@ from .hyperdata_indexing  import index_hyperdata
 from .list_stop           import do_stoplist
 from .ngram_groups        import compute_groups
 from .metric_tfidf        import compute_occs, compute_tfidf_local, compute_ti_ranking
+from .metric_tfidf        import CorpusCounts
 from .list_main           import do_mainlist
 from .ngram_coocs         import compute_coocs
 #from .ngram_coocs_old_sqlalchemy_version import compute_coocs
 from .metric_specgen      import compute_specgen
 from .list_map            import do_maplist
 from .mail_notification   import notify_owner
-from gargantext.util.db   import session
-from gargantext.models    import Node
+from gargantext.util.db   import session, func, bulk_upsert
+from gargantext.util.digest import str_digest
+from gargantext.util.lists import SparseWeightedMatrix
+from gargantext.models    import Node, NodeNgram, NodeNgramNgram
+from gargantext.constants import DEFAULT_COOC_THRESHOLD
 
 from datetime             import datetime
 from celery               import shared_task
@@ -66,7 +70,8 @@ def parse_extract_indexhyperdata(corpus):
     corpus.status('Docs', progress=1)
     corpus.save_hyperdata()
     session.commit()
-    parse(corpus)
+    # (nodes_hyperdata rows are written along with the docs)
+    parse(corpus, with_hyperdata_index=True)
     
     docs = corpus.children("DOCUMENT").count()
     print('CORPUS #%d: parsed %d' % (corpus.id, docs))
@@ -82,8 +87,8 @@ def parse_extract_indexhyperdata(corpus):
 
 
     print('CORPUS #%d: extracted ngrams' % (corpus.id))
-    index_hyperdata(corpus)
-    print('CORPUS #%d: indexed hyperdata' % (corpus.id))
+    # hyperdata already indexed during parsing
+    # (otherwise: index_hyperdata(corpus))
 
     # -> 'favorites' node
     favs = corpus.add_child(
@@ -120,14 +125,15 @@ def parse_extract_indexhyperdata(corpus):
     print('CORPUS #%d: [%s] new grouplist node #%i' % (corpus.id, t(), group_id))
 
     # ------------
+    # -> count once for occurrences, ti_ranking and local tfidf
+    counts = CorpusCounts(corpus, groupings_id = group_id)
+
     # -> write occurrences to Node and NodeNodeNgram
-    occ_id = compute_occs(corpus, groupings_id = group_id)
+    occ_id = counts.save_occs()
     print('CORPUS #%d: [%s] new occs node #%i' % (corpus.id, t(), occ_id))
 
     # -> write cumulated ti_ranking (tfidf ranking vector) to Node and NodeNodeNgram
-    tirank_id = compute_ti_ranking(corpus,
-                                   groupings_id = group_id,
-                                   count_scope="global")
+    tirank_id = counts.save_ti_ranking(count_scope="global")
     print('CORPUS #%d: [%s] new ti ranking node #%i' % (corpus.id, t(), tirank_id))
 
     # -> mainlist: filter + write (to Node and NodeNgram)
@@ -137,11 +143,10 @@ def parse_extract_indexhyperdata(corpus):
     print('CORPUS #%d: [%s] new mainlist node #%i' % (corpus.id, t(), mainlist_id))
 
     # -> write local tfidf similarities to Node and NodeNodeNgram
-    ltfidf_id = compute_tfidf_local(corpus,
-                                    on_list_id=mainlist_id,
-                                    groupings_id = group_id)
+    ltfidf_id = counts.save_tfidf_local(on_list_id=mainlist_id)
     print('CORPUS #%d: [%s] new localtfidf node #%i' % (corpus.id, t(), ltfidf_id))
     # => used for doc <=> ngram association
+    del counts
 
     # ------------
     # -> cooccurrences on mainlist: compute + write (=> Node and NodeNgramNgram)*
@@ -241,26 +246,24 @@ def recount(corpus):
     corpus.save_hyperdata()
     session.commit()
 
+    # -> count once for occurrences, ti_ranking and local tfidf
+    counts = CorpusCounts(corpus, groupings_id = group_id)
+
     # -> overwrite occurrences (=> NodeNodeNgram)
-    occ_id = compute_occs(corpus,
-                            groupings_id = group_id,
-                            overwrite_id=old_occ_id)
+    occ_id = counts.save_occs(overwrite_id=old_occ_id)
     print('RECOUNT #%d: [%s] updated occs node #%i' % (corpus.id, t(), occ_id))
 
     # -> write cumulated ti_ranking (tfidf ranking vector) (=> NodeNodeNgram)
-    tirank_id = compute_ti_ranking(corpus,
-                                   groupings_id = group_id,
-                                   count_scope="global",
-                                   overwrite_id=old_tirank_id)
+    tirank_id = counts.save_ti_ranking(count_scope="global",
+                                       overwrite_id=old_tirank_id)
     print('RECOUNT #%d: [%s] updated ti ranking node #%i' % (corpus.id, t(), tirank_id))
 
     # -> write local tfidf similarities to (=> NodeNodeNgram)
-    ltfidf_id = compute_tfidf_local(corpus,
-                                    on_list_id = mainlist_id,
-                                    groupings_id = group_id,
-                                    overwrite_id = old_ltfidf_id)
+    ltfidf_id = counts.save_tfidf_local(on_list_id = mainlist_id,
+                                        overwrite_id = old_ltfidf_id)
     print('RECOUNT #%d: [%s] updated localtfidf node #%i' % (corpus.id, t(), ltfidf_id))
     # => used for doc <=> ngram association
+    del counts
 
     # ------------
     # -> cooccurrences on mainlist: compute + write (=> NodeNgramNgram)
@@ -285,5 +288,196 @@ def recount(corpus):
     corpus.save_hyperdata()
     session.commit()
 
+def _lists_fingerprint(mainlist_id, group_id):
+    """
+    A digest of the mainlist terms and of the groups
+    (the only changes after which the mainlist coocs must be fully recounted)
+    """
+    main_ids = sorted(row[0] for row in (session
+                        .query(NodeNgram.ngram_id)
+                        .filter(NodeNgram.node_id == mainlist_id)
+                       ))
+    groups = sorted(session
+                        .query(NodeNgramNgram.ngram1_id, NodeNgramNgram.ngram2_id)
+                        .filter(NodeNgramNgram.node_id == group_id)
+                        .all()
+                   )
+    return str_digest(repr((main_ids, groups)).encode())
+
+
+def _mainlist_coocs(corpus, mainlist_id, group_id, from_doc_id=None):
+    """
+    Returns the coocs on the mainlist for spec/gen-clusion
+    (with the same threshold as in the full toolchain)
+
+    All the counts (threshold 1) are kept in a COOCCURRENCES child of the
+    MAINLIST node (so it's not listed with the graphs of the corpus): with
+    from_doc_id only the docs with id >= from_doc_id are counted and added.
+    They're fully recounted if there's no such node yet or if the mainlist
+    or the groups changed since.
+    """
+    mainlist = session.query(Node).filter(Node.id == mainlist_id).first()
+    counts_node = mainlist.children('COOCCURRENCES').first()
+    fingerprint = _lists_fingerprint(mainlist_id, group_id)
+
+    if (from_doc_id and counts_node is not None
+                    and counts_node.hyperdata.get('fingerprint') == fingerprint):
+        new_counts = compute_coocs(corpus,
+                                    on_list_id = mainlist_id,
+                                    groupings_id = group_id,
+                                    threshold = 1,
+                                    symmetry_filter = True,
+                                    diagonal_filter = False,
+                                    from_doc_id = from_doc_id)
+        bulk_upsert(
+            NodeNgramNgram,
+            ('node_id', 'ngram1_id', 'ngram2_id'),
+            ('node_id', 'ngram1_id', 'ngram2_id', 'weight'),
+            ((counts_node.id, key1, key2, value) for key1, key2, value in new_counts),
+            accumulate = True
+        )
+    else:
+        all_counts = compute_coocs(corpus,
+                                    on_list_id = mainlist_id,
+                                    groupings_id = group_id,
+                                    threshold = 1,
+                                    symmetry_filter = True,
+                                    diagonal_filter = False)
+        if counts_node is None:
+            counts_node = mainlist.add_child(
+                typename = "COOCCURRENCES",
+                name = "Mainlist coocs (in:%s)" % corpus.id
+            )
+            session.add(counts_node)
+        counts_node.hyperdata = { 'corpus'     : corpus.id,
+                                  'threshold'  : 1,
+                                  'fingerprint': fingerprint }
+        counts_node.save_hyperdata()
+        session.commit()
+        all_counts.save(counts_node.id)
+
+    return SparseWeightedMatrix(counts_node.id).thresholded(DEFAULT_COOC_THRESHOLD)
+
+
+@shared_task
+def update_corpus(corpus):
+    """
+    Incremental version of parse_extract_indexhyperdata, after some new
+    resources were added to a corpus that already went through the toolchain
+
+    ==> only the new resources are parsed and extracted
+        (cf. resource['extracted'])
+    ==> the counts in the new docs are applied as deltas to the metrics:
+         - occurrences
+         - ti_rank
+         - tfidf
+         - coocs (of the mainlist)
+         - specclusion/genclusion (recomputed from the coocs)
+    ==> the lists only change where their thresholds do:
+         - new terms matching the stoplist filters are added to it
+         - new terms are grouped with the older terms of same stem
+           (or between them), the previous groupings are kept
+         - if the mainlist limit grew, the best new terms fill the new places
+         - the maplist (often curated by the user) is kept
+
+    NB: the new docs are the ones with id >= from_doc_id (ids are sequential)
+    """
+    # retrieve corpus from database from id
+    if isinstance(corpus, int):
+        corpus_id = corpus
+        corpus = session.query(Node).filter(Node.id == corpus_id).first()
+        if corpus is None:
+            print('NO SUCH CORPUS: #%d' % corpus_id)
+            return
+
+    last_doc_id = (session
+                    .query(func.max(Node.id))
+                    .filter(Node.parent_id == corpus.id)
+                    .filter(Node.typename == "DOCUMENT")
+                    .scalar()
+                  )
+    if last_doc_id is None:
+        # nothing to update: first run
+        return parse_extract_indexhyperdata(corpus)
+    from_doc_id = last_doc_id + 1
+
+    # the nodes we're going to update
+    nodes_ids = {}
+    for typename in ["STOPLIST", "GROUPLIST", "MAINLIST", "OCCURRENCES",
+                     "TIRANK-GLOBAL", "TFIDF-CORPUS", "SPECCLUSION", "GENCLUSION"]:
+        node = corpus.children(typename).first()
+        if node is None:
+            raise ValueError("UPDATE: no %s node in corpus #%i" % (typename, corpus.id))
+        nodes_ids[typename] = node.id
+    group_id    = nodes_ids["GROUPLIST"]
+    mainlist_id = nodes_ids["MAINLIST"]
+
+    # Instantiate status
+    corpus.status('Updating workflow', progress=1)
+    corpus.save_hyperdata()
+    session.commit()
+
+    # -> new docs (and their nodes_hyperdata rows)
+    parse(corpus, with_hyperdata_index=True)
+    new_docs = corpus.children("DOCUMENT").filter(Node.id >= from_doc_id).count()
+    print('UPDATE #%d: [%s] parsed %d new docs' % (corpus.id, t(), new_docs))
+
+    if new_docs:
+        extract_ngrams(corpus, from_doc_id = from_doc_id)
+        print('UPDATE #%d: [%s] extracted ngrams' % (corpus.id, t()))
+
+        # -> stoplist: filter the new terms only
+        do_stoplist(corpus, overwrite_id = nodes_ids["STOPLIST"],
+                            from_doc_id = from_doc_id)
+
+        # -> groups: the new terms only (=> NodeNgramNgram)
+        compute_groups(corpus, stoplist_id = None,
+                               overwrite_id = group_id,
+                               from_doc_id = from_doc_id)
+        print('UPDATE #%d: [%s] updated grouplist node #%i'
+                % (corpus.id, t(), group_id))
+
+        # -> add the occurrences in the new docs (=> NodeNodeNgram)
+        compute_occs(corpus, groupings_id = group_id,
+                             overwrite_id = nodes_ids["OCCURRENCES"],
+                             from_doc_id = from_doc_id)
+        print('UPDATE #%d: [%s] updated occs node #%i'
+                % (corpus.id, t(), nodes_ids["OCCURRENCES"]))
+
+        # -> recount ti_ranking of the terms in the new docs (=> NodeNodeNgram)
+        compute_ti_ranking(corpus, groupings_id = group_id,
+                                   count_scope = "global",
+                                   overwrite_id = nodes_ids["TIRANK-GLOBAL"],
+                                   from_doc_id = from_doc_id)
+        print('UPDATE #%d: [%s] updated ti ranking node #%i'
+                % (corpus.id, t(), nodes_ids["TIRANK-GLOBAL"]))
+
+        # -> mainlist: only grows if its limit grew
+        do_mainlist(corpus, overwrite_id = mainlist_id,
+                            ranking_scores_id = nodes_ids["TIRANK-GLOBAL"],
+                            stoplist_id = nodes_ids["STOPLIST"],
+                            from_doc_id = from_doc_id)
+
+        # -> local tfidf: new docs + new idf for the others (=> NodeNodeNgram)
+        compute_tfidf_local(corpus, on_list_id = mainlist_id,
+                                    groupings_id = group_id,
+                                    overwrite_id = nodes_ids["TFIDF-CORPUS"],
+                                    from_doc_id = from_doc_id)
+        print('UPDATE #%d: [%s] updated localtfidf node #%i'
+                % (corpus.id, t(), nodes_ids["TFIDF-CORPUS"]))
+
+        # -> mainlist coocs + specclusion/genclusion (=> NodeNgram)
+        coocs = _mainlist_coocs(corpus, mainlist_id, group_id,
+                                from_doc_id = from_doc_id)
+        compute_specgen(corpus, cooc_matrix = coocs,
+                        spec_overwrite_id = nodes_ids["SPECCLUSION"],
+                        gen_overwrite_id = nodes_ids["GENCLUSION"])
+        print('UPDATE #%d: [%s] updated spec/gen-clusion nodes' % (corpus.id, t()))
+
+    corpus.status('Updating workflow', progress=10, complete=True)
+    corpus.save_hyperdata()
+    session.commit()
+
+
 def t():
     return datetime.now().strftime("%Y-%m-%d_%H:%M:%S")
@@ -1,20 +1,28 @@
 """
 Computes a specificity metric from the ngram cooccurrence matrix.
- + SAVE => WeightedList => NodeNgram
+ + SAVE => NodeNgram
 """
 from gargantext.models        import Node, Ngram, NodeNgram, NodeNgramNgram
 from gargantext.util.db       import session, aliased, func, bulk_insert
-from gargantext.util.lists    import WeightedList
-from collections              import defaultdict
-from pandas                   import DataFrame
-from numpy                    import diag
+from gargantext.util.lists    import SparseWeightedMatrix
+from itertools                import chain, repeat
+from scipy                    import sparse
+import numpy as np
 
-def round3(floating_number):
+def _metric_node(corpus, typename, name, overwrite_id=None):
     """
-    Rounds a floating number to 3 decimals
-    Good when we don't need so much details in the DB writen data
+    Returns the id of a (new or emptied) metric node for the corpus
     """
-    return float("%.3f" % floating_number)
+    if overwrite_id:
+        # overwrite pre-existing id
+        session.query(NodeNgram).filter(NodeNgram.node_id==overwrite_id).delete()
+        session.commit()
+        return overwrite_id
+    else:
+        the_node = corpus.add_child(typename = typename, name = name)
+        session.add(the_node)
+        session.commit()
+        return the_node.id
 
 def compute_specgen(corpus, cooc_id=None, cooc_matrix=None,
                     spec_overwrite_id = None, gen_overwrite_id = None):
@@ -29,41 +37,39 @@ def compute_specgen(corpus, cooc_id=None, cooc_matrix=None,
         Gen-clusion(i)  = (Spec(i) + Gen(i)) / 2
         Spec-clusion(i) = (Spec(i) - Gen(i)) / 2
 
+    All the computation stays on a sparse matrix (nothing is ever NxN dense)
+    and the 2 resulting lists are written together in one COPY.
+
     Parameters:
-        - cooc_id: mandatory id of a cooccurrences node to use as base
+        - cooc_id: id of a cooccurrences node to use as base
+        - cooc_matrix: or directly a WeightedMatrix (or SparseWeightedMatrix)
         - spec_overwrite_id: optional preexisting specificity node to overwrite
         - gen_overwrite_id: optional preexisting genericity node to overwrite
     '''
 
-    matrix = defaultdict(lambda : defaultdict(float))
-
-    if cooc_id == None and cooc_matrix == None:
+    if cooc_id is None and cooc_matrix is None:
         raise TypeError("compute_specificity: needs a cooc_id or cooc_matrix param")
 
     elif cooc_id:
-        cooccurrences = (session.query(NodeNgramNgram)
-                        .filter(NodeNgramNgram.node_id==cooc_id)
-                        )
         # no filtering: cooc already filtered on mainlist_id at creation
-        for cooccurrence in cooccurrences:
-            matrix[cooccurrence.ngram1_id][cooccurrence.ngram2_id] = cooccurrence.weight
-            # matrix[cooccurrence.ngram2_id][cooccurrence.ngram1_id] = cooccurrence.weight
-
-    elif cooc_matrix:
-        # copy WeightedMatrix into local matrix structure
-        for (ngram1_id, ngram2_id) in cooc_matrix.items:
-
-            w = cooc_matrix.items[(ngram1_id, ngram2_id)]
-            # ------- 8< --------------------------------------------
-            # tempo hack to ignore lines/columns where diagonal == 0
-            # £TODO find why they exist and then remove this snippet
-            if (((ngram1_id,ngram1_id) not in cooc_matrix.items) or
-                ((ngram2_id,ngram2_id) not in cooc_matrix.items)):
-                continue
-            # ------- 8< --------------------------------------------
-            matrix[ngram1_id][ngram2_id] = w
-
-    nb_ngrams = len(matrix)
+        coocs = SparseWeightedMatrix(cooc_id)
+
+    elif isinstance(cooc_matrix, SparseWeightedMatrix):
+        coocs = cooc_matrix
+
+    else:
+        # copy WeightedMatrix into the sparse structure
+        coocs = SparseWeightedMatrix(cooc_matrix)
+
+    # ------- 8< --------------------------------------------
+    # tempo hack to ignore lines/columns where diagonal == 0
+    # £TODO find why they exist and then remove this snippet
+    keep = np.flatnonzero(coocs.matrix.diagonal())
+    # ------- 8< --------------------------------------------
+    ngram_ids = coocs.index[keep]
+    cooc_counts = coocs.matrix[keep,:][:,keep]
+
+    nb_ngrams = len(ngram_ids)
 
     print("SPECIFICITY: computing on %i ngrams" % nb_ngrams)
 
@@ -78,9 +84,7 @@ def compute_specgen(corpus, cooc_id=None, cooc_matrix=None,
     # "The report says that grass is food for some animals."
 
     #===========================================================================
-    cooc_counts = DataFrame(matrix).fillna(0)
-
-    # cooc_counts matrix
+    # cooc_counts matrix (sparse: only the non-zero cells are stored)
     # ------------------
     #           animals  food  grass  humans  report  rivers  war  water
     # animals         4     2      1       1       4       0    0      1
@@ -94,18 +98,14 @@ def compute_specgen(corpus, cooc_id=None, cooc_matrix=None,
 
     #===========================================================================
     # conditional p(col|line)
-    diagonal = list(diag(cooc_counts))
-
+    diagonal = cooc_counts.diagonal()
 
-    # debug
-    # print("WARN diag: ", diagonal)
-    # print("WARN diag: =================== 0 in diagonal ?\n",
-    #         0 in diagonal ? "what ??? zeros in the diagonal :/" : "ok no zeros",
-    #         "\n===================")
+    # each line i of the matrix divided by its diagonal value N(ii)
+    # NB: the result is stored transposed (p_col_given_line[i,j] = P(j|i)
+    #     is at line j, column i of the table below)
+    p_col_given_line = sparse.diags(1. / diagonal, 0).dot(cooc_counts)
 
-    p_col_given_line = cooc_counts / list(diag(cooc_counts))
-
-    # p_col_given_line
+    # p_col_given_line (transposed)
     # ----------------
     #          animals  food  grass  humans  report rivers   war  water
     # animals      1.0   0.7    1.0     0.3     0.6    0.0   0.0    0.3
@@ -118,11 +118,9 @@ def compute_specgen(corpus, cooc_id=None, cooc_matrix=None,
     # water        0.2   0.3    0.0     0.3     0.4    1.0   0.0    1.0
 
     #===========================================================================
-    # total per lines (<=> genericity)
-    Gen = p_col_given_line.sum(axis=1)
+    # total per lines of the table (<=> genericity)
+    Gen = np.asarray(p_col_given_line.sum(axis=0)).ravel()
 
-    # Gen.sort_values(ascending=False)
-    # ---
     # report    8.0
     # animals   3.9
     # food      3.6
@@ -133,11 +131,9 @@ def compute_specgen(corpus, cooc_id=None, cooc_matrix=None,
     # rivers    1.5
 
     #===========================================================================
-    # total columnwise (<=> specificity)
-    Spec = p_col_given_line.sum(axis=0)
+    # total per columns of the table (<=> specificity)
+    Spec = np.asarray(p_col_given_line.sum(axis=1)).ravel()
 
-    # Spec.sort_values(ascending=False)
-    # ----
     # grass     4.0
     # food      3.7
     # water     3.3
@@ -152,8 +148,6 @@ def compute_specgen(corpus, cooc_id=None, cooc_matrix=None,
     # our "inclusion by specificity" metric
     Specclusion = Spec-Gen
 
-    # Specclusion.sort_values(ascending=False)
-    # -----------
     # grass      1.1
     # war        0.8
     # rivers     0.8
@@ -167,8 +161,6 @@ def compute_specgen(corpus, cooc_id=None, cooc_matrix=None,
     # our "inclusion by genericity" metric
     Genclusion = Spec+Gen
 
-    # Genclusion.sort_values(ascending=False)
-    # -----------
     # report     11.3
     # food        7.3
     # animals     7.2
@@ -179,55 +171,26 @@ def compute_specgen(corpus, cooc_id=None, cooc_matrix=None,
     # rivers      4.5
 
     #===========================================================================
-    # specificity node
-    if spec_overwrite_id:
-        # overwrite pre-existing id
-        the_spec_id = spec_overwrite_id
-        session.query(NodeNgram).filter(NodeNgram.node_id==the_spec_id).delete()
-        session.commit()
-    else:
-        specnode = corpus.add_child(
-            typename  = "SPECCLUSION",
-            name = "Specclusion (in:%s)" % corpus.id
-        )
-        session.add(specnode)
-        session.commit()
-        the_spec_id = specnode.id
-
-    if not Specclusion.empty:
-        data = WeightedList(
-                zip(  Specclusion.index.tolist()
-                    , [v for v  in map(round3, Specclusion.values.tolist())]
-                 )
-               )
-        data.save(the_spec_id)
-    else:
-        print("WARNING: had no terms in COOCS => empty SPECCLUSION node")
-
-    #===========================================================================
-    # genclusion node
-    if gen_overwrite_id:
-        the_gen_id = gen_overwrite_id
-        session.query(NodeNgram).filter(NodeNgram.node_id==the_gen_id).delete()
-        session.commit()
-    else:
-        gennode = corpus.add_child(
-            typename  = "GENCLUSION",
-            name = "Genclusion (in:%s)" % corpus.id
+    # specificity and genclusion nodes
+    the_spec_id = _metric_node(corpus, "SPECCLUSION",
+                               "Specclusion (in:%s)" % corpus.id,
+                               overwrite_id = spec_overwrite_id)
+    the_gen_id  = _metric_node(corpus, "GENCLUSION",
+                               "Genclusion (in:%s)" % corpus.id,
+                               overwrite_id = gen_overwrite_id)
+
+    if nb_ngrams:
+        ngram_ids = ngram_ids.tolist()
+        bulk_insert(
+            NodeNgram,
+            ('node_id', 'ngram_id', 'weight'),
+            chain(
+                zip(repeat(the_spec_id), ngram_ids, np.round(Specclusion, 3).tolist()),
+                zip(repeat(the_gen_id),  ngram_ids, np.round(Genclusion, 3).tolist())
+            )
         )
-        session.add(gennode)
-        session.commit()
-        the_gen_id = gennode.id
-
-    if not Genclusion.empty:
-        data = WeightedList(
-                zip(  Genclusion.index.tolist()
-                    , [v for v  in map(round3, Genclusion.values.tolist())]
-                 )
-               )
-        data.save(the_gen_id)
     else:
-        print("WARNING: had no terms in COOCS => empty GENCLUSION node")
+        print("WARNING: had no terms in COOCS => empty SPECCLUSION and GENCLUSION nodes")
 
     #===========================================================================
     return(the_spec_id, the_gen_id)
@@ -10,25 +10,32 @@ FIXME: "having the same source" means we need to select inside hyperdata
 
 from gargantext.models   import Node, NodeNgram, NodeNodeNgram, NodeNgramNgram
 from gargantext.util.db_cache  import cache
-from gargantext.util.db  import session, bulk_insert, aliased, \
+from gargantext.util.db  import session, bulk_insert, bulk_upsert, aliased, \
+                                get_cursor, \
                                 func # = sqlalchemy.func like sum() or count()
 from sqlalchemy.sql.expression import case # for choice if ngram has mainform or not
 from sqlalchemy import distinct   # for list of unique ngram_ids within a corpus
+from gargantext.constants import BATCH_METRICS_SIZE
 from math                import log
+from array               import array
+from collections         import defaultdict
+from itertools           import chain
 from re                  import match
 from datetime             import datetime
+import numpy as np
 # £TODO
 # from gargantext.util.lists import WeightedIndex
 
 def t():
     return datetime.now().strftime("%Y-%m-%d_%H:%M:%S")
 
-def compute_occs(corpus, overwrite_id = None, groupings_id = None,):
+def compute_occs(corpus, overwrite_id = None, groupings_id = None,
+                 from_doc_id = None):
     """
     Calculates sum of occs per ngram (or per mainform if groups) within corpus
                  (used as info in the ngrams table view)
 
-    ? optimize ?  OCCS here could be calculated simultaneously within TFIDF-CORPUS loop
+    NB: CorpusCounts.save_occs gives the same with one scan for the 3 metrics
 
     ? use cases ?
        => not the main score for users (their intuition for nb of docs having word)
@@ -40,7 +47,13 @@ def compute_occs(corpus, overwrite_id = None, groupings_id = None,):
         - groupings_id: optional id of a GROUPLIST node for these ngrams
                         IF absent the occurrences are the sums for each ngram
                         IF present they're the sums for each ngram's mainform
+        - from_doc_id: optional incremental mode (needs overwrite_id)
+                       only the docs with id >= from_doc_id are counted and
+                       their sums are added to the previous OCCURRENCES rows
     """
+    if from_doc_id and not overwrite_id:
+        raise ValueError("compute_occs: from_doc_id needs the overwrite_id to update")
+
     #  simple case : no groups
     #                ---------
     #    (the occurrences are the sums for each ngram)
@@ -109,6 +122,10 @@ def compute_occs(corpus, overwrite_id = None, groupings_id = None,):
                     .group_by("counted_form")
                  )
 
+    # incremental mode: only the new docs
+    if from_doc_id:
+        occs_q = occs_q.filter(Node.id >= from_doc_id)
+
     #print(str(occs_q.all()))
     occ_sums = occs_q.all()
     # example result = [(1970, 1.0), (2024, 2.0),  (259, 2.0), (302, 1.0), ... ]
@@ -117,6 +134,17 @@ def compute_occs(corpus, overwrite_id = None, groupings_id = None,):
     #                   OR
     #              counted_form
 
+    if from_doc_id:
+        # add the new sums to the previous ones
+        bulk_upsert(
+            NodeNodeNgram,
+            ('node1_id', 'node2_id', 'ngram_id'),
+            ('node1_id', 'node2_id', 'ngram_id', 'score'),
+            ((overwrite_id, corpus.id, res[0], res[1]) for res in occ_sums),
+            accumulate = True
+        )
+        return overwrite_id
+
     if overwrite_id:
         # overwrite pre-existing id
         the_id = overwrite_id
@@ -146,7 +174,7 @@ def compute_occs(corpus, overwrite_id = None, groupings_id = None,):
 def compute_ti_ranking(corpus,
                        groupings_id = None,
                        count_scope="local", termset_scope="local",
-                       overwrite_id=None):
+                       overwrite_id=None, from_doc_id=None):
     """
     Calculates tfidf ranking within given scope
                 ----------
@@ -176,6 +204,13 @@ def compute_ti_ranking(corpus,
 
       - overwrite_id: optional id of a pre-existing XXXX node for this corpus
                    (the Node and its previous Node NodeNgram rows will be replaced)
+
+      - from_doc_id: optional incremental mode (needs overwrite_id)
+                     only the ngram forms occurring in the docs with
+                     id >= from_doc_id are recounted (in the whole scope) and
+                     their scores replace the previous ones. The other scores
+                     are kept as they are (their idf only drifts with the
+                     total docs, like when other corpora of the source change)
     """
     print("compute_ti_ranking")
     # validate string params
@@ -185,6 +220,8 @@ def compute_ti_ranking(corpus,
         raise ValueError("compute_ti_ranking: termset_scope param allowed values: 'local', 'global'")
     if count_scope == "local" and termset_scope == "global":
         raise ValueError("compute_ti_ranking: the termset_scope param can be 'global' iff count_scope param is 'global' too.")
+    if from_doc_id and not overwrite_id:
+        raise ValueError("compute_ti_ranking: from_doc_id needs the overwrite_id to update")
 
     # get corpus
     if type(corpus) == int:
@@ -324,6 +361,29 @@ def compute_ti_ranking(corpus,
                           )
             # ---
 
+    # incremental mode: only recount the forms occurring in the new docs
+    if from_doc_id:
+        new_forms_query = (session
+                            .query(ngform_i)
+                            .select_from(NodeNgram)
+                            .distinct()
+                          )
+        if groupings_id:
+            new_forms_query = new_forms_query.outerjoin(
+                                        syno,
+                                        syno.c.ngram2_id == NodeNgram.ngram_id
+                                        )
+        new_forms_query = (new_forms_query
+                            .join(Node, Node.id == NodeNgram.node_id)
+                            .filter(Node.typename == "DOCUMENT")
+                            .filter(Node.parent_id == corpus_id)
+                            .filter(Node.id >= from_doc_id)
+                          )
+        new_forms = [row[0] for row in new_forms_query.all()]
+        if not new_forms:
+            return overwrite_id
+        tf_nd_query = tf_nd_query.filter(ngform_i.in_(new_forms))
+
     # M
     total_docs = session.query(countdocs_subquery).count()
     log_tot_docs = log(total_docs)
@@ -345,6 +405,16 @@ def compute_ti_ranking(corpus,
     # N pour info
     total_ngramforms = len(tfidfsum)
 
+    if from_doc_id:
+        # replace the recounted scores (and add the new forms)
+        bulk_upsert(
+            NodeNodeNgram,
+            ('node1_id', 'node2_id', 'ngram_id'),
+            ('node1_id', 'node2_id', 'ngram_id', 'score'),
+            ((overwrite_id, corpus_id, ng, tfidfsum[ng]) for ng in tfidfsum)
+        )
+        return overwrite_id
+
     if overwrite_id:
         the_id = overwrite_id
         session.query(NodeNodeNgram).filter(NodeNodeNgram.node1_id == the_id).delete()
@@ -387,7 +457,8 @@ def compute_ti_ranking(corpus,
 def compute_tfidf_local(corpus,
                         on_list_id=None,
                         groupings_id=None,
-                        overwrite_id=None):
+                        overwrite_id=None,
+                        from_doc_id=None):
     """
     Calculates tfidf similarity of each (doc, ngram) couple, within the current corpus
 
@@ -398,8 +469,13 @@ def compute_tfidf_local(corpus,
       - on_list_id: mainlist or maplist type, to constrain the input ngrams
       - overwrite_id: optional id of a pre-existing TFIDF-XXXX node for this corpus
                    (the Node and its previous NodeNodeNgram rows will be replaced)
+      - from_doc_id: optional incremental mode (needs overwrite_id)
+                   only the docs with id >= from_doc_id are counted
+                   (cf. _update_tfidf_local)
     """
     print("Compute TFIDF local")
+    if from_doc_id and not overwrite_id:
+        raise ValueError("compute_tfidf_local: from_doc_id needs the overwrite_id to update")
     
     # All docs of this corpus
     docids_subquery = (session
@@ -454,6 +530,11 @@ def compute_tfidf_local(corpus,
                 .filter( Miamlist.node_id == on_list_id )
             )
 
+    if from_doc_id:
+        return _update_tfidf_local(overwrite_id, tf_doc_query, ngform_id,
+                                   docids_subquery, total_docs, from_doc_id,
+                                   on_list_id = on_list_id)
+
     # execute query to do our tf sum
     tf_per_doc = tf_doc_query.group_by(NodeNgram.node_id, ngform_id).all()
 
@@ -527,3 +608,323 @@ def compute_tfidf_local(corpus,
     )
 
     return the_id
+
+
+def _update_tfidf_local(tfidf_id, tf_doc_query, ngform_id,
+                        docids_subquery, total_docs, from_doc_id,
+                        on_list_id=None):
+    """
+    Incremental mode of compute_tfidf_local
+
+    Writes the rows of the new docs (id >= from_doc_id) and updates the
+    previous rows to the new total of docs N and new nd of each ngram.
+
+    The previous tfs are not recounted: all the rows of an ngram share the
+    same idf so they're just multiplied by new_idf/old_idf in one UPDATE.
+    Only the ngrams where that's impossible are recounted in all the docs:
+      - those with old_idf == 0 (ie present in all the previous docs)
+      - those that were added to the list after the previous count
+    """
+    # previous N and nd (the previous rows are exactly the (doc, ngram) couples)
+    old_total_docs = (session.query(docids_subquery)
+                        .filter(docids_subquery.c.id < from_doc_id)
+                        .count()
+                     )
+    old_nd = dict(session
+                    .query(NodeNodeNgram.ngram_id, func.count(NodeNodeNgram.node2_id))
+                    .filter(NodeNodeNgram.node1_id == tfidf_id)
+                    .group_by(NodeNodeNgram.ngram_id)
+                    .all()
+                 )
+
+    # the ngrams to recount
+    recount = {ng for ng, nd in old_nd.items() if nd >= old_total_docs}
+    if on_list_id:
+        recount |= {row[0] for row in (session
+                                        .query(NodeNgram.ngram_id)
+                                        .filter(NodeNgram.node_id == on_list_id)
+                                      )
+                            if row[0] not in old_nd}
+
+    # tf in the new docs
+    new_tf = [row for row in (tf_doc_query
+                                .filter(NodeNgram.node_id >= from_doc_id)
+                                .group_by(NodeNgram.node_id, ngform_id)
+                                .all()
+                             )
+                  if row[0] not in recount]
+
+    # tf in all the docs for the recounted ngrams
+    if recount:
+        recount_tf = (tf_doc_query
+                        .filter(ngform_id.in_(recount))
+                        .group_by(NodeNgram.node_id, ngform_id)
+                        .all()
+                     )
+    else:
+        recount_tf = []
+
+    # new nd
+    nd = defaultdict(int)
+    for triple in chain(new_tf, recount_tf):
+        nd[triple[0]] += 1
+    for ng in old_nd:
+        if ng not in recount:
+            nd[ng] += old_nd[ng]
+
+    log_tot_docs = log(total_docs)
+
+    # factors for the previous rows
+    idf_factors = { ng : ( (log_tot_docs - log(nd[ng]))
+                         / (log(old_total_docs) - log(old_nd_count)) )
+                        for (ng, old_nd_count) in old_nd.items()
+                        if ng not in recount }
+
+    # previous rows of the recounted ngrams will be rewritten
+    if recount:
+        (session.query(NodeNodeNgram)
+            .filter(NodeNodeNgram.node1_id == tfidf_id)
+            .filter(NodeNodeNgram.ngram_id.in_(recount))
+            .delete(synchronize_session=False)
+        )
+        session.commit()
+
+    db, cursor = get_cursor()
+
+    # update the previous rows
+    cursor.execute('CREATE TEMPORARY TABLE __tmp_idf__ (ngram_id INTEGER, factor DOUBLE PRECISION)')
+    bulk_insert('__tmp_idf__', ('ngram_id', 'factor'), idf_factors.items(), cursor=cursor)
+    cursor.execute('''
+        UPDATE nodes_nodes_ngrams
+        SET score = score * __tmp_idf__.factor
+        FROM __tmp_idf__
+        WHERE nodes_nodes_ngrams.node1_id = %s
+          AND nodes_nodes_ngrams.ngram_id = __tmp_idf__.ngram_id
+    ''', (tfidf_id,))
+    cursor.execute('DROP TABLE __tmp_idf__')
+
+    # add the new rows
+    bulk_insert(
+        NodeNodeNgram,
+        ('node1_id', 'node2_id','ngram_id', 'score'),
+        ((tfidf_id, node_id, ngram_id, tf * (log_tot_docs - log(nd[ngram_id])))
+            for (ngram_id, node_id, tf) in chain(new_tf, recount_tf)),
+        cursor = cursor
+    )
+    db.commit()
+
+    return tfidf_id
+
+
+def _metric_node_id(corpus, typename, name, overwrite_id=None):
+    """
+    Returns the id of a new metric node of the corpus
+    (or of the overwrite_id node, after removing its previous NodeNodeNgram rows)
+    """
+    if overwrite_id:
+        session.query(NodeNodeNgram).filter(NodeNodeNgram.node1_id == overwrite_id).delete()
+        session.commit()
+        return overwrite_id
+    else:
+        the_node = corpus.add_child(typename = typename, name = name)
+        session.add(the_node)
+        session.commit()
+        return the_node.id
+
+
+class CorpusCounts:
+    """
+    Fused version of compute_occs, compute_ti_ranking and compute_tfidf_local
+
+    The grouped (doc, counted_form, tf) rows of the corpus are streamed once
+    and kept in compact arrays, then each metric is derived from them and
+    written with one COPY:
+
+        counts    = CorpusCounts(corpus, groupings_id = group_id)
+        occ_id    = counts.save_occs()                  # OCCURRENCES
+        tirank_id = counts.save_ti_ranking()            # TIRANK-GLOBAL
+        ...
+        ltfidf_id = counts.save_tfidf_local(mainlist_id)  # TFIDF-CORPUS
+
+    (all the save_* accept an overwrite_id like their compute_* versions)
+
+    NB: in the "global" count_scope only the other corpora of the source
+        still need a query (this corpus' counts are already there)
+    """
+
+    def __init__(self, corpus, groupings_id=None, batch_size=BATCH_METRICS_SIZE):
+        self.corpus = corpus
+        self.groupings_id = groupings_id
+
+        # the counted form: the ngram or its mainform if groups
+        if groupings_id:
+            self.syno = (session.query(NodeNgramNgram.ngram1_id,
+                                       NodeNgramNgram.ngram2_id)
+                            .filter(NodeNgramNgram.node_id == groupings_id)
+                            .subquery()
+                        )
+            self.ngform = case([(self.syno.c.ngram1_id != None, self.syno.c.ngram1_id)],
+                               else_=NodeNgram.ngram_id)
+        else:
+            self.syno = None
+            self.ngform = NodeNgram.ngram_id
+
+        # N
+        self.total_docs = corpus.children("DOCUMENT").count()
+
+        # the only scan of the corpus
+        print("%s : Starting Query CorpusCounts" % t())
+        rows_query = self._counts_query(
+            session.query(
+                NodeNgram.node_id,
+                self.ngform.label("counted_ngform"),
+                func.sum(NodeNgram.weight),    # tf
+                func.count(NodeNgram.ngram_id) # ngrams rows (cf. ti_ranking nd)
+            )
+            .join(Node, Node.id == NodeNgram.node_id)
+            .filter(Node.parent_id == corpus.id)
+            .filter(Node.typename == "DOCUMENT")
+            .group_by(NodeNgram.node_id, "counted_ngform")
+        ).execution_options(stream_results=True).yield_per(batch_size)
+
+        docs  = array('q')
+        forms = array('q')
+        tfs   = array('d')
+        # per form: occurrences (<=> tf) and rows (<=> nd in ti_ranking)
+        self.occs = defaultdict(float)
+        self.nrows = defaultdict(int)
+        for (doc_id, ngform, tf, nrows) in rows_query:
+            docs.append(doc_id)
+            forms.append(ngform)
+            tfs.append(tf)
+            self.occs[ngform] += tf
+            self.nrows[ngform] += nrows
+        print("%s : End Query CorpusCounts" % t())
+
+        self.docs  = np.array(docs,  dtype=np.int64)
+        self.forms = np.array(forms, dtype=np.int64)
+        self.tfs   = np.array(tfs,   dtype=np.float64)
+
+    def _counts_query(self, query):
+        """select from NodeNgram (+ the synonyms join if groups)"""
+        query = query.select_from(NodeNgram)
+        if self.syno is not None:
+            query = query.outerjoin(self.syno,
+                                    self.syno.c.ngram2_id == NodeNgram.ngram_id)
+        return query
+
+    def save_occs(self, overwrite_id=None):
+        """same as compute_occs"""
+        the_id = _metric_node_id(self.corpus, "OCCURRENCES",
+                                 "occ_sums (in:%s)" % self.corpus.id,
+                                 overwrite_id)
+        bulk_insert(
+            NodeNodeNgram,
+            ('node1_id' , 'node2_id', 'ngram_id', 'score'),
+            ((the_id, self.corpus.id, ng, occ) for ng, occ in self.occs.items())
+        )
+        return the_id
+
+    def save_ti_ranking(self, count_scope="global", overwrite_id=None):
+        """
+        same as compute_ti_ranking (with termset_scope="local")
+        """
+        if count_scope not in ["local","global"]:
+            raise ValueError("save_ti_ranking: count_scope param allowed values: 'local', 'global'")
+        corpus_id = self.corpus.id
+
+        # tf and nd in the corpus
+        tf = dict(self.occs)
+        nd = dict(self.nrows)
+        total_docs = self.total_docs
+
+        if count_scope == "global":
+            # + in the other corpora of the same source
+            this_source_type = self.corpus.resources()[0]['type']
+            CorpusNode = aliased(Node)
+            otherdocs_subquery = (session
+                            .query(Node.id)
+                            .filter(Node.typename == "DOCUMENT")
+                            .join(CorpusNode, CorpusNode.id == Node.parent_id)
+                            .filter(CorpusNode.typename == "CORPUS")
+                            .filter(CorpusNode.hyperdata['resources'][0]['type'].astext == str(this_source_type))
+                            .filter(CorpusNode.id != corpus_id)
+                            .subquery()
+                           )
+            # (only for the terms of the corpus)
+            termset_subquery = (session
+                            .query(
+                                distinct(NodeNgram.ngram_id).label("uniq_ngid")
+                              )
+                            .join(Node)
+                            .filter(Node.typename == "DOCUMENT")
+                            .filter(Node.parent_id == corpus_id)
+                            .subquery()
+                           )
+            others_tf_nd = (self._counts_query(
+                                session.query(
+                                    self.ngform.label("counted_ngform"),
+                                    func.sum(NodeNgram.weight),
+                                    func.count(NodeNgram.node_id)
+                                )
+                            )
+                            .join(otherdocs_subquery,
+                                  otherdocs_subquery.c.id == NodeNgram.node_id)
+                            .join(termset_subquery,
+                                  termset_subquery.c.uniq_ngid == NodeNgram.ngram_id)
+                            .group_by("counted_ngform")
+                           )
+            for (ngform, tf_i, nd_i) in others_tf_nd:
+                tf[ngform] = tf.get(ngform, 0) + tf_i
+                nd[ngform] = nd.get(ngform, 0) + nd_i
+            total_docs += session.query(otherdocs_subquery).count()
+
+        log_tot_docs = log(total_docs)
+        tfidfsum = {ng: tf[ng] * (log_tot_docs - log(nd[ng])) for ng in tf}
+
+        if count_scope == "local":
+            the_id = _metric_node_id(self.corpus, "TIRANK-CORPUS",
+                        "ti rank (%i ngforms in corpus:%s)" % (
+                            len(tfidfsum), corpus_id),
+                        overwrite_id)
+        else:
+            the_id = _metric_node_id(self.corpus, "TIRANK-GLOBAL",
+                        "ti rank (%i ngforms %s in corpora of sourcetype:%s)" % (
+                            len(tfidfsum), "from corpus %i" % corpus_id,
+                            this_source_type),
+                        overwrite_id)
+
+        bulk_insert(
+            NodeNodeNgram,
+            ('node1_id', 'node2_id','ngram_id', 'score'),
+            ((the_id,  corpus_id,    ng,   tfidfsum[ng]) for ng in tfidfsum)
+        )
+        return the_id
+
+    def save_tfidf_local(self, on_list_id=None, overwrite_id=None):
+        """same as compute_tfidf_local"""
+        if on_list_id:
+            list_ids = np.fromiter(
+                (row[0] for row in session.query(NodeNgram.ngram_id)
+                                          .filter(NodeNgram.node_id == on_list_id)),
+                dtype = np.int64
+            )
+            on_list = np.in1d(self.forms, list_ids)
+            docs, forms, tfs = self.docs[on_list], self.forms[on_list], self.tfs[on_list]
+        else:
+            docs, forms, tfs = self.docs, self.forms, self.tfs
+
+        # nd: n docs with the form (1 row per (doc, form))
+        _, form_index, nd = np.unique(forms, return_inverse=True, return_counts=True)
+        tfidfs = tfs * (log(self.total_docs) - np.log(nd[form_index]))
+
+        the_id = _metric_node_id(self.corpus, "TFIDF-CORPUS",
+                                 "tfidf-sims-corpus (in:%s)" % self.corpus.id,
+                                 overwrite_id)
+        bulk_insert(
+            NodeNodeNgram,
+            ('node1_id', 'node2_id','ngram_id', 'score'),
+            ((the_id, node_id, ngram_id, score) for (node_id, ngram_id, score)
+                in zip(docs.tolist(), forms.tolist(), tfidfs.tolist()))
+        )
+        return the_id
@@ -4,12 +4,24 @@ COOCS
 """
 from gargantext                import settings
 from sqlalchemy                import exc
-from gargantext.util.lists     import WeightedMatrix
+from gargantext.util.lists     import WeightedMatrix, SparseWeightedMatrix
 from gargantext.util.db        import get_engine
 from gargantext.util.db_cache  import cache
 from gargantext.constants      import DEFAULT_COOC_THRESHOLD, NODETYPES
 from gargantext.constants      import INDEXED_HYPERDATA
 from gargantext.util.tools     import datetime, convert_to_date
+from gargantext.constants      import COOC_PARTITION_SIZE, COOC_WORKERS, \
+                                      COOC_WORK_MEM_MB, \
+                                      COOCS_IN_PROCESS, BATCH_COOCS_PAIRS_SIZE
+from gargantext.models         import Node, NodeNgram, NodeNgramNgram, \
+                                      NodeHyperdata
+from gargantext.util.db        import session, aliased
+from sqlalchemy.sql.expression import case
+from array                     import array
+from scipy                     import sparse
+import numpy as np
+from concurrent.futures        import ThreadPoolExecutor
+from threading                 import Lock
 
 def compute_coocs(  corpus,
                     overwrite_id    = None,
@@ -22,7 +34,9 @@ def compute_coocs(  corpus,
                     start           = None,
                     end             = None,
                     symmetry_filter = False,
-                    diagonal_filter = True):
+                    diagonal_filter = True,
+                    from_doc_id     = None,
+                    in_process      = COOCS_IN_PROCESS):
     """
     Count how often some extracted terms appear
     together in a small context (document)
@@ -43,6 +57,11 @@ def compute_coocs(  corpus,
 
     worse case complexity ~ O(N²/2) with N = number of ngrams
 
+    Above COOC_PARTITION_SIZE docs, the docs are split in id ranges that are
+    counted in parallel (COOC_WORKERS db connections, sharing the work_mem
+    budget COOC_WORK_MEM_MB) and each partial count is summed as soon as it
+    is fetched, the threshold being applied to the sum.
+
     If a mainlist is provided, we filter doc ngrams to those also in the list.
 
     Parameters:
@@ -61,14 +80,34 @@ def compute_coocs(  corpus,
                           this convention: "2001-01-01" aka "%Y-%m-%d")
       - symmetry_filter: prevent calculating where ngram1_id  > ngram2_id
       - diagonal_filter: prevent calculating where ngram1_id == ngram2_id
+      - from_doc_id: only count in the docs with id >= from_doc_id
+                     (ie the docs added by an incremental update)
+      - in_process: count with compute_coocs_in_process instead of SQL
+                    (NB: then start and end are supported)
     """
-
-    # 1) prepare direct connection to the DB
-    connection = get_engine().connect()
+    if in_process:
+        matrix = compute_coocs_in_process(corpus,
+                                          threshold       = threshold,
+                                          groupings_id    = groupings_id,
+                                          on_list_id      = on_list_id,
+                                          start           = start,
+                                          end             = end,
+                                          symmetry_filter = symmetry_filter,
+                                          diagonal_filter = diagonal_filter,
+                                          from_doc_id     = from_doc_id)
+        if just_pass_result:
+            return matrix
+        return _save_coocs(corpus, matrix, threshold, overwrite_id)
+
+    # 1) prepare direct connections to the DB
+    engine = get_engine()
+    doc_ranges = _docs_partitions(engine, corpus, from_doc_id)
 
     # string vars for our SQL query
     # setting work memory high to improve cache perf.
-    final_sql = "set work_mem='1GB'; \n"
+    # (the budget is shared by the connections counting at once)
+    final_sql = "set work_mem='%iMB'; \n" % (
+                    COOC_WORK_MEM_MB // min(COOC_WORKERS, len(doc_ranges)))
     # where
     # final_sql = cooc_sql + select_cooc_sql
     cooc_sql  = ""
@@ -98,6 +137,7 @@ def compute_coocs(  corpus,
         WHERE 
             n.typename  = {nodetype_id}
         AND n.parent_id = {corpus_id}
+        {{docs_filter}}
         GROUP BY 1,2
         --    ==
         -- GROUP BY ngA, ngB
@@ -199,7 +239,9 @@ def compute_coocs(  corpus,
         FROM COOC    --> from the query above
     """
     # the inclusive threshold filter is always here
-    select_cooc_sql += "\n WHERE score >= %i" % threshold
+    # (NB: applied after the merge if the docs are partitioned)
+    select_cooc_sql += "\n WHERE score >= %i" % (
+                            threshold if len(doc_ranges) == 1 else 1)
 
     # don't compute ngram with itself
     # NB: this option is bad for main toolchain
@@ -220,21 +262,49 @@ def compute_coocs(  corpus,
     # debug
     #print(final_sql)
 
-    # executing the SQL statement
-    try:
-        # suppose the database has been restarted.
-        results = connection.execute(final_sql)
-        connection.close()
-    except exc.DBAPIError as e:
-        # an exception is raised, Connection is invalidated.
-        if e.connection_invalidated:
-            print("Connection was invalidated for ngram_coocs")
-        else:
-            print(e)
-
-    #  => storage in our matrix structure
-    matrix = WeightedMatrix(results)
-    #                      -------------------
+    # executing the SQL statement for each range of docs
+    def count_range(doc_range):
+        docs_filter = "AND n.id >= %i" % doc_range[0]
+        if doc_range[1] is not None:
+            docs_filter += " AND n.id < %i" % doc_range[1]
+        connection = engine.connect()
+        try:
+            # suppose the database has been restarted.
+            results = connection.execute(
+                final_sql.format(docs_filter = docs_filter)
+            ).fetchall()
+        except exc.DBAPIError as e:
+            # an exception is raised, Connection is invalidated.
+            if e.connection_invalidated:
+                print("Connection was invalidated for ngram_coocs")
+            else:
+                print(e)
+            raise
+        finally:
+            connection.close()
+        return results
+
+    if len(doc_ranges) == 1:
+        #  => storage in our matrix structure
+        matrix = WeightedMatrix(count_range(doc_ranges[0]))
+        #                      -------------------
+    else:
+        print("COOCS: counting %i partitions of docs" % len(doc_ranges))
+        #  => running sum of the partial counts then threshold
+        #     (each partial count is dropped once summed)
+        merged = SparseWeightedMatrix()
+        merge_lock = Lock()
+
+        def count_and_merge(doc_range):
+            partial_count = count_range(doc_range)
+            with merge_lock:
+                merged.add_triples(partial_count)
+
+        with ThreadPoolExecutor(COOC_WORKERS) as executor:
+            # (consumed to raise the errors of the partitions)
+            list(executor.map(count_and_merge, doc_ranges))
+
+        matrix = WeightedMatrix(merged.thresholded(threshold))
 
     # fyi
     shape_0 = len({pair[0] for pair in matrix.items})
@@ -245,32 +315,202 @@ def compute_coocs(  corpus,
     if just_pass_result:
         return matrix
     else:
-        # 5) SAVE
-        # --------
-        # saving the parameters of the analysis in the Node JSON
-        new_hyperdata = { 'corpus'   : corpus.id,
-                          'threshold': threshold }
-
-        if overwrite_id:
-            # overwrite pre-existing id
-            the_cooc = cache.Node[overwrite_id]
-            the_cooc.hyperdata = new_hyperdata
-            the_cooc.save_hyperdata()
-            session.commit()
-            the_id = overwrite_id
-        else:
-            # create the new cooc node
-            the_cooc = corpus.add_child(
-                            typename  = "COOCCURRENCES",
-                            name      = "Coocs (in:%s)" % corpus.name[0:10],
-                            hyperdata = new_hyperdata,
-                        )
-            session.add(the_cooc)
-            session.commit()
-
-            the_id = the_cooc.id
-
-        # ==> save all NodeNgramNgram with link to new cooc node id
-        matrix.save(the_id)
-
-        return the_id
+        return _save_coocs(corpus, matrix, threshold, overwrite_id)
+
+
+def _save_coocs(corpus, matrix, threshold, overwrite_id=None):
+    """
+    Writes a cooc matrix to a (new or overwritten) COOCCURRENCES node
+    and returns the node id
+    """
+    # 5) SAVE
+    # --------
+    # saving the parameters of the analysis in the Node JSON
+    new_hyperdata = { 'corpus'   : corpus.id,
+                      'threshold': threshold }
+
+    if overwrite_id:
+        # overwrite pre-existing id
+        the_cooc = cache.Node[overwrite_id]
+        the_cooc.hyperdata = new_hyperdata
+        the_cooc.save_hyperdata()
+        session.commit()
+        the_id = overwrite_id
+    else:
+        # create the new cooc node
+        the_cooc = corpus.add_child(
+                        typename  = "COOCCURRENCES",
+                        name      = "Coocs (in:%s)" % corpus.name[0:10],
+                        hyperdata = new_hyperdata,
+                    )
+        session.add(the_cooc)
+        session.commit()
+
+        the_id = the_cooc.id
+
+    # ==> save all NodeNgramNgram with link to new cooc node id
+    matrix.save(the_id)
+
+    return the_id
+
+
+def compute_coocs_in_process(corpus,
+                             threshold       = DEFAULT_COOC_THRESHOLD,
+                             groupings_id    = None,
+                             on_list_id      = None,
+                             start           = None,
+                             end             = None,
+                             symmetry_filter = False,
+                             diagonal_filter = True,
+                             from_doc_id     = None,
+                             batch_size      = BATCH_COOCS_PAIRS_SIZE):
+    """
+    Same counts as compute_coocs but the db only streams the (doc, ngram)
+    pairs: the quadratic part is done here, by coocs_from_pairs.
+
+    The ngrams are mapped to their mainform (groupings_id) before the
+    on_list_id filter, and each doc counts once per pair of (main)forms.
+
+    Returns a SparseWeightedMatrix (same iteration, items and save
+    as the WeightedMatrix from compute_coocs)
+    """
+    if groupings_id:
+        syno = (session.query(NodeNgramNgram.ngram1_id,
+                              NodeNgramNgram.ngram2_id)
+                       .filter(NodeNgramNgram.node_id == groupings_id)
+                       .subquery()
+               )
+        ngform = case([(syno.c.ngram1_id != None, syno.c.ngram1_id)],
+                      else_=NodeNgram.ngram_id)
+    else:
+        syno = None
+        ngform = NodeNgram.ngram_id
+
+    pairs_query = (session
+        .query(NodeNgram.node_id, ngform)
+        .select_from(NodeNgram)
+        .join(Node, Node.id == NodeNgram.node_id)
+        .filter(Node.parent_id == corpus.id)
+        .filter(Node.typename == "DOCUMENT")
+    )
+    if syno is not None:
+        pairs_query = pairs_query.outerjoin(syno,
+                                            syno.c.ngram2_id == NodeNgram.ngram_id)
+    if on_list_id:
+        ListNgram = aliased(NodeNgram)
+        pairs_query = pairs_query.join(ListNgram,
+                                       (ListNgram.ngram_id == ngform)
+                                     & (ListNgram.node_id == on_list_id))
+    if from_doc_id:
+        pairs_query = pairs_query.filter(Node.id >= from_doc_id)
+    if start is not None:
+        Start = aliased(NodeHyperdata)
+        pairs_query = (pairs_query
+            .join(Start, Start.node_id == Node.id)
+            .filter(Start.key == 'publication_date')
+            .filter(Start.value_utc >= _as_date(start))
+        )
+    if end is not None:
+        End = aliased(NodeHyperdata)
+        pairs_query = (pairs_query
+            .join(End, End.node_id == Node.id)
+            .filter(End.key == 'publication_date')
+            .filter(End.value_utc <= _as_date(end))
+        )
+
+    docs  = array('q')
+    forms = array('q')
+    for (doc_id, form_id) in (pairs_query
+                              .execution_options(stream_results=True)
+                              .yield_per(batch_size)):
+        docs.append(doc_id)
+        forms.append(form_id)
+
+    matrix = coocs_from_pairs(np.array(docs, dtype=np.int64),
+                              np.array(forms, dtype=np.int64),
+                              threshold       = threshold,
+                              symmetry_filter = symmetry_filter,
+                              diagonal_filter = diagonal_filter)
+    print("COOCS: NEW matrix shape [%ix%i] (in process)" % matrix.matrix.shape)
+    return matrix
+
+
+def _as_date(value):
+    """datetime.datetime or "%Y-%m-%d" string (cf. compute_coocs start, end)"""
+    if isinstance(value, datetime.datetime):
+        return value
+    return convert_to_date(value)
+
+
+def coocs_from_pairs(doc_ids, ngram_ids,
+                     threshold       = DEFAULT_COOC_THRESHOLD,
+                     symmetry_filter = False,
+                     diagonal_filter = True):
+    """
+    Cooc counts from the (doc_ids[k], ngram_ids[k]) pairs (2 int arrays)
+
+    X = binary docs x ngrams matrix  =>  coocs = Xt.X  (then the filters
+    of compute_coocs: score >= threshold, ngA != ngB, ngA <= ngB)
+    """
+    result = SparseWeightedMatrix()
+    if len(doc_ids) == 0:
+        return result
+    docs, rows = np.unique(doc_ids, return_inverse=True)
+    index, cols = np.unique(ngram_ids, return_inverse=True)
+
+    X = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float64), (rows, cols)),
+            shape = (len(docs), len(index))
+        )
+    X.sum_duplicates()
+    X.data[:] = 1        # NB: the same (doc, ngram) pair counts once
+
+    coocs = (X.T.dot(X)).tocoo()
+    keep = coocs.data >= threshold
+    if diagonal_filter:
+        keep &= coocs.row != coocs.col
+    if symmetry_filter:
+        # NB: index is sorted so row <= col <=> ngA <= ngB
+        keep &= coocs.row <= coocs.col
+
+    result.index = index
+    result.matrix = sparse.coo_matrix(
+            (coocs.data[keep], (coocs.row[keep], coocs.col[keep])),
+            shape = coocs.shape
+        ).tocsr()
+    return result
+
+
+def _docs_partitions(engine, corpus, from_doc_id=None):
+    """
+    Splits the docs of the corpus in ranges of COOC_PARTITION_SIZE docs
+
+    Returns a list of (min_id, next_min_id) where the last next_min_id is None
+    (a single (from_doc_id or 0, None) range for the small corpora)
+    """
+    first_id = from_doc_id or 0
+    n_docs = corpus.children('DOCUMENT').count()
+    if n_docs <= COOC_PARTITION_SIZE:
+        return [(first_id, None)]
+
+    connection = engine.connect()
+    bounds = [row[0] for row in connection.execute("""
+        SELECT id FROM (
+            SELECT id, row_number() OVER (ORDER BY id) AS rank
+            FROM nodes
+            WHERE typename  = {nodetype_id}
+              AND parent_id = {corpus_id}
+              AND id >= {first_id}
+        ) AS docs
+        WHERE (rank - 1) % {size} = 0
+        ORDER BY id
+        """.format( nodetype_id = NODETYPES.index('DOCUMENT')
+                  , corpus_id   = corpus.id
+                  , first_id    = first_id
+                  , size        = COOC_PARTITION_SIZE
+                  ))]
+    connection.close()
+
+    if not bounds:
+        return [(first_id, None)]
+    return list(zip(bounds, bounds[1:] + [None]))
@@ -8,43 +8,70 @@ For initial ngram groups via stemming
    TODO use groups for aggregated occurrences/coocs counts !
 """
 
-from gargantext.models        import Node, NodeNgramNgram
-from gargantext.util.db       import session
+from gargantext.models        import Node, Ngram, NodeNgram, NodeNgramNgram
+from gargantext.util.db       import session, func, bulk_insert
 from gargantext.util.lists    import Translations
 # to convert fr => french :/
-from gargantext.constants      import LANGUAGES
+from gargantext.constants      import LANGUAGES, STEMS_CACHE_SIZE, \
+                                      BATCH_GROUPING_SIZE
 from gargantext.util.languages import languages
 from re                       import split as resplit
 from collections              import defaultdict, Counter
+from functools                import lru_cache
 from nltk.stem.snowball       import SnowballStemmer
+from sqlalchemy               import literal
+from sqlalchemy.sql.expression import case
+from .ngrams_extraction       import new_ngrams_subquery
+
+# {language name => memoized stem function}
+# (shared by all the corpora of a process)
+_stem_functions = {}
+
+def cached_stem_function(language_name):
+    """
+    Returns the SnowballStemmer(language_name).stem function with a LRU memo
+    of STEMS_CACHE_SIZE lexical units (the same words come back in all the
+    terms and all the corpora of a language)
+    """
+    if language_name not in _stem_functions:
+        stemmer = SnowballStemmer(language_name)
+        _stem_functions[language_name] = lru_cache(maxsize=STEMS_CACHE_SIZE)(stemmer.stem)
+    return _stem_functions[language_name]
 
 def prepare_stemmers(corpus):
     """
     Returns *several* stemmers (one for each language in the corpus)
-         (as a dict of stemmers with key = language_iso2)
+         (as a dict of stem functions with key = language_iso2)
          languages has been previously filtered by supported source languages
          and formatted
     """
     supported_stemmers_lang = [lang for lang in corpus.hyperdata["languages"]\
                                     if lang != "__unknown__" ]
-    stemmers = {lang:SnowballStemmer(languages[lang].name.lower())  for lang \
+    stemmers = {lang:cached_stem_function(languages[lang].name.lower())  for lang \
                     in supported_stemmers_lang}
-    stemmers['__unknown__'] = SnowballStemmer("english")
+    stemmers['__unknown__'] = cached_stem_function("english")
     return stemmers
 
-def compute_groups(corpus, stoplist_id = None, overwrite_id = None):
+def compute_groups(corpus, stoplist_id = None, overwrite_id = None,
+                           from_doc_id = None):
     """
     1) Use a stemmer/lemmatizer to group forms if they have same stem/lemma
     2) Create an empty GROUPLIST node (for a list of "synonym" ngrams)
     3) Save the list to DB (list node + each grouping as listnode - ngram1 - ngram2)
-    """
 
-    stop_ngrams_ids = {}
-    # we will need the ngrams of the stoplist to filter
-    if stoplist_id is not None:
-        for id in session.query(NodeNgram.ngram_id).filter(NodeNgram.node_id == stoplist_id).all():
-            stop_ngrams_ids[id[0]] = True
+    The ngrams come from one grouped query, streamed:
+      (doc language, ngram_id, terms, sum of weights in the docs of that language)
 
+    from_doc_id: optional incremental mode (needs overwrite_id)
+                 only the ngrams new in the docs with id >= from_doc_id are
+                 grouped and their groupings are added to the previous ones
+                 (so the user's changes on the older ngrams are kept):
+                   - a new ngram with the stem of some older ngrams becomes
+                     a subform of the mainform of the most frequent of them
+                   - the other new ngrams are grouped together as usual
+    """
+    if from_doc_id and not overwrite_id:
+        raise ValueError("compute_groups: from_doc_id needs the overwrite_id to update")
 
     # 1) compute stems/lemmas
     #    and group if same stem/lemma
@@ -53,45 +80,70 @@ def compute_groups(corpus, stoplist_id = None, overwrite_id = None):
     supported_stemmers_lang = [lang for lang in corpus.hyperdata["languages"] if lang != "__unknown__"]
 
     print("#SUPPORTED STEMMERS LANGS", supported_stemmers_lang)
-    # todo dict {lg => {ngrams_todo} }
-    todo_ngrams_per_lg = defaultdict(set)
-
-    # res dict { commonstem: {ngram_1:freq_1 ,ngram_2:freq_2 ,ngram_3:freq_3} }
-    my_groups = defaultdict(Counter)
-
-    # preloop per doc to sort ngrams by language
-    for doc in corpus.children('DOCUMENT'):
-        if doc.id not in corpus.hyperdata['skipped_docs']:
-            if ('language_iso2' in doc.hyperdata) and doc.hyperdata['language_iso2'] \
-                                                    in supported_stemmers_lang:
-                lgid = doc.hyperdata['language_iso2']
-
-            else:
-                lgid = "__unknown__"
-                doc.status("NGRAMS_GROUPS", error="Error: unsupported language for stemming")
-                doc.save_hyperdata()
-                #corpus.hyperdata["skipped_docs"].append(doc.id)
-                #corpus.save_hyperdata()
-            # doc.ngrams is an sql query (ugly but useful intermediate step)
-            # FIXME: move the counting and stoplist filtering up here
-            for ngram_pack in doc.ngrams.all():
-                todo_ngrams_per_lg[lgid].add(ngram_pack)
-
-    # --------------------
-    # long loop per ngrams
-    for (lgid,todo_ngs) in todo_ngrams_per_lg.items():
-        # fun: word::str => stem::str
-        stem_it = stemmers[lgid].stem
-
-        for ng in todo_ngs:
-            doc_wei = ng[0]
-            ngram  = ng[1]       # Ngram obj
-
-            # break if in STOPLIST
-            if ngram.id in stop_ngrams_ids:
-                next
-
-            lexforms = [lexunit for lexunit in resplit(r'\W+',ngram.terms)]
+
+    skipped_docs = corpus.hyperdata.get('skipped_docs', [])
+
+    # the doc language as seen by the stemmers
+    doc_lang = Node.hyperdata['language_iso2'].astext
+    if supported_stemmers_lang:
+        lgid = case([(doc_lang.in_(supported_stemmers_lang), doc_lang)],
+                    else_ = literal("__unknown__"))
+    else:
+        lgid = literal("__unknown__")
+
+    # docs with an unsupported language: noted in their status
+    unsupported_docs = corpus.children('DOCUMENT')
+    if skipped_docs:
+        unsupported_docs = unsupported_docs.filter(~ Node.id.in_(skipped_docs))
+    if supported_stemmers_lang:
+        unsupported_docs = unsupported_docs.filter(
+                                (doc_lang == None)
+                                | ~ doc_lang.in_(supported_stemmers_lang)
+                           )
+    for doc in unsupported_docs:
+        doc.status("NGRAMS_GROUPS", error="Error: unsupported language for stemming")
+        doc.save_hyperdata()
+    session.commit()
+
+    # sums per language and ngram
+    ngrams_query = (session
+                    .query(lgid.label("lgid"), Ngram.id, Ngram.terms,
+                           func.sum(NodeNgram.weight))
+                    .select_from(NodeNgram)
+                    .join(Ngram, Ngram.id == NodeNgram.ngram_id)
+                    .join(Node, Node.id == NodeNgram.node_id)
+                    .filter(Node.parent_id == corpus.id)
+                    .filter(Node.typename == "DOCUMENT")
+                   )
+    if skipped_docs:
+        ngrams_query = ngrams_query.filter(~ Node.id.in_(skipped_docs))
+
+    # not in STOPLIST
+    if stoplist_id is not None:
+        stop_ngrams = (session.query(NodeNgram.ngram_id)
+                              .filter(NodeNgram.node_id == stoplist_id)
+                              .subquery())
+        ngrams_query = ngrams_query.filter(~ Ngram.id.in_(stop_ngrams))
+
+    def grouped_by_stem(ngrams_query, stems = None):
+        """
+        res dict { commonstem: {ngram_1:freq_1 ,ngram_2:freq_2 ,ngram_3:freq_3} }
+        (only the given stems if any)
+        """
+        ngrams_query = (ngrams_query
+                        .group_by("lgid", Ngram.id, Ngram.terms)
+                        .execution_options(stream_results=True)
+                        .yield_per(BATCH_GROUPING_SIZE)
+                       )
+        my_groups = defaultdict(Counter)
+
+        # --------------------
+        # long loop per ngrams
+        for (lgid, ngram_id, terms, doc_wei) in ngrams_query:
+            # fun: word::str => stem::str
+            stem_it = stemmers[lgid]
+
+            lexforms = [lexunit for lexunit in resplit(r'\W+',terms)]
 
             # STEM IT, and this term's stems will become a new grouping key...
             stemseq = " ".join([stem_it(lexfo) for lexfo in lexforms])
@@ -99,23 +151,44 @@ def compute_groups(corpus, stoplist_id = None, overwrite_id = None):
             # ex:
             # groups['post'] = {'poste':3, 'poster':5, 'postés':2...}
             # groups['copper engrav'] = {'copper engraving':3, 'coppers engraver':1...}
-            my_groups[stemseq][ngram.id] += doc_wei
-
-    del todo_ngrams_per_lg
+            if stems is None or stemseq in stems:
+                my_groups[stemseq][ngram_id] += doc_wei
+        return my_groups
+
+    if from_doc_id:
+        new_ngrams = new_ngrams_subquery(corpus, from_doc_id)
+        my_groups = grouped_by_stem(ngrams_query
+                                    .filter(Node.id >= from_doc_id)
+                                    .filter(Ngram.id.in_(new_ngrams)))
+        # the older ngrams having the same stems
+        old_groups = grouped_by_stem(ngrams_query.filter(Node.id < from_doc_id),
+                                     stems = set(my_groups))
+        # the previous groupings {subform: mainform}
+        mainforms = Translations(overwrite_id, just_items=True).items
+        grouped = set(mainforms) | set(mainforms.values())
+    else:
+        my_groups = grouped_by_stem(ngrams_query)
+        old_groups = {}
 
     # now serializing all groups to a list of couples
     ng_couples = []
     addcouple = ng_couples.append
-    for grped_ngramids in my_groups.values():
-        if len(grped_ngramids) > 1:
+    for stemseq, grped_ngramids in my_groups.items():
+        if stemseq in old_groups:
+            # the new forms join the group of the most frequent older form
+            old_id = old_groups[stemseq].most_common(1)[0][0]
+            winner_id = mainforms.get(old_id, old_id)
+        elif len(grped_ngramids) > 1:
             # first find most frequent term in the counter
             winner_id = grped_ngramids.most_common(1)[0][0]
+        else:
+            continue
 
-            for ngram_id in grped_ngramids:
-                if ngram_id != winner_id:
-                    addcouple((winner_id, ngram_id))
+        for ngram_id in grped_ngramids:
+            if ngram_id != winner_id:
+                addcouple((winner_id, ngram_id))
 
-    del my_groups
+    del my_groups, old_groups
 
     # 2) the list node
     if overwrite_id:
@@ -133,6 +206,17 @@ def compute_groups(corpus, stoplist_id = None, overwrite_id = None):
         session.commit()
         the_id = the_group.id
 
+    if from_doc_id:
+        # add to the previous rows
+        # (except the new ngrams that the user already grouped)
+        bulk_insert(
+            NodeNgramNgram,
+            ('node_id', 'ngram1_id', 'ngram2_id', 'weight'),
+            ((the_id, mainforms.get(prim, prim), sec, 1.0)
+                for (prim, sec) in ng_couples if sec not in grouped)
+        )
+        return the_id
+
     # 3) Save each grouping couple to DB thanks to Translations.save() table
     ndngng_list = Translations(
                                 [(sec,prim) for (prim,sec) in ng_couples],
@@ -13,20 +13,100 @@ prerequisite:
   - add the new ngram to `ngrams` table
 
 procedure:
-  - simple regexp search of the ngram string => addition to NodeNgram
+  - search of the ngram strings (same matches as the regexp r'\bterms\b'
+    without case) with one multi-pattern matcher => addition to NodeNgram
+  - with TSVECTOR_INDEXING, only in the docs that have all the words of
+    one of the ngrams (full-text query on nodes_tsvectors)
   /!\ -> morphological variants are NOT considered (ex plural or declined forms)
 """
 
 from gargantext.models   import Ngram, Node, NodeNgram
-from gargantext.util.db  import session, bulk_insert
-from gargantext.util.db  import bulk_insert_ifnotexists # £TODO debug
+from gargantext.util.db  import session, bulk_insert_ignore
+from gargantext.constants import BATCH_INDEXING_SIZE, TSVECTOR_INDEXING
 from sqlalchemy          import distinct
-from re                  import findall, IGNORECASE
+from re                  import compile, escape, IGNORECASE
 
 from gargantext.util.toolchain.main import t   # timer
+from gargantext.util.toolchain.tsvector_indexing import index_tsvectors, \
+                                                       terms_tsquery, \
+                                                       documents_having
 
 # TODO from gargantext.constants import LIST_OF_KEYS_TO_INDEX = title, abstract
 
+# word tokens and what's between them (NB: same \w as the \b of the regexp)
+_words_and_separators = compile(r'(\w+)')
+
+
+class NgramsMatcher:
+    """
+    Token-level trie over the (lowercased) terms of many ngrams, that finds
+    all of them in a text in one scan.
+
+    A term like "british museum" becomes the tokens
+        ['british', ' ', 'museum']   (words and exact separators)
+    so a match on full word tokens is also a match of r'\bbritish museum\b'
+    and vice versa.
+
+    The terms that don't start and end with a word character (rare, where
+    \b has another meaning) are matched with their own regexp.
+    """
+
+    def __init__(self, ngrams):
+        """
+        @param ngrams: (ngram_id, terms) couples
+        """
+        self.trie = {}
+        self.regexps = []
+        for ngram_id, terms in ngrams:
+            tokens = self.tokenize(terms.lower())
+            if len(tokens) and _is_word(tokens[0]) and _is_word(tokens[-1]):
+                node = self.trie
+                for token in tokens:
+                    node = node.setdefault(token, {})
+                node.setdefault(None, []).append(ngram_id)
+            else:
+                self.regexps.append(
+                    (ngram_id, compile(r'\b%s\b' % escape(terms), IGNORECASE))
+                )
+
+    @staticmethod
+    def tokenize(text):
+        """
+        "de l'eau" => ['de', ' ', 'l', "'", 'eau']
+        """
+        return [token for token in _words_and_separators.split(text) if token]
+
+    def count(self, text):
+        """
+        @return a dict {ngram_id => number of occurrences in text}
+                (non-overlapping occurrences, like findall)
+        """
+        counts = {}
+        tokens = self.tokenize(text.lower())
+        ends = {}               # ngram_id => end of its last counted match
+        for start in range(len(tokens)):
+            if not _is_word(tokens[start]):
+                continue
+            node = self.trie
+            for position in range(start, len(tokens)):
+                node = node.get(tokens[position])
+                if node is None:
+                    break
+                for ngram_id in node.get(None, ()):
+                    if ends.get(ngram_id, 0) <= start:
+                        counts[ngram_id] = counts.get(ngram_id, 0) + 1
+                        ends[ngram_id] = position + 1
+        for ngram_id, regexp in self.regexps:
+            n_occs = len(regexp.findall(text))
+            if n_occs > 0:
+                counts[ngram_id] = counts.get(ngram_id, 0) + n_occs
+        return counts
+
+
+def _is_word(token):
+    return _words_and_separators.fullmatch(token) is not None
+
+
 def index_new_ngrams(ngram_ids, corpus, keys=('title', 'abstract', )):
     """
     Find occurrences of some ngrams for every document of the given corpus.
@@ -43,99 +123,72 @@ def index_new_ngrams(ngram_ids, corpus, keys=('title', 'abstract', )):
 
     @param keys: the hyperdata fields to index
 
-    # FIXME too slow: index_new_ngrams should be faster via tsvector on DB
+    All the ngrams are searched at once in each text (NgramsMatcher) and the
+    relations that were already indexed are skipped by the db at insertion.
     """
 
     # retrieve *all* the ngrams from our list
     # (even if some relations may be already indexed
     #  b/c they were perhaps not extracted in all docs
-    #   => we'll use already_indexed later)
+    #   => the db will skip them at insertion)
     todo_ngrams = (session
-                    .query(Ngram)
+                    .query(Ngram.id, Ngram.terms)
                     .filter(Ngram.id.in_(ngram_ids))
                     .all()
                     )
+    matcher = NgramsMatcher(todo_ngrams)
+
+    docs = (session
+            .query(Node.id, Node.hyperdata)
+            .filter(Node.parent_id == corpus.id)
+            .filter(Node.typename == 'DOCUMENT')
+           )
+
+    if TSVECTOR_INDEXING:
+        # (docs parsed before the option don't have their tsvector yet)
+        index_tsvectors(corpus)
+        tsquery = terms_tsquery([terms for (_, terms) in todo_ngrams])
+        if tsquery is not None:
+            docs = documents_having(docs, tsquery)
 
-    # initialize result dict
-    node_ngram_to_write = {}
+    docs = docs.yield_per(BATCH_INDEXING_SIZE)
 
     # loop throught the docs and their text fields
-    for (i, doc) in enumerate(corpus.children('DOCUMENT')):
+    my_new_rows = []
+    add_new_row = my_new_rows.append
+    for (i, (doc_id, hyperdata)) in enumerate(docs):
 
-        if (i % 100 == 0):
+        if (i % 1000 == 0):
             print('CORPUS #%d: [%s] ngrams_addition: doc %i' % (corpus.id, t(), i))
-            print()
 
         # a new empty counting subdict
-        node_ngram_to_write[doc.id] = {}
+        doc_counts = {}
 
         for key in keys:
             # a text field
-            text = doc.hyperdata.get(key, None)
+            text = hyperdata.get(key, None)
 
             if not isinstance(text, str):
-                # print("WARN: doc %i has no text in field %s" % (doc.id, key))
+                # print("WARN: doc %i has no text in field %s" % (doc_id, key))
                 continue
 
-            for ngram in todo_ngrams:
-                # build regexp : "british" => r'\bbritish\b'
-                ngram_re = r'\b%s\b' % ngram.terms
-
-                # --------------------------------------- find ---
-                n_occs = len(findall(ngram_re, text, IGNORECASE))
-                # -----------------------------------------------
-
-                # save the count results
-                if n_occs > 0:
-                    if ngram.id not in node_ngram_to_write[doc.id]:
-                        node_ngram_to_write[doc.id][ngram.id] = n_occs
-                    else:
-                        node_ngram_to_write[doc.id][ngram.id] += n_occs
-
-    # debug
-    # print("new node_ngrams before filter:", node_ngram_to_write)
-
-    # check the relations we won't insert (those that were already indexed)
-    # NB costly but currently impossible with bulk_insert_ifnotexists
-    #                                         b/c double uniquekey
-    already_indexed = (session
-                        .query(NodeNgram.node_id, NodeNgram.ngram_id)
-                        .join(Node, Node.id == NodeNgram.node_id)
-                        .filter(Node.parent_id == corpus.id)
-                        .filter(Node.typename == 'DOCUMENT')
-                        .all()
-                        )
-    filter_out = {(nd_id,ng_id) for (nd_id,ng_id) in already_indexed}
-    # POSSIBLE update those that are filtered out if wei_previous != wei
-
-    # integrate all at the end
-    my_new_rows = []
-    add_new_row = my_new_rows.append
-    for doc_id in node_ngram_to_write:
-        for ngram_id in node_ngram_to_write[doc_id]:
-            if (doc_id, ngram_id) not in filter_out:
-                wei = node_ngram_to_write[doc_id][ngram_id]
-                add_new_row([doc_id, ngram_id, wei])
+            # --------------------------------------- find ---
+            for ngram_id, n_occs in matcher.count(text).items():
+                doc_counts[ngram_id] = doc_counts.get(ngram_id, 0) + n_occs
+            # -----------------------------------------------
 
-    del node_ngram_to_write
+        for ngram_id, wei in doc_counts.items():
+            add_new_row([doc_id, ngram_id, wei])
 
-    # debug
-    # print("new node_ngrams after filter:", my_new_rows)
-
-    bulk_insert(
-        table = NodeNgram,
+    # integrate all at the end (except those that were already indexed)
+    # POSSIBLE update those that are skipped if wei_previous != wei
+    n_added = bulk_insert_ignore(
+        model = NodeNgram,
+        uniquekeys = ('node_id', 'ngram_id'),
         fields = ('node_id', 'ngram_id', 'weight'),
         data = my_new_rows
     )
 
-    # bulk_insert_ifnotexists(
-    #     model = NodeNgram,
-    #     uniquekey = ('node_id','ngram_id'),        <= currently impossible
-    #     fields = ('node_id', 'ngram_id', 'weight'),
-    #     data = my_new_rows
-    # )
-
-    n_added = len(my_new_rows)
     print("index_new_ngrams: added %i new NodeNgram rows" % n_added)
 
     return n_added
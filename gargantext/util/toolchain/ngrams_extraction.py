@@ -1,4 +1,5 @@
 from gargantext.util.db import *
+from gargantext.util.db_cache import ngrams_ids_cache
 from gargantext.models import *
 from gargantext.constants import *
 from collections import defaultdict
@@ -9,18 +10,13 @@ def _integrate_associations(nodes_ngrams_count, ngrams_data, db, cursor):
     """
     @param ngrams_data   a set like {('single word', 2), ('apple', 1),...}
 
-    £TODO: load whole word dictionary in ram and check existence before inserting to db => sequential insert => probably faster!
+    NB: the known words are taken from the process-level ngrams_ids_cache
+        so only the new ones go through bulk_insert_ifnotexists
     """
     # print('INTEGRATE', len(ngrams_data), len(nodes_ngrams_count))
     print('INTEGRATE')
     # integrate ngrams (aka new words)
-    ngrams_ids = bulk_insert_ifnotexists(
-        model = Ngram,                # todo type should :str ~~> :str|:re) !!!
-        uniquekey = 'terms',          # todo col 'terms' should be renamed 'form' ?
-        fields = ('terms', 'n'),      # todo replace by type ?
-        data = ngrams_data,
-        cursor = cursor,
-    )
+    ngrams_ids = ngrams_ids_cache.ids_ifnotexists(ngrams_data, cursor)
     db.commit()
     # integrate node-ngram associations
     nodes_ngrams_data = tuple(
@@ -36,12 +32,89 @@ def _integrate_associations(nodes_ngrams_count, ngrams_data, db, cursor):
     db.commit()
 
 
-def extract_ngrams(corpus, keys=DEFAULT_INDEX_FIELDS, do_subngrams = DEFAULT_INDEX_SUBGRAMS):
+def _index_ngrams(doc_id, ngrams, do_subngrams, nodes_ngrams_count, ngrams_data):
+    """
+    Counts the ngrams extracted from one text field of a doc
+    into nodes_ngrams_count and ngrams_data (updated in place)
+    """
+    for ngram in ngrams:
+        tokens = tuple(normalize_forms(token[0]) for token in ngram)
+        if do_subngrams:
+            # ex tokens = ["very", "cool", "exemple"]
+            #    subterms = [['very', 'cool'],...]
+
+            subterms = subsequences(tokens)
+        else:
+            subterms = [tokens]
+
+        for seqterm in subterms:
+            ngram = ' '.join(seqterm)
+            nbwords = len(seqterm)
+            nbchars = len(ngram)
+            if nbchars > 1:
+                if nbchars > 255:
+                    # max ngram length (DB constraint)
+                    ngram = ngram[:255]
+                # doc <=> ngram index
+                nodes_ngrams_count[(doc_id, ngram)] += 1
+                # add fields :   terms          n
+                ngrams_data.add((ngram, nbwords, ))
+
+
+# taggers loaded in each pool process (1 per lang, kept between chunks)
+_worker_taggers = {}
+
+def _extract_chunk(lang, docs_texts, do_subngrams):
+    """
+    Pool process side of extract_ngrams
+
+    @param docs_texts   a list of (doc_id, [text1, text2...])
+    @return             the partial counts:
+                         - {(doc_id, ngram): count}
+                         - {(ngram, nbwords)}
+    """
+    if lang not in _worker_taggers:
+        _worker_taggers[lang] = load_tagger(lang if lang != "__unknown__" else "en")
+    tagger = _worker_taggers[lang]
+
+    nodes_ngrams_count = defaultdict(int)
+    ngrams_data = set()
+    for doc_id, texts in docs_texts:
+        try:
+            # all the fields of a doc are tagged in one call
+            fields_ngrams = tagger.extract_many(texts)
+        except:
+            # one bad field mustn't drop the others: one call per field
+            fields_ngrams = []
+            for value in texts:
+                try:
+                    fields_ngrams.append(list(tagger.extract(value)))
+                except:
+                    continue
+        for ngrams in fields_ngrams:
+            try:
+                _index_ngrams(doc_id, ngrams, do_subngrams,
+                              nodes_ngrams_count, ngrams_data)
+            except:
+                continue
+    return dict(nodes_ngrams_count), ngrams_data
+
+
+def extract_ngrams(corpus, keys=DEFAULT_INDEX_FIELDS, do_subngrams = DEFAULT_INDEX_SUBGRAMS,
+                           workers = NGRAMSEXTRACTION_WORKERS, from_doc_id = None):
     """Extract ngrams for every document below the given corpus.
     Default language is given by the resource type.
     The result is then inserted into database.
     Only fields indicated in `keys` are tagged.
+
+    With from_doc_id only the docs with id >= from_doc_id are processed
+    (ie the docs added by an incremental update)
+
+    With workers > 1 the tagging is done by a pool of processes receiving
+    chunks of NGRAMSEXTRACTION_CHUNK_SIZE docs, and their partial counts are
+    merged here before each _integrate_associations.
     """
+    pool = None
     try:
         db, cursor = get_cursor()
         nodes_ngrams_count = defaultdict(int)
@@ -51,16 +124,41 @@ def extract_ngrams(corpus, keys=DEFAULT_INDEX_FIELDS, do_subngrams = DEFAULT_IND
         documents_count = 0
         source = get_resource(resource["type"])
 
-        #load available taggers for default langage of plateform
-        #print(LANGUAGES.keys())
-        tagger_bots = {lang: load_tagger(lang) for lang in corpus.hyperdata["languages"] \
-                                if lang != "__unknown__"}
-        tagger_bots["__unknown__"] = load_tagger("en")
+        if workers > 1:
+            # NB: celery workers are daemonic processes, only billiard
+            #     allows them to have their own pool of children
+            from billiard import Pool
+            pool = Pool(workers)
+            # {lang: [(doc_id, texts),...]} not yet sent to the pool
+            chunks = defaultdict(list)
+            # chunks sent to the pool and not yet merged
+            pending = []
+            # the main process doesn't tag
+            tagger_bots = {lang: None for lang in corpus.hyperdata["languages"] \
+                                    if lang != "__unknown__"}
+            tagger_bots["__unknown__"] = None
+        else:
+            #load available taggers for default langage of plateform
+            #print(LANGUAGES.keys())
+            tagger_bots = {lang: load_tagger(lang) for lang in corpus.hyperdata["languages"] \
+                                    if lang != "__unknown__"}
+            tagger_bots["__unknown__"] = load_tagger("en")
         # print("#TAGGERS LOADED: ", tagger_bots)
         supported_taggers_lang = tagger_bots.keys()
         # print("#SUPPORTED TAGGER LANGS", supported_taggers_lang)
 
-        for documents_count, document in enumerate(corpus.children('DOCUMENT')):
+        def merge_partial(async_result):
+            """adds a pool result to the current batch"""
+            partial_count, partial_data = async_result.get()
+            for node_ngram, count in partial_count.items():
+                nodes_ngrams_count[node_ngram] += count
+            ngrams_data.update(partial_data)
+
+        documents = corpus.children('DOCUMENT')
+        if from_doc_id:
+            documents = documents.filter(Node.id >= from_doc_id)
+
+        for documents_count, document in enumerate(documents):
             #load only the docs that have passed the parsing without error
             if document.id not in corpus.hyperdata["skipped_docs"]:
 
@@ -81,6 +179,23 @@ def extract_ngrams(corpus, keys=DEFAULT_INDEX_FIELDS, do_subngrams = DEFAULT_IND
                     corpus.hyperdata["skipped_docs"].append(document.id)
                     corpus.save_hyperdata()
                     continue
+
+                elif workers > 1:
+                    # only the text values are sent to the pool
+                    texts = [document.hyperdata[str(key)] for key in keys
+                                if isinstance(document.hyperdata.get(str(key)), str)]
+                    chunks[language_iso2].append((document.id, texts))
+
+                    if len(chunks[language_iso2]) >= NGRAMSEXTRACTION_CHUNK_SIZE:
+                        pending.append(pool.apply_async(
+                            _extract_chunk,
+                            (language_iso2, chunks.pop(language_iso2), do_subngrams)
+                        ))
+
+                    # don't let too many results wait in RAM
+                    while len(pending) > 2 * workers:
+                        merge_partial(pending.pop(0))
+
                 else:
                     # ready !
                     tagger = tagger_bots[language_iso2]
@@ -94,28 +209,8 @@ def extract_ngrams(corpus, keys=DEFAULT_INDEX_FIELDS, do_subngrams = DEFAULT_IND
                                 #print("DBG wrong content in doc for key", key)
                                 continue
                                 # get ngrams
-                            for ngram in tagger.extract(value):
-                                tokens = tuple(normalize_forms(token[0]) for token in ngram)
-                                if do_subngrams:
-                                    # ex tokens = ["very", "cool", "exemple"]
-                                    #    subterms = [['very', 'cool'],...]
-
-                                    subterms = subsequences(tokens)
-                                else:
-                                    subterms = [tokens]
-
-                                for seqterm in subterms:
-                                    ngram = ' '.join(seqterm)
-                                    nbwords = len(seqterm)
-                                    nbchars = len(ngram)
-                                    if nbchars > 1:
-                                        if nbchars > 255:
-                                            # max ngram length (DB constraint)
-                                            ngram = ngram[:255]
-                                        # doc <=> ngram index
-                                        nodes_ngrams_count[(document.id, ngram)] += 1
-                                        # add fields :   terms          n
-                                        ngrams_data.add((ngram, nbwords, ))
+                            _index_ngrams(document.id, tagger.extract(value), do_subngrams,
+                                          nodes_ngrams_count, ngrams_data)
                         except:
                             #value not in doc
                             continue
@@ -136,6 +231,17 @@ def extract_ngrams(corpus, keys=DEFAULT_INDEX_FIELDS, do_subngrams = DEFAULT_IND
 
         # end for doc
 
+        if workers > 1:
+            # send the incomplete chunks and wait for all the results
+            for lang, docs_texts in chunks.items():
+                pending.append(pool.apply_async(
+                    _extract_chunk, (lang, docs_texts, do_subngrams)
+                ))
+            pool.close()
+            for async_result in pending:
+                merge_partial(async_result)
+            pool.join()
+
         # integrate remaining ngrams and nodes-ngrams (after loop)
         if len(nodes_ngrams_count) > 0:
             _integrate_associations(nodes_ngrams_count, ngrams_data, db, cursor)
@@ -148,11 +254,42 @@ def extract_ngrams(corpus, keys=DEFAULT_INDEX_FIELDS, do_subngrams = DEFAULT_IND
 
     # end try
     except Exception as error:
+        if pool is not None:
+            pool.terminate()
         corpus.status('Ngrams', error=error)
         corpus.save_hyperdata()
         raise error
 
 
+def new_ngrams_subquery(corpus, from_doc_id):
+    """
+    Subquery of the ngrams that occur in the docs with id >= from_doc_id
+    but in none of the previous docs of the corpus
+    (ie the terms brought by an incremental update)
+    """
+    OldDoc = aliased(Node)
+    OldNodeNgram = aliased(NodeNgram)
+    in_old_docs = (session
+                    .query(OldNodeNgram.ngram_id)
+                    .join(OldDoc, OldDoc.id == OldNodeNgram.node_id)
+                    .filter(OldDoc.parent_id == corpus.id)
+                    .filter(OldDoc.typename == "DOCUMENT")
+                    .filter(OldDoc.id < from_doc_id)
+                    .filter(OldNodeNgram.ngram_id == NodeNgram.ngram_id)
+                    .exists()
+                  )
+    return (session
+                .query(NodeNgram.ngram_id)
+                .join(Node, Node.id == NodeNgram.node_id)
+                .filter(Node.parent_id == corpus.id)
+                .filter(Node.typename == "DOCUMENT")
+                .filter(Node.id >= from_doc_id)
+                .filter(~ in_old_docs)
+                .distinct()
+                .subquery()
+           )
+
+
 def normalize_forms(term_str, do_lowercase=DEFAULT_ALL_LOWERCASE_FLAG):
     """
     Removes unwanted trailing punctuation
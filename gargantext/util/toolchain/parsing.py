@@ -7,8 +7,11 @@ from gargantext.models import *
 from gargantext.constants import *
 #from gargantext.util.parsers import *
 from collections import defaultdict, Counter
-from re          import sub
+from re          import compile, escape
+from datetime    import datetime
 from gargantext.util.languages import languages, detect_lang
+from .hyperdata_indexing import index_documents_hyperdata
+from .tsvector_indexing  import index_documents_tsvectors
 
 
 def add_lang(hyperdata, observed_languages, skipped_languages):
@@ -91,7 +94,76 @@ def add_lang(hyperdata, observed_languages, skipped_languages):
     return lang_result
 
 
-def parse(corpus):
+def _insert_documents(corpus, documents, cursor):
+    """
+    Writes a batch of parsed documents as DOCUMENT children of the corpus
+    in one COPY (instead of one ORM add + commit per document)
+
+    @param documents  a list of (name, hyperdata) tuples
+    @return           the list of new node ids (in the same order)
+
+    NB: COPY can't return the ids so we reserve them beforehand
+        from the nodes id sequence
+    """
+    cursor.execute(
+        "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+        (Node.__tablename__, len(documents))
+    )
+    new_ids = [row[0] for row in cursor.fetchall()]
+
+    doctype = NODETYPES.index('DOCUMENT')
+    now = datetime.now()
+    bulk_insert(
+        table = Node,
+        fields = ('id', 'typename', 'user_id', 'parent_id', 'name', 'date', 'hyperdata'),
+        data = (
+            (new_id, doctype, corpus.user_id, corpus.id, name, now, json_dumps(hyperdata))
+            for new_id, (name, hyperdata) in zip(new_ids, documents)
+        ),
+        cursor = cursor,
+    )
+    return new_ids
+
+
+def _flush_documents(corpus, pending_docs, db, cursor, with_hyperdata_index=False):
+    """
+    Bulk writes the buffered docs, empties the buffer and returns the ids
+    of the docs that had a parsing error (for skipped_docs)
+
+    Option:
+        with_hyperdata_index: also writes their nodes_hyperdata rows
+                              (instead of a later index_hyperdata(corpus))
+
+    NB: with TSVECTOR_INDEXING their tsvectors are also written
+    """
+    new_ids = _insert_documents(
+        corpus,
+        [(name, hyperdata) for (name, hyperdata, _) in pending_docs],
+        cursor
+    )
+    if with_hyperdata_index:
+        index_documents_hyperdata(
+            [(new_id, hyperdata) for new_id, (_, hyperdata, _) in zip(new_ids, pending_docs)],
+            cursor
+        )
+    if TSVECTOR_INDEXING:
+        index_documents_tsvectors(new_ids, cursor)
+    db.commit()
+    error_ids = [new_id for new_id, (_, _, has_error) in zip(new_ids, pending_docs)
+                        if has_error]
+    pending_docs.clear()
+    return error_ids
+
+
+def parse(corpus, batch_size=BATCH_PARSING_SIZE, with_hyperdata_index=False):
+    """
+    Parses all the unextracted resources of the corpus and writes their
+    documents as DOCUMENT nodes, by batches of batch_size docs (cf. COPY
+    in _insert_documents)
+
+    With with_hyperdata_index the nodes_hyperdata rows are written at the
+    same time (so there's no need for toolchain.index_hyperdata afterwards)
+    """
     try:
         print("PARSING")
         # print("DETECT_LANG?", DETECT_LANG)
@@ -118,6 +190,11 @@ def parse(corpus):
         pending_add_error_stats = False
         skipped_docs = []
 
+        # parsed docs waiting for the next bulk write
+        # (name, hyperdata, has_parsing_error)
+        pending_docs = []
+        db, cursor = get_cursor()
+
         documents_count = 0
         #BY RESOURCE
         for i,resource in enumerate(resources):
@@ -166,30 +243,31 @@ def parse(corpus):
                             })
                         pending_add_error_stats = True
 
-                    # -----------------------
-                    # save as corpus DB child
-                    # -----------------------
-                    document = corpus.add_child(
-                        typename = 'DOCUMENT',
-                        name = hyperdata.get('title', '')[:255],
-                        hyperdata = hyperdata,
-                    )
-                    session.add(document)
-                    session.commit()
+                    # ---------------------------------
+                    # buffer for save as corpus DB child
+                    # ---------------------------------
+                    pending_docs.append((
+                        hyperdata.get('title', '')[:255],
+                        hyperdata,
+                        pending_add_error_stats
+                    ))
+                    pending_add_error_stats = False
                     documents_count += 1
 
-                    if pending_add_error_stats:
-                        #adding skipped_docs for later processing if error in parsing
-                        skipped_docs.append(document.id)
-                        pending_add_error_stats = False
-
                     #BATCH_PARSING_SIZE
-                    if documents_count % BATCH_PARSING_SIZE == 0:
+                    if len(pending_docs) >= batch_size:
+                        skipped_docs += _flush_documents(corpus, pending_docs, db, cursor,
+                                                         with_hyperdata_index)
                         corpus.status('Docs', progress=documents_count)
                         corpus.save_hyperdata()
                         session.add(corpus)
                         session.commit()
 
+                # write the remaining docs of this resource
+                if len(pending_docs):
+                    skipped_docs += _flush_documents(corpus, pending_docs, db, cursor,
+                                                     with_hyperdata_index)
+
                 # update info about the resource
                 resource['extracted'] = True
                 #print( "resource n°",i, ":", d, "docs inside this file")
@@ -203,8 +281,10 @@ def parse(corpus):
         #STORING AGREGATIONS INFO (STATS)
 
         # skipped_docs (ie docs to be skipped in next steps)
+        # (+ those of the previously extracted resources if any)
         print(len(skipped_docs), "docs skipped")
-        corpus.hyperdata["skipped_docs"] = list(skipped_docs)
+        corpus.hyperdata["skipped_docs"] = (corpus.hyperdata.get("skipped_docs", [])
+                                            + list(skipped_docs))
         corpus.save_hyperdata()
 
         # documents info
@@ -215,10 +295,17 @@ def parse(corpus):
         print(docs, "parsed")
 
         # language stats
+        # (+ those of the previously extracted resources if any)
+        previous_langs = corpus.hyperdata.get("languages", {})
         #les langues pas belles
-        skipped_langs = dict(Counter(skipped_languages))      # idem
+        skipped_langs = Counter(skipped_languages)      # idem
+        skipped_langs.update(previous_langs.get("__unknown__", []))
+        skipped_langs = dict(skipped_langs)
         #les jolis iso2
-        observed_langs = dict(Counter(observed_languages))
+        observed_langs = Counter(observed_languages)
+        observed_langs.update({lang: count for lang, count in previous_langs.items()
+                                           if lang != "__unknown__"})
+        observed_langs = dict(observed_langs)
 
         # print("#LANGAGES OK")
         # print(observed_langs)
@@ -244,6 +331,80 @@ def parse(corpus):
 
 
 
+# ---------------------------------------------------------------------
+# caractère par caractère: une seule table de traduction
+# ---------------------------------------------------------------------
+_NORMALIZE_CHARS_TABLE = {}
+
+# E S P A C E S
+# tous les caractères de contrôle (dont \t = \x{0009}, \n = \x{000A} et \r = \x{000D}) --> espace
+_NORMALIZE_CHARS_TABLE.update({c: ' ' for c in list(range(0x00, 0x20)) + [0x7F]})
+# Line separator
+_NORMALIZE_CHARS_TABLE.update({0x2028: ' ', 0x2029: ' '})
+# U+0092: parfois quote parfois cara de contrôle
+_NORMALIZE_CHARS_TABLE[0x0092] = ' '
+# tous les espaces alternatifs --> espace
+_NORMALIZE_CHARS_TABLE.update(
+    {ord(c): ' ' for c in '\u00A0\u1680\u180E\u2000\u2001\u2002\u2003\u2004\u2005\u2006\u2007\u2008\u2009\u200A\u200B\u202F\u205F\u3000\uFEFF'}
+)
+
+# P O N C T U A T I O N S
+# la plupart des tirets alternatifs --> tiret normal (dit "du 6")
+# (dans l'ordre U+2010 U+2011 U+2012 U+2013 U+2014 U+2015 U+2212 U+FE63)
+_NORMALIZE_CHARS_TABLE.update({ord(c): '-' for c in '‐‑‒–—―−﹣'})
+# le macron aussi parfois comme tiret
+_NORMALIZE_CHARS_TABLE[0x00AF] = '-'
+# la plupart des quotes simples --> ' APOSTROPHE
+_NORMALIZE_CHARS_TABLE.update({ord(c): "'" for c in "‘’‚`‛"})  # U+2018 U+2019 U+201a U+201b
+# la plupart des quotes doubles --> " QUOTATION MARK
+_NORMALIZE_CHARS_TABLE.update({ord(c): '"' for c in '“”„‟'})   # U+201C U+201D U+201E U+201F
+
+# NB: U+0085 (paragraph separator utilisé parfois comme '...') est un \s
+#     => espace (comme avant avec sub(r'\s+', ' ', ...) appliqué en premier)
+_NORMALIZE_CHARS_TABLE[0x0085] = ' '
+
+# Autres
+_NORMALIZE_CHARS_TABLE[ord('…')] = '...'
+_NORMALIZE_CHARS_TABLE[ord('€')] = 'EUR'
+# quelques puces courantes (bullets)
+_NORMALIZE_CHARS_TABLE.update({ord(c): '*' for c in '▪►●◘→•·'})
+
+# L I G A T U R E S
+_NORMALIZE_CHARS_TABLE.update({ord(c): d for c, d in {
+    'Ꜳ': 'AA', 'ꜳ': 'aa', 'Æ': 'AE', 'æ': 'ae',
+    'Ǳ': 'DZ', 'ǲ': 'Dz', 'ǳ': 'dz',
+    'ﬃ': 'ffi', 'ﬀ': 'ff', 'ﬁ': 'fi', 'ﬄ': 'ffl', 'ﬂ': 'fl', 'ﬅ': 'ft',
+    'Ĳ': 'IJ', 'ĳ': 'ij', 'Ǉ': 'LJ', 'ǉ': 'lj', 'Ǌ': 'NJ', 'ǌ': 'nj',
+    'Œ': 'OE', 'œ': 'oe',
+    '\u009C': 'oe',   # U+009C (cara contrôle vu comme oe)
+    'ﬆ': 'st', 'Ꜩ': 'Tz', 'ꜩ': 'tz',
+}.items()})
+
+# les suites de caractères de la table (rares dans un texte courant)
+# => str.translate seulement sur ces suites
+_chars_to_translate = compile('[%s]+' % ''.join(
+    escape(chr(c)) for c in sorted(_NORMALIZE_CHARS_TABLE)
+))
+
+def _translate_chars(match):
+    return match.group().translate(_NORMALIZE_CHARS_TABLE)
+
+# ---------------------------------------------------------------------
+# selon le contexte: les quelques regexps restantes
+# ---------------------------------------------------------------------
+# (après la table tous les \s sont devenus des espaces)
+_spaces = compile(r'  +')
+
+# chevrons simples ou doubles avec l'espace éventuel côté intérieur
+# U+2039 U+203A --> ' APOSTROPHE
+# U+00AB U+00BB --> " QUOTATION MARK
+_angle_quotes = compile(r'‹ ?| ?›|« ?| ?»')
+_angle_quotes_replacements = {'‹': "'", '›': "'", '«': '"', '»': '"'}
+
+def _replace_angle_quote(match):
+    return _angle_quotes_replacements[match.group().strip(' ')]
+
+
 def normalize_chars(my_str):
     """
     Simplification des chaînes de caractères en entrée de la BDD
@@ -260,99 +421,27 @@ def normalize_chars(my_str):
       (autres traitements plus invasifs, comme enlever les guillemets
        ou passer en lowercase, seront à placer plutôt *après* le tagger,
             cf. toolchain.ngrams_extraction.normalize_forms)
+
+    NB: les remplacements caractère par caractère se font en une passe
+        (_NORMALIZE_CHARS_TABLE), puis seulement les espaces et les
+        guillemets qui dépendent du contexte
     """
     # print('normalize_chars  IN: "%s"' % my_str)
-    # --------------
-    # E S P A C E S
-    # --------------
-    # tous les caractères de contrôle (dont \t = \x{0009}, \n = \x{000A} et \r = \x{000D}) --> espace
-    my_str = sub(r'[\u0000\u0001\u0002\u0003\u0004\u0005\u0006\u0007\u0008\u0009\u000A\u000B\u000C\u000D\u000E\u000F\u0010\u0011\u0012\u0013\u0014\u0015\u0016\u0017\u0018\u0019\u001A\u001B\u001C\u001D\u001E\u001F\u007F]', ' ', my_str)
-
-    # Line separator
-    my_str = sub(r'\u2028',' ', my_str)
-    my_str = sub(r'\u2029',' ', my_str)
-
-    # U+0092: parfois quote parfois cara de contrôle
-    my_str = sub(r'\u0092', ' ', my_str)
-
-    # tous les espaces alternatifs --> espace
-    my_str = sub(r'[\u00A0\u1680\u180E\u2000\u2001\u2002\u2003\u2004\u2005\u2006\u2007\u2008\u2009\u200A\u200B\u202F\u205F\u3000\uFEFF]', ' ' , my_str)
+    my_str = _chars_to_translate.sub(_translate_chars, my_str)
 
     # pour finir on enlève les espaces en trop
     # (dits "trailing spaces")
-    my_str = sub(r'\s+', ' ', my_str)
-    my_str = sub(r'^\s', '', my_str)
-    my_str = sub(r'\s$', '', my_str)
-
-    # ------------------------
-    # P O N C T U A T I O N S
-    # ------------------------
-    # la plupart des tirets alternatifs --> tiret normal (dit "du 6")
-    # (dans l'ordre U+002D U+2010 U+2011 U+2012 U+2013 U+2014 U+2015 U+2212 U+FE63)
-    my_str = sub(r'[‐‑‒–—―−﹣]','-', my_str)
-
-    # le macron aussi parfois comme tiret
-    my_str = sub(r'\u00af','-', my_str)
-
-    # Guillemets
-    # ----------
-    # la plupart des quotes simples --> ' APOSTROPHE
-    my_str = sub(r"[‘’‚`‛]", "'", my_str) # U+2018 U+2019 U+201a U+201b
-    my_str = sub(r'‹ ?',"'", my_str)    # U+2039 plus espace éventuel après
-    my_str = sub(r' ?›',"'", my_str)    # U+203A plus espace éventuel avant
-
-    # la plupart des quotes doubles --> " QUOTATION MARK
-    my_str = sub(r'[“”„‟]', '"', my_str)  # U+201C U+201D U+201E U+201F
-    my_str = sub(r'« ?', '"', my_str)   # U+20AB plus espace éventuel après
-    my_str = sub(r' ?»', '"', my_str)   # U+20AB plus espace éventuel avant
+    my_str = _spaces.sub(' ', my_str)
+    if my_str.startswith(' '):
+        my_str = my_str[1:]
+    if my_str.endswith(' '):
+        my_str = my_str[:-1]
+
+    # chevrons plus espace éventuel à l'intérieur
+    my_str = _angle_quotes.sub(_replace_angle_quote, my_str)
 
     # deux quotes simples (préparées ci-dessus) => une double
-    my_str = sub(r"''", '"', my_str)
-
-    # Autres
-    # -------
-    my_str = sub(r'…', '...', my_str)
-    # paragraph separator utilisé parfois comme '...'
-    my_str = sub(r'\u0085', '...', my_str)
-    my_str = sub(r'€', 'EUR', my_str)
-
-    # quelques puces courantes (bullets)
-    my_str = sub(r'▪', '*', my_str)
-    my_str = sub(r'►', '*', my_str)
-    my_str = sub(r'●', '*', my_str)
-    my_str = sub(r'◘', '*', my_str)
-    my_str = sub(r'→', '*', my_str)
-    my_str = sub(r'•', '*', my_str)
-    my_str = sub(r'·', '*', my_str)
-
-    # ------------------
-    # L I G A T U R E S
-    # ------------------
-    my_str = sub(r'Ꜳ', 'AA', my_str)
-    my_str = sub(r'ꜳ', 'aa', my_str)
-    my_str = sub(r'Æ', 'AE', my_str)
-    my_str = sub(r'æ', 'ae', my_str)
-    my_str = sub(r'Ǳ', 'DZ', my_str)
-    my_str = sub(r'ǲ', 'Dz', my_str)
-    my_str = sub(r'ǳ', 'dz', my_str)
-    my_str = sub(r'ﬃ', 'ffi', my_str)
-    my_str = sub(r'ﬀ', 'ff', my_str)
-    my_str = sub(r'ﬁ', 'fi', my_str)
-    my_str = sub(r'ﬄ', 'ffl', my_str)
-    my_str = sub(r'ﬂ', 'fl', my_str)
-    my_str = sub(r'ﬅ', 'ft', my_str)
-    my_str = sub(r'Ĳ', 'IJ', my_str)
-    my_str = sub(r'ĳ', 'ij', my_str)
-    my_str = sub(r'Ǉ', 'LJ', my_str)
-    my_str = sub(r'ǉ', 'lj', my_str)
-    my_str = sub(r'Ǌ', 'NJ', my_str)
-    my_str = sub(r'ǌ', 'nj', my_str)
-    my_str = sub(r'Œ', 'OE', my_str)
-    my_str = sub(r'œ', 'oe', my_str)
-    my_str = sub(r'\u009C', 'oe', my_str)   # U+009C (cara contrôle vu comme oe)
-    my_str = sub(r'ﬆ', 'st', my_str)
-    my_str = sub(r'Ꜩ', 'Tz', my_str)
-    my_str = sub(r'ꜩ', 'tz', my_str)
+    my_str = my_str.replace("''", '"')
 
     # print('normalize_chars OUT: "%s"' % my_str)
 
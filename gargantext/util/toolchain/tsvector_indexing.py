@@ -0,0 +1,124 @@
+"""
+Optional full-text side table of the DOCUMENT nodes (cf. TSVECTOR_INDEXING)
+
+    nodes_tsvectors.tsv = to_tsvector('simple', DEFAULT_INDEX_FIELDS of the doc)
+
+The 'simple' configuration only lowercases the words (no stemming, no
+stopwords) and the punctuation that the postgres parser would keep inside
+a token (hosts, emails, paths, floats, signed ints...) is first replaced
+by spaces, so every word of the text is a lexeme of the vector.
+
+=> the docs where a term can occur are the docs whose vector has all the
+   words of the term: they are found with the GIN index, and the exact
+   occurrences are then counted in python (cf. ngrams_addition)
+"""
+from gargantext.util.db   import session, get_cursor
+from gargantext.models    import Node, NodeTsvector
+from gargantext.constants import NODETYPES, DEFAULT_INDEX_FIELDS
+from sqlalchemy           import text
+
+TSVECTOR_CONFIG = 'simple'
+
+# chars that can join words in a single token of the postgres parser
+_JOINERS = '.@/:-+<>&'
+
+_text_sql = lambda expr: "translate(%s, '%s', '%s')" % (
+    expr, _JOINERS, ' ' * len(_JOINERS)
+)
+
+_document_tsvector_sql = "to_tsvector('%s', %s)" % (
+    TSVECTOR_CONFIG,
+    _text_sql(" || ' ' || ".join(
+        "coalesce(nodes.hyperdata->>'%s', '')" % key
+        for key in DEFAULT_INDEX_FIELDS
+    ))
+)
+
+
+def index_documents_tsvectors(doc_ids, cursor=None):
+    """Writes the tsvectors of some docs that were just inserted
+    (cf. parsing, by batches of new docs)
+    """
+    if cursor is None:
+        db, cursor = get_cursor()
+        mustcommit = True
+    else:
+        mustcommit = False
+    cursor.execute('''
+        INSERT INTO {table} (node_id, tsv)
+        SELECT nodes.id, {tsvector}
+        FROM nodes
+        WHERE nodes.id = ANY(%s)
+        ON CONFLICT (node_id) DO NOTHING
+    '''.format(
+        table = NodeTsvector.__tablename__,
+        tsvector = _document_tsvector_sql,
+    ), (list(doc_ids), ))
+    if mustcommit:
+        db.commit()
+
+
+def index_tsvectors(corpus, cursor=None):
+    """Writes the tsvectors of all the corpus docs that don't have one yet
+    (ex: docs parsed before TSVECTOR_INDEXING was set)
+
+    @return the number of new tsvectors
+    """
+    if cursor is None:
+        db, cursor = get_cursor()
+        mustcommit = True
+    else:
+        mustcommit = False
+    cursor.execute('''
+        INSERT INTO {table} (node_id, tsv)
+        SELECT nodes.id, {tsvector}
+        FROM nodes
+        LEFT JOIN {table} AS done ON done.node_id = nodes.id
+        WHERE nodes.parent_id = %s
+          AND nodes.typename = %s
+          AND done.node_id IS NULL
+    '''.format(
+        table = NodeTsvector.__tablename__,
+        tsvector = _document_tsvector_sql,
+    ), (corpus.id, NODETYPES.index('DOCUMENT')))
+    n_new = cursor.rowcount
+    if mustcommit:
+        db.commit()
+    return n_new
+
+
+def terms_tsquery(terms):
+    """
+    ['british museum', 'eau'] => "( 'british' & 'museum' ) | ( 'eau' )"
+
+    (the tsquery of the docs having all the words of at least one term,
+     made by the db with the same parser as the tsvectors)
+
+    @return None if there's no term or if a term has no word at all
+            (=> can't filter the docs)
+    """
+    if not terms:
+        return None
+    queries = session.execute(
+        text("""
+            SELECT plainto_tsquery('%s', %s)::text
+            FROM unnest(:terms) AS term
+        """ % (TSVECTOR_CONFIG, _text_sql('term'))),
+        {'terms': list(terms)}
+    )
+    queries = [query for (query,) in queries]
+    if not all(queries):
+        return None
+    return ' | '.join('( %s )' % query for query in queries)
+
+
+def documents_having(query, tsquery):
+    """
+    Filters a query on Node to the docs whose tsvector matches tsquery
+    """
+    return (query
+            .join(NodeTsvector, NodeTsvector.node_id == Node.id)
+            .filter(text("%s.tsv @@ CAST(:tsquery AS tsquery)"
+                         % NodeTsvector.__tablename__)
+                    .bindparams(tsquery=tsquery))
+           )
@@ -14,23 +14,24 @@ def filterByBridgeness(G,partition,ids,weight,bridgeness,type,field1,field2):
     data = dict()
     if type == "node_link":
         nodesB_dict = {}
+        # all the labels in one query
+        labels = get_labels(G.nodes())
+
+        # nodes directly in the compact format of graph.utils.compress_graph
+        nodes = []
         for node_id in G.nodes():
-            #node,type(labels[node])
             nodesB_dict [ ids[node_id][1] ] = True
-            
-            # TODO the query below is not optimized (do it do_distance).
-            the_label = session.query(Ngram.terms).filter(Ngram.id==node_id).first()
-            the_label = ", ".join(the_label)
-            
-            
-            G.node[node_id]['label']        = the_label
-
-            G.node[node_id]['size']         = weight[node_id]
-            
-            G.node[node_id]['type']         = ids[node_id][0].replace("ngrams","terms")
-            
-            G.node[node_id]['attributes']   = { "clust_default": partition[node_id]} # new format
-            # G.add_edge(node, "cluster " + str(partition[node]), weight=3)
+
+            node = { "id" : node_id
+                   , "lb" : labels.get(node_id, "")
+                   , "s"  : weight[node_id]
+                   , "at" : { "cl": partition[node_id] }
+                   }
+            node_type = ids[node_id][0].replace("ngrams","terms")
+            if node_type != "terms":
+                # "terms" is the default type: no need to send it
+                node["t"] = node_type
+            nodes.append(node)
 
         links = []
         i=1
@@ -50,7 +51,7 @@ def filterByBridgeness(G,partition,ids,weight,bridgeness,type,field1,field2):
             if bridgeness < 0:
                 info = { "s": ids[s][1]
                        , "t": ids[t][1]
-                       , "w": weight
+                       , "w": format(weight, '.3f')
                        }
                 links.append(info)
 
@@ -59,7 +60,7 @@ def filterByBridgeness(G,partition,ids,weight,bridgeness,type,field1,field2):
 
                     info = { "s": ids[s][1]
                            , "t": ids[t][1]
-                           , "w": weight
+                           , "w": format(weight, '.3f')
                            }
                     links.append(info)
 
@@ -82,14 +83,12 @@ def filterByBridgeness(G,partition,ids,weight,bridgeness,type,field1,field2):
                                           , reverse=True)[:index]:
                             #print(c1, c2, link[2])
                             
-                            info = {"s": link[0], "t": link[1], "w": link[2]}
+                            info = {"s": link[0], "t": link[1], "w": format(link[2], '.3f')}
                             
                             links.append(info)
 
 
-        B = json_graph.node_link_data(G)
-        B["links"] = []
-        B["links"] = links
+        B = { "nodes": nodes, "links": links }
         if field1 == field2 == 'ngrams' :
             data["nodes"] = B["nodes"]
             data["links"] = B["links"]
@@ -121,3 +120,16 @@ def filterByBridgeness(G,partition,ids,weight,bridgeness,type,field1,field2):
         return(partition)
 
     return(data)
+
+
+def get_labels(ngram_ids):
+    '''
+    {ngram_id => terms} for all the ngram_ids in one query
+    '''
+    ngram_ids = list(ngram_ids)
+    if not ngram_ids:
+        return {}
+    return dict( session.query(Ngram.id, Ngram.terms)
+                        .filter(Ngram.id.in_(ngram_ids))
+                        .all()
+               )
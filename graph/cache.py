@@ -0,0 +1,84 @@
+"""
+Process-level cache of the graph computations (see graph.compute_graph)
+
+3 layers, each one an LRU dict with its own size (GRAPH_CACHE_SIZES):
+    'cooc'     : fingerprint                         => (cooc_id, cooc_matrix)
+    'distance' : (fingerprint, distance)             => (G, partition, ids, weight)
+    'json'     : (fingerprint, distance, bridgeness) => node-link data
+
+The fingerprint covers all the parameters of countCooccurrences and the
+contents (versions) of the map and group lists: so an edited list gives new
+keys. This is how the cache is invalidated: it lives in the process that
+runs compute_graph (the celery worker, cf. graph_constraints['corpusMax']),
+not in the web process that edits the lists, and the entries of the old
+versions just leave by LRU.
+"""
+
+from gargantext.util.db      import session
+from gargantext.util.digest  import str_digest
+from gargantext.constants    import GRAPH_CACHE_SIZES
+from sqlalchemy              import text
+from collections             import OrderedDict
+
+
+def list_version(list_id):
+    """
+    Digest of the contents of a NodeNgram list (map) or of a NodeNgramNgram
+    list (groups), computed by the db
+    """
+    if list_id is None:
+        return None
+    return session.execute(text("""
+        SELECT md5(string_agg(items.item, ',' ORDER BY items.item))
+        FROM (
+            SELECT ngram_id::text AS item
+            FROM nodes_ngrams WHERE node_id = :list_id
+            UNION ALL
+            SELECT ngram1_id || ':' || ngram2_id
+            FROM nodes_ngrams_ngrams WHERE node_id = :list_id
+        ) AS items
+        """), {'list_id': list_id}).scalar()
+
+
+def graph_fingerprint( corpus_id , field1, field2
+                     , start     , end
+                     , mapList_id, groupList_id
+                     , isMonopartite, threshold
+                     ):
+    """
+    Key of the cooc layer (the other layers add distance and bridgeness)
+    """
+    parameters = ( corpus_id, field1, field2
+                 , str(start), str(end)
+                 , mapList_id, list_version(mapList_id)
+                 , groupList_id, list_version(groupList_id)
+                 , isMonopartite, threshold
+                 )
+    return str_digest(repr(parameters).encode())
+
+
+class GraphCache:
+
+    def __init__(self, sizes=GRAPH_CACHE_SIZES):
+        self.sizes = dict(sizes)
+        self.layers = {layer: OrderedDict() for layer in self.sizes}
+
+    def get(self, layer, key):
+        entries = self.layers[layer]
+        if key not in entries:
+            return None
+        entries.move_to_end(key)
+        return entries[key]
+
+    def put(self, layer, key, value):
+        entries = self.layers[layer]
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > self.sizes[layer]:
+            entries.popitem(last=False)
+
+    def clear(self):
+        for entries in self.layers.values():
+            entries.clear()
+
+graph_cache = GraphCache()
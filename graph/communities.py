@@ -0,0 +1,250 @@
+"""
+Community detection backends for clusterByDistances
+
+    'networkx' : graph.louvain.best_partition (dict-based, on the networkx graph)
+    'csr'      : CSRLouvain below (same Louvain heuristic on a CSR adjacency
+                 with the nodes relabelled 0..N-1)
+
+Both give a partition {node => community} with communities numbered from 0.
+"""
+
+from graph                 import louvain
+from gargantext.constants  import GRAPH_COMMUNITY_BACKEND
+
+from collections import defaultdict
+from time        import time
+
+import numpy    as np
+from scipy      import sparse
+
+
+# the minimum modularity gain to go on (same as graph.louvain)
+MIN_MODULARITY_GAIN = 0.0000001
+
+
+class CSRLouvain:
+    """
+    Louvain on the symmetric adjacency matrix D of an undirected graph, where
+    the self loops are counted twice (D[i,i] = 2 x loop weight) so that:
+        - the node degrees are the row sums
+        - the total weight 2m is the sum of D
+        - the graph induced by a partition P (n x k membership) is Pt.D.P
+
+    Options:
+        seed: the nodes are visited in a random order drawn with this seed
+              (default: in the order of graph.nodes())
+        max_passes: max passes over the nodes by level (-1 <=> until stable)
+
+    After best_partition, self.timings has the time spent in each step
+    and the number of levels and passes.
+    """
+
+    def __init__(self, seed=None, max_passes=-1):
+        self.seed = seed
+        self.max_passes = max_passes
+        self.timings = defaultdict(float)
+
+    def best_partition(self, graph, partition=None):
+        """
+        partition: optional warm start {node => community}
+                   (the nodes that are not in it start in their own community)
+        """
+        self.timings.clear()
+        self.random = np.random.RandomState(self.seed) if self.seed is not None else None
+
+        t0 = time()
+        nodes, D = self.adjacency(graph)
+        self.timings['build'] += time() - t0
+
+        if D.nnz == 0:
+            # no link: everyone in its own community
+            return {node: i for i, node in enumerate(nodes)}
+
+        node2com = self.initial_communities(nodes, partition)
+        node_com = np.arange(len(nodes))
+        modularity = None
+
+        while True:
+            t0 = time()
+            node2com, new_modularity = self.one_level(D, node2com)
+            self.timings['one_level'] += time() - t0
+
+            if modularity is not None and new_modularity - modularity < MIN_MODULARITY_GAIN:
+                break
+            modularity = new_modularity
+            self.timings['levels'] += 1
+
+            # renumbering + next level on the induced graph
+            t0 = time()
+            communities, node2com = np.unique(node2com, return_inverse=True)
+            node_com = node2com[node_com]
+            D = self.induced(D, node2com, len(communities))
+            node2com = np.arange(len(communities))
+            self.timings['aggregate'] += time() - t0
+
+        self.modularity = modularity
+        return dict(zip(nodes, node_com.tolist()))
+
+    @staticmethod
+    def adjacency(graph):
+        """
+        networkx graph => (nodes, D) (D as described in the class docstring)
+        """
+        nodes = list(graph.nodes())
+        index = {node: i for i, node in enumerate(nodes)}
+        rows, cols, weights = [], [], []
+        for node1, node2, datas in graph.edges(data=True):
+            weight = datas.get("weight", 1)
+            if weight < 0:
+                raise ValueError("Bad graph type, use positive weights")
+            rows.append(index[node1])
+            cols.append(index[node2])
+            weights.append(weight)
+        rows = np.array(rows, dtype=np.int64)
+        cols = np.array(cols, dtype=np.int64)
+        weights = np.array(weights, dtype=np.float64)
+        n = len(nodes)
+        D = sparse.coo_matrix(
+                ( np.concatenate((weights, weights))
+                , ( np.concatenate((rows, cols))
+                  , np.concatenate((cols, rows))))
+                , shape = (n, n)
+            ).tocsr()
+        D.sum_duplicates()
+        D.eliminate_zeros()
+        return nodes, D
+
+    @staticmethod
+    def initial_communities(nodes, partition=None):
+        """
+        communities 0..k-1 from the warm start partition (or one by node)
+        """
+        if not partition:
+            return np.arange(len(nodes))
+        renumbered = {}
+        node2com = np.empty(len(nodes), dtype=np.int64)
+        for i, node in enumerate(nodes):
+            key = ('com', partition[node]) if node in partition else ('node', node)
+            node2com[i] = renumbered.setdefault(key, len(renumbered))
+        return node2com
+
+    @staticmethod
+    def modularity_of(D, node2com):
+        """
+        sum_c ( internal_c / m - (degree_c / 2m)² )
+        """
+        m2 = D.sum()
+        degrees = np.asarray(D.sum(axis=1)).ravel()
+        coo = D.tocoo()
+        internal = coo.data[node2com[coo.row] == node2com[coo.col]].sum()
+        com_degrees = np.bincount(node2com, weights=degrees)
+        return internal / m2 - ((com_degrees / m2) ** 2).sum()
+
+    @staticmethod
+    def induced(D, node2com, n_communities):
+        """
+        Pt.D.P: the graph where the nodes are the communities
+        """
+        P = sparse.csr_matrix(
+                (np.ones(len(node2com)), (np.arange(len(node2com)), node2com)),
+                shape = (len(node2com), n_communities)
+            )
+        return (P.T.dot(D).dot(P)).tocsr()
+
+    def one_level(self, D, node2com):
+        """
+        Moves each node to the neighbour community with the best modularity
+        increase, until no node moves (or the gain is too small)
+        """
+        n = D.shape[0]
+        node2com = node2com.copy()
+        degrees = np.asarray(D.sum(axis=1)).ravel()
+        m2 = degrees.sum()
+        com_degrees = np.bincount(node2com, weights=degrees, minlength=n)
+        indptr, indices, data = D.indptr, D.indices, D.data
+        links = np.zeros(n)
+
+        modularity = self.modularity_of(D, node2com)
+        n_passes = 0
+        while n_passes != self.max_passes:
+            n_passes += 1
+            moved = False
+            order = self.random.permutation(n) if self.random is not None else range(n)
+            for node in order:
+                neighbors = indices[indptr[node]:indptr[node+1]]
+                weights = data[indptr[node]:indptr[node+1]]
+                others = neighbors != node
+                neighbors, weights = neighbors[others], weights[others]
+
+                com_node = node2com[node]
+                com_degrees[com_node] -= degrees[node]
+                best_com = com_node
+                if len(neighbors):
+                    # NB: one increase by neighbour (the same for the neighbours
+                    #     of a community), it's cheaper than grouping them
+                    communities = node2com[neighbors]
+                    # links to each neighbour community, summed in a zeroed
+                    # work array and reset after (only the neighbours' cells
+                    # are touched: a pass stays ~ O(number of edges))
+                    np.add.at(links, communities, weights)
+                    increases = ( links[communities]
+                                - com_degrees[communities] * degrees[node] / m2 )
+                    links[communities] = 0
+                    best = increases.argmax()
+                    if increases[best] > 0:
+                        best_com = communities[best]
+                com_degrees[best_com] += degrees[node]
+                if best_com != com_node:
+                    node2com[node] = best_com
+                    moved = True
+
+            new_modularity = self.modularity_of(D, node2com)
+            gain = new_modularity - modularity
+            modularity = new_modularity
+            if not moved or gain < MIN_MODULARITY_GAIN:
+                break
+        self.timings['passes'] += n_passes
+        return node2com, modularity
+
+
+def csr_best_partition(graph, partition=None, seed=None):
+    louvain_csr = CSRLouvain(seed=seed)
+    result = louvain_csr.best_partition(graph, partition)
+    best_partition.timings = dict(louvain_csr.timings)
+    return result
+
+
+def networkx_best_partition(graph, partition=None, seed=None):
+    t0 = time()
+    if partition:
+        # graph.louvain needs a community for every node: the nodes that
+        # are not in the warm start (ex: filtered by another bridgeness)
+        # get their own
+        nodes = list(graph.nodes())
+        node2com = CSRLouvain.initial_communities(nodes, partition)
+        partition = dict(zip(nodes, node2com.tolist()))
+    result = louvain.best_partition(graph, partition)
+    best_partition.timings = {'total': time() - t0}
+    return result
+
+
+BACKENDS = { 'networkx' : networkx_best_partition
+           , 'csr'      : csr_best_partition
+           }
+
+
+def best_partition(graph, partition=None, backend=GRAPH_COMMUNITY_BACKEND, seed=None):
+    """
+    Louvain partition of the undirected graph with the given backend
+
+    partition: optional warm start {node => community} (ex: the communities
+               of the same graph with another bridgeness)
+    seed:      random order of the nodes ('csr' backend)
+
+    NB: best_partition.timings has the timing counters of the last call
+    """
+    if backend not in BACKENDS:
+        raise ValueError("Community backend must be in %s" % str(list(BACKENDS)))
+    return BACKENDS[backend](graph, partition=partition, seed=seed)
+
+best_partition.timings = {}
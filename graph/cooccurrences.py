@@ -3,9 +3,13 @@ from gargantext.models     import Node, Ngram, NodeNgram, NodeNgramNgram, \
 from gargantext.util.db    import session, aliased, func
 
 from gargantext.util.lists import WeightedMatrix, UnweightedList, Translations
+from gargantext.util.toolchain.ngram_coocs import coocs_from_pairs
+from gargantext.constants  import COOCS_IN_PROCESS, BATCH_COOCS_PAIRS_SIZE
 
 from sqlalchemy            import desc, asc, or_, and_
 from datetime              import datetime
+from array                 import array
+import numpy as np
 
 
 def filterMatrix(matrix, mapList_id, groupList_id):
@@ -23,6 +27,7 @@ def countCooccurrences( corpus_id=None      , cooc_id=None
                       , n_min=1, n_max=None , limit=1000
                       , isMonopartite=True  , threshold = 3
                       , save_on_db= True    , reset=True
+                      , in_process=COOCS_IN_PROCESS
                       ):
     '''
     Compute the cooccurence matrix and save it, returning NodeNgramNgram.node_id
@@ -37,6 +42,8 @@ def countCooccurrences( corpus_id=None      , cooc_id=None
     end   :: TimeStamp
     limit :: Int
 
+    in_process :: Bool -- (monopartite only) stream the (doc, ngram) pairs
+                          of the map list and count them with coocs_from_pairs
     '''
     # FIXME remove the lines below after factorization of parameters
     parameters = dict()
@@ -85,6 +92,14 @@ def countCooccurrences( corpus_id=None      , cooc_id=None
 
     NodeNgramX = aliased(NodeNgram)
 
+    if in_process and isMonopartite:
+        cooc = countCooccurrencesInProcess( corpus, NodeNgramX
+                                          , mapList_id, groupList_id
+                                          , start, end, n_min, n_max
+                                          , threshold, parameters
+                                          )
+        return saveCooccurrences(cooc_id, cooc, parameters, save_on_db)
+
     # Simple Cooccurrences
     cooc_score = func.count(NodeNgramX.node_id).label('cooc_score')
 
@@ -214,6 +229,14 @@ def countCooccurrences( corpus_id=None      , cooc_id=None
     parameters['MapList_id']   = str(mapList_id)
     parameters['GroupList_id'] = str(groupList_id)
 
+    return saveCooccurrences(cooc_id, cooc, parameters, save_on_db)
+
+
+def saveCooccurrences(cooc_id, cooc, parameters, save_on_db=True):
+    '''
+    Saves the cooc matrix and the parameters in the node cooc_id
+    (if save_on_db), returns (cooc_id, cooc)
+    '''
     # TODO factorize savings on db
     if save_on_db:
         # Saving the cooccurrences
@@ -232,4 +255,81 @@ def countCooccurrences( corpus_id=None      , cooc_id=None
         #data = cooc2graph(coocNode.id, cooc, distance=distance, bridgeness=bridgeness)
         #return data
 
-    return(coocNode.id, cooc)
+    return(int(cooc_id), cooc)
+
+
+def countCooccurrencesInProcess( corpus, NodeNgramX
+                               , mapList_id, groupList_id
+                               , start, end, n_min, n_max
+                               , threshold, parameters
+                               ):
+    '''
+    Same cooc as the SQL query of countCooccurrences (+ filterMatrix), but
+    only the (doc, ngram) pairs of the map list ngrams are fetched, the
+    counting is done by the worker (sparse Xt.X in coocs_from_pairs)
+    '''
+    mapList    = UnweightedList( mapList_id  )
+    group_list = Translations  ( groupList_id )
+    kept_ngrams = (mapList * group_list).items
+
+    pairs_query = (session.query( Node.id, NodeNgramX.ngram_id )
+                          .join( NodeNgramX
+                               , NodeNgramX.node_id == Node.id
+                               )
+                          .filter( Node.parent_id == corpus.id
+                                 , Node.typename  == "DOCUMENT"
+                                 )
+                          .filter( NodeNgramX.ngram_id.in_(kept_ngrams) )
+                  )
+
+    if n_min is not None or n_max is not None:
+        NgramX = aliased(Ngram)
+        pairs_query = pairs_query.join( NgramX
+                                      , NgramX.id == NodeNgramX.ngram_id
+                                      )
+        if n_min is not None:
+            pairs_query = pairs_query.filter(NgramX.n >= n_min)
+        if n_max is not None:
+            pairs_query = pairs_query.filter(NgramX.n <= n_max)
+
+    if start is not None:
+        date_start = datetime.strptime (str(start), "%Y-%m-%d")
+        date_start_utc = date_start.strftime("%Y-%m-%d %H:%M:%S")
+        Start=aliased(NodeHyperdata)
+        pairs_query = (pairs_query.join( Start
+                                       , Start.node_id == Node.id
+                                       )
+                                  .filter( Start.key == 'publication_date')
+                                  .filter( Start.value_utc >= date_start_utc)
+                      )
+        parameters['start'] = date_start_utc
+
+    if end is not None:
+        date_end = datetime.strptime (str(end), "%Y-%m-%d")
+        date_end_utc = date_end.strftime("%Y-%m-%d %H:%M:%S")
+        End=aliased(NodeHyperdata)
+        pairs_query = (pairs_query.join( End
+                                       , End.node_id == Node.id
+                                       )
+                                  .filter( End.key == 'publication_date')
+                                  .filter( End.value_utc <= date_end_utc )
+                      )
+        parameters['end'] = date_end_utc
+
+    docs  = array('q')
+    forms = array('q')
+    for doc_id, ngram_id in ( pairs_query.execution_options(stream_results=True)
+                                         .yield_per(BATCH_COOCS_PAIRS_SIZE)
+                            ):
+        docs.append(doc_id)
+        forms.append(ngram_id)
+    parameters['MapList_id']   = str(mapList_id)
+    parameters['GroupList_id'] = str(groupList_id)
+
+    # monopartite cooc: ngram_x < ngram_y (<=> no diagonal, symmetry filter)
+    return coocs_from_pairs( np.array(docs,  dtype=np.int64)
+                           , np.array(forms, dtype=np.int64)
+                           , threshold       = threshold
+                           , symmetry_filter = True
+                           , diagonal_filter = True
+                           )
@@ -2,23 +2,28 @@ from gargantext.models     import Node, NodeNgram, NodeNgramNgram, \
                                   NodeHyperdata
 from gargantext.util.db    import session, aliased
 
-from graph.louvain         import best_partition
+from graph.communities     import best_partition
 
 from copy        import copy
+from array       import array
 from collections import defaultdict
 from math        import log,sqrt
 #from operator import itemgetter
 
 import math
 import numpy    as np
-import pandas   as pd
+from scipy      import sparse
 import networkx as nx
 
 def clusterByDistances( cooc_matrix
                , field1=None, field2=None
-               , distance=None):
+               , distance=None
+               , partition=None):
     '''
     clusterByDistance :: Coocs[nga, ngb => ccweight] -> (Graph, Partition, {ids}, {weight})
+
+    partition: optional warm start for the communities (ex: the previous
+               partition of the same graph with another bridgeness)
     '''
 
     # implicit global session
@@ -32,10 +37,8 @@ def clusterByDistances( cooc_matrix
     labels = dict()
     weight = dict()
 
-    for cooc in cooc_matrix.items:
-        ngram1_id = cooc[0]
-        ngram2_id = cooc[1]
-        ccweight = cooc_matrix.items[cooc]
+    # NB: SparseWeightedMatrix.items builds a new dict at each access
+    for (ngram1_id, ngram2_id), ccweight in cooc_matrix.items.items():
 
         matrix[ngram1_id][ngram2_id] = ccweight
         matrix[ngram2_id][ngram1_id] = ccweight
@@ -46,142 +49,16 @@ def clusterByDistances( cooc_matrix
         weight[ngram1_id] = weight.get(ngram1_id, 0) + ccweight
         weight[ngram2_id] = weight.get(ngram2_id, 0) + ccweight
 
-    x = pd.DataFrame(matrix).fillna(0)
-
     if distance == 'conditional':
-        x = x / x.sum(axis=1)
-        #y = y / y.sum(axis=0)
-
-        xs = x.sum(axis=1) - x
-        ys = x.sum(axis=0) - x
-
-        # top inclus ou exclus
-        n = ( xs + ys) / (2 * (x.shape[0] - 1))
-        # top generic or specific
-        m = ( xs - ys) / (2 * (x.shape[0] - 1))
-
-        n = n.sort_index(inplace=False)
-        m = m.sort_index(inplace=False)
-
-        nodes_included = 10000 #int(round(size/20,0))
-        #nodes_excluded = int(round(size/10,0))
-
-        nodes_specific = 10000 #int(round(size/10,0))
-        #nodes_generic = int(round(size/10,0))
-
-        # TODO use the included score for the node size
-        n_index = pd.Index.intersection(x.index, n.index[:nodes_included])
-        # Generic:
-        #m_index = pd.Index.intersection(x.index, m.index[:nodes_generic])
-        # Specific:
-        m_index = pd.Index.intersection(x.index, m.index[-nodes_specific:])
-        #m_index = pd.Index.intersection(x.index, n.index[:nodes_included])
-
-        x_index = pd.Index.union(n_index, m_index)
-        xx = x[list(x_index)].T[list(x_index)]
-
-        # Removing unconnected nodes
-        xxx = xx.values
-        threshold = min(xxx.max(axis=1))
-        matrix_filtered = np.where(xxx >= threshold, xxx, 0)
-        #matrix_filtered = matrix_filtered.resize((90,90))
-
-        G = nx.from_numpy_matrix(np.matrix(matrix_filtered))
-        G = nx.relabel_nodes(G, dict(enumerate([ ids[id_][1] for id_ in list(xx.columns)])))
+        G = conditional_graph(matrix)
 
     elif distance == 'cosine':
-        scd = defaultdict(lambda : defaultdict(int))
-
-        for i in matrix.keys():
-            for j in matrix.keys():
-                numerator = sum(
-                                [
-                                matrix[i][k] * matrix[j][k]
-                                    for k in matrix.keys()
-                                    if i != j and k != i and k != j
-                                ]
-                            )
-
-                denominator  = sqrt(
-                                    sum([
-                                    matrix[i][k]
-                                        for k in matrix.keys()
-                                        if k != i and k != j #and matrix[i][k] > 0
-                                       ])
-                                    *
-                                    sum([
-                                    matrix[i][k]
-                                        for k in matrix.keys()
-                                        if k != i and k != j #and matrix[i][k] > 0
-                                       ])
-
-                               )
-
-                try:
-                    scd[i][j] = numerator / denominator
-                except Exception as error:
-                    scd[i][j] = 0
-
-        minmax = min([ max([ scd[i][j] for i in scd.keys()]) for j in scd.keys()])
-
-        G = nx.DiGraph()
-        G.add_edges_from(
-                          [
-                            (i, j, {'weight': scd[i][j]})
-                                for i in scd.keys() for j in scd.keys()
-                                if i != j and scd[i][j] > minmax and scd[i][j] > scd[j][i]
-                          ]
-                        )
-
-
+        keys, dense = _dense_matrix(matrix)
+        G = _minmax_graph(keys, cosine_scores(dense))
 
     elif distance == 'distributional':
-        mi = defaultdict(lambda : defaultdict(int))
-        total_cooc = x.sum().sum()
-
-        for i in matrix.keys():
-            si = sum([matrix[i][j] for j in matrix[i].keys() if i != j])
-            for j in matrix[i].keys():
-                sj = sum([matrix[j][k] for k in matrix[j].keys() if j != k])
-                if i!=j :
-                    mi[i][j] = log( matrix[i][j] / ((si * sj) / total_cooc) )
-
-        r = defaultdict(lambda : defaultdict(int))
-
-        for i in matrix.keys():
-            for j in matrix.keys():
-                sumMin = sum(
-                                [
-                                min(mi[i][k], mi[j][k])
-                                    for k in matrix.keys()
-                                    if i != j and k != i and k != j and mi[i][k] > 0
-                                ]
-                            )
-
-                sumMi  = sum(
-                                [
-                                mi[i][k]
-                                    for k in matrix.keys()
-                                    if k != i and k != j and mi[i][k] > 0
-                                ]
-                            )
-
-                try:
-                    r[i][j] = sumMin / sumMi
-                except Exception as error:
-                    r[i][j] = 0
-
-        # Need to filter the weak links, automatic threshold here
-        minmax = min([ max([ r[i][j] for i in r.keys()]) for j in r.keys()])
-
-        G = nx.DiGraph()
-        G.add_edges_from(
-                          [
-                            (i, j, {'weight': r[i][j]})
-                                for i in r.keys() for j in r.keys()
-                                if i != j and r[i][j] > minmax and r[i][j] > r[j][i]
-                          ]
-                        )
+        keys, dense = _dense_matrix(matrix)
+        G = _minmax_graph(keys, distributional_scores(dense))
 
 #        degree_max = max([(n, d) for n,d in G.degree().items()], key=itemgetter(1))[1]
 #        nodes_to_remove = [n for (n,d) in G.degree().items() if d <= round(degree_max/2)]
@@ -214,6 +91,162 @@ def clusterByDistances( cooc_matrix
 #        G.remove_edges_from([ e[0] for e in n_edges_sorted[10:]])
 
     G.remove_nodes_from(nx.isolates(G))
-    partition = best_partition(G.to_undirected())
+    partition = best_partition(G.to_undirected(), partition=partition)
+    print("GRAPH ... communities timings: %s" % best_partition.timings)
 
     return(G,partition,ids,weight)
+
+
+def conditional_graph(matrix, nodes_included=10000, nodes_specific=10000):
+    '''
+    'conditional' distance of clusterByDistances, kept in CSR form:
+
+        x[i,j] = M[i,j] / sum_k M[i,k]           (conditional probability)
+
+    with the automatic threshold min_i(max_j x[i,j]), then the links are
+    added to an undirected graph straight from the nonzeros (in row order,
+    so for i > j x[i,j] is the weight of the link, like from_numpy_matrix)
+
+    NB: above nodes_included + nodes_specific terms, only the first
+        nodes_included and the last nodes_specific (by ngram id) are kept
+    '''
+    keys = sorted(matrix.keys())
+    n = len(keys)
+    index = {key: i for i, key in enumerate(keys)}
+
+    rows, cols, values = array('q'), array('q'), array('d')
+    for i, row in matrix.items():
+        for j, ccweight in row.items():
+            rows.append(index[i])
+            cols.append(index[j])
+            values.append(ccweight)
+    x = sparse.coo_matrix( ( np.array(values, dtype=np.float64)
+                           , ( np.array(rows, dtype=np.int64)
+                             , np.array(cols, dtype=np.int64)))
+                         , shape = (n, n)
+                         ).tocsr()
+    x.sum_duplicates()
+    x.sort_indices()
+
+    # conditional probability (NB: division for the same rounding as before)
+    sums = np.asarray(x.sum(axis=1)).ravel()
+    x.data = x.data / np.repeat(sums, np.diff(x.indptr))
+
+    kept = np.arange(n)
+    if n > nodes_included + nodes_specific:
+        kept = np.concatenate((kept[:nodes_included], kept[-nodes_specific:]))
+        x = x[kept][:, kept]
+
+    # automatic threshold (NB: with x >= 0, the max of an empty row is 0)
+    threshold = np.asarray(x.max(axis=1).todense()).ravel().min() if len(kept) else 0
+    x.data[x.data < threshold] = 0
+    x.eliminate_zeros()
+
+    links = x.tocoo()
+    G = nx.Graph()
+    G.add_nodes_from(keys[k] for k in kept.tolist())
+    G.add_edges_from(
+                      (keys[kept[i]], keys[kept[j]], {'weight': weight})
+                          for i, j, weight in zip( links.row.tolist()
+                                                 , links.col.tolist()
+                                                 , links.data.tolist())
+                    )
+    return G
+
+
+def _dense_matrix(matrix):
+    '''
+    {i => {j => ccweight}} => (keys, N x N array) (rows/cols in keys order)
+    '''
+    keys  = list(matrix.keys())
+    index = {key: i for i, key in enumerate(keys)}
+    dense = np.zeros((len(keys), len(keys)))
+    for i, row in matrix.items():
+        for j, ccweight in row.items():
+            dense[index[i], index[j]] = ccweight
+    return keys, dense
+
+
+def cosine_scores(M):
+    '''
+    Vectorized 'cosine' distance of clusterByDistances on the symmetric
+    cooc matrix M (N x N array):
+
+        scd[i,j] = sum_{k != i,j} M[i,k] * M[k,j]
+                   -------------------------------
+                       sum_{k != i,j} M[i,k]
+
+    (0 if i == j or if the denominator is 0)
+    '''
+    diagonal = np.diag(M)
+    numerator = M.dot(M) - diagonal[:, None] * M - M * diagonal[None, :]
+    denominator = M.sum(axis=1)[:, None] - diagonal[:, None] - M
+
+    scd = np.zeros(M.shape)
+    np.divide(numerator, denominator, out=scd, where=denominator != 0)
+    np.fill_diagonal(scd, 0)
+    return scd
+
+
+def distributional_scores(M):
+    '''
+    Vectorized 'distributional' distance of clusterByDistances on the
+    symmetric cooc matrix M (N x N array):
+
+        mi[i,j] = log( M[i,j] / (s_i * s_j / total) )     (if M[i,j] > 0 and i != j)
+                  with s_i the row sums without diagonal
+
+        r[i,j] = sum_{k != i,j ; mi[i,k] > 0} min(mi[i,k], mi[j,k])
+                 --------------------------------------------------
+                      sum_{k != i,j ; mi[i,k] > 0} mi[i,k]
+
+    (0 if i == j or if the denominator is 0)
+
+    NB: the min-sum is computed row by row on the positive mi of the row
+        (cost ~ N x number of positive mi, memory ~ N x row degree)
+    '''
+    n = M.shape[0]
+    total_cooc = M.sum()
+    s = M.sum(axis=1) - np.diag(M)
+
+    links = (M > 0) & ~ np.eye(n, dtype=bool)
+    mi = np.zeros(M.shape)
+    expected = np.outer(s, s) / total_cooc
+    mi[links] = np.log(M[links] / expected[links])
+
+    positive_mi = np.where(mi > 0, mi, 0)
+    sum_mi = positive_mi.sum(axis=1)[:, None] - positive_mi
+
+    sum_min = np.zeros(M.shape)
+    for i in range(n):
+        cols = np.nonzero(mi[i] > 0)[0]
+        if len(cols):
+            # NB: k == j gives min(mi[i,j], mi[j,j] = 0) = 0, k == i is not in cols
+            sum_min[i] = np.minimum(mi[i, cols][None, :], mi[:, cols]).sum(axis=1)
+
+    r = np.zeros(M.shape)
+    np.divide(sum_min, sum_mi, out=r, where=sum_mi != 0)
+    np.fill_diagonal(r, 0)
+    return r
+
+
+def _minmax_graph(keys, scores):
+    '''
+    Automatic threshold of the cosine and distributional distances:
+    keeps the edges i -> j with scores[i,j] > min_j(max_i scores[i,j])
+    and scores[i,j] > scores[j,i]
+    '''
+    G = nx.DiGraph()
+    if not len(keys):
+        return G
+    minmax = scores.max(axis=0).min()
+    kept = (scores > minmax) & (scores > scores.T)
+    np.fill_diagonal(kept, False)
+    rows, cols = np.nonzero(kept)
+    G.add_edges_from(
+                      [
+                        (keys[i], keys[j], {'weight': float(scores[i, j])})
+                            for i, j in zip(rows.tolist(), cols.tolist())
+                      ]
+                    )
+    return G
@@ -4,7 +4,8 @@ from gargantext.util.lists        import WeightedMatrix, UnweightedList, Transla
 from gargantext.util.http         import JsonHttpResponse
 from gargantext.models            import Node, Ngram, NodeNgram, NodeNgramNgram, NodeHyperdata
 
-from graph.cooccurrences          import countCooccurrences
+from graph.cooccurrences          import countCooccurrences, saveCooccurrences
+from graph.cache                  import graph_cache, graph_fingerprint
 from graph.distances              import clusterByDistances
 from graph.bridgeness             import filterByBridgeness
 from graph.mail_notification      import notify_owner
@@ -41,39 +42,81 @@ def compute_graph( corpus_id=None      , cooc_id=None
         3) filter By Bridgeness (function filterByBridgeness)
                 main parameter: bridgeness
 
+        NB: the results of 1), 2) and 3) are kept in graph_cache
+            (see graph/cache.py) for the same parameters and lists contents
+
         4) format the graph     (formatGraph)
                 main parameter: format_
         '''
 
-        print("GRAPH # ... Computing cooccurrences.")
-        (cooc_id, cooc_matrix) = countCooccurrences( corpus_id=corpus_id, cooc_id=cooc_id
-                                    , field1=field1, field2=field2
-                                    , start=start           , end =end
-                                    , mapList_id=mapList_id , groupList_id=groupList_id
-                                    , isMonopartite=True    , threshold = threshold
-                                    , distance=distance     , bridgeness=bridgeness
-                                    , save_on_db = True     , reset = reset
-                                    )
-        print("GRAPH #%d ... Cooccurrences computed." % (cooc_id))
-
-
-        print("GRAPH #%d ... Clustering with %s distance." % (cooc_id,distance))
-        G, partition, ids, weight = clusterByDistances ( cooc_matrix
-                                                       , field1="ngrams", field2="ngrams"
-                                                       , distance=distance
-                                                       )
-
-        print("GRAPH #%d ... Filtering by bridgeness %d." % (cooc_id, bridgeness))
-        data = filterByBridgeness(G,partition,ids,weight,bridgeness,"node_link",field1,field2)
-        
-        if start is not None and end is not None:
-            growth= dict()
-            for (ng_id, score) in compute_growth(corpus_id, groupList_id, mapList_id, start, end):
-                growth[ng_id] = float(score) + 100 # for the normalization, should not be negativ
-
-            for node in data['nodes']:
-                node['attributes']['growth'] = growth[node['id']]
-        
+        # cached results of the same parameters and lists contents (if any)
+        cooc_key  = graph_fingerprint( corpus_id, field1, field2
+                                     , start, end
+                                     , mapList_id, groupList_id
+                                     , isMonopartite, threshold
+                                     )
+        distance_key = (cooc_key, distance)
+        json_key     = (cooc_key, distance, bridgeness)
+
+        cached_cooc = graph_cache.get('cooc', cooc_key)
+        if cached_cooc is not None and cooc_id is None:
+            cooc_id = cached_cooc[0]
+        node = None
+        if cached_cooc is not None:
+            node = session.query(Node).filter(Node.id == cooc_id).first()
+
+        if node is not None:
+            (cached_id, cooc_matrix) = cached_cooc
+            print("GRAPH #%d ... Cooccurrences from cache." % cooc_id)
+            if cooc_id != cached_id and reset:
+                cached_node = session.query(Node).filter(Node.id == cached_id).first()
+                parameters  = dict(cached_node.hyperdata.get("parameters", {})
+                                   if cached_node is not None else {})
+                saveCooccurrences(cooc_id, cooc_matrix, parameters)
+        else:
+            print("GRAPH # ... Computing cooccurrences.")
+            (cooc_id, cooc_matrix) = countCooccurrences( corpus_id=corpus_id, cooc_id=cooc_id
+                                        , field1=field1, field2=field2
+                                        , start=start           , end =end
+                                        , mapList_id=mapList_id , groupList_id=groupList_id
+                                        , isMonopartite=True    , threshold = threshold
+                                        , distance=distance     , bridgeness=bridgeness
+                                        , save_on_db = True     , reset = reset
+                                        )
+            graph_cache.put('cooc', cooc_key, (cooc_id, cooc_matrix))
+            print("GRAPH #%d ... Cooccurrences computed." % (cooc_id))
+
+        cached_json = graph_cache.get('json', json_key)
+
+        if cached_json is None:
+            clustered = graph_cache.get('distance', distance_key)
+            if clustered is None:
+                print("GRAPH #%d ... Clustering with %s distance." % (cooc_id,distance))
+                clustered = clusterByDistances ( cooc_matrix
+                                               , field1="ngrams", field2="ngrams"
+                                               , distance=distance
+                                               , partition=previous_partition(cooc_id, distance, reset)
+                                               )
+                graph_cache.put('distance', distance_key, clustered)
+            G, partition, ids, weight = clustered
+
+            print("GRAPH #%d ... Filtering by bridgeness %d." % (cooc_id, bridgeness))
+            data = filterByBridgeness(G,partition,ids,weight,bridgeness,"node_link",field1,field2)
+
+            if start is not None and end is not None:
+                growth= dict()
+                for (ng_id, score) in compute_growth(corpus_id, groupList_id, mapList_id, start, end):
+                    growth[ng_id] = float(score) + 100 # for the normalization, should not be negativ
+
+                for node in data['nodes']:
+                    node['at']['growth'] = growth[node['id']]
+
+            (n_nodes, n_edges) = (len(G.nodes()), len(G.edges()))
+            graph_cache.put('json', json_key, (data, n_nodes, n_edges))
+        else:
+            print("GRAPH #%d ... Graph from cache." % cooc_id)
+            (data, n_nodes, n_edges) = cached_json
+
         print("GRAPH #%d ... Saving Graph in hyperdata as json." % cooc_id)
         node = session.query(Node).filter(Node.id == cooc_id).first()
 
@@ -83,8 +126,8 @@ def compute_graph( corpus_id=None      , cooc_id=None
 
         node.hyperdata[distance][bridgeness] = data
 
-        node.hyperdata[distance]["nodes"]    = len(G.nodes())
-        node.hyperdata[distance]["edges"]    = len(G.edges())
+        node.hyperdata[distance]["nodes"]    = n_nodes
+        node.hyperdata[distance]["edges"]    = n_edges
 
         node.save_hyperdata()
         session.commit()
@@ -96,6 +139,25 @@ def compute_graph( corpus_id=None      , cooc_id=None
         print("GRAPH #%d ... Returning data as json." % cooc_id)
         return data
 
+def previous_partition(cooc_id, distance, reset=False):
+    '''
+    Communities of a graph already saved with the same distance and another
+    bridgeness on the cooc node (None if none or if the coocs were reset),
+    used as warm start for the communities detection
+    '''
+    if reset:
+        return None
+    node = session.query(Node).filter(Node.id == cooc_id).first()
+    if node is None:
+        return None
+    for bridgeness, data in node.hyperdata.get(distance, {}).items():
+        if isinstance(data, dict) and data.get('nodes'):
+            # NB: 'at' and 'cl' in the compact format (cf. compress_graph)
+            return { graph_node['id'] : graph_node['at']['cl'] if 'at' in graph_node
+                                        else graph_node['attributes']['clust_default']
+                        for graph_node in data['nodes'] }
+    return None
+
 def get_graph( request=None         , corpus=None
             , field1='ngrams'       , field2='ngrams'
             , mapList_id = None     , groupList_id = None
@@ -469,9 +469,11 @@ class Status :
             for node in graph.nodes() :
                 com = part[node]
                 self.node2com[node] = com
-                deg = float(graph.degree(node, weigh = 'weight'))
+                deg = float(graph.degree(node, weight = 'weight'))
                 self.degrees[com] = self.degrees.get(com, 0) + deg
                 self.gdegrees[node] = deg
+                self.loops[node] = float(graph.get_edge_data(node, node,
+                                                 {"weight":0}).get("weight", 1))
                 inc = 0.
                 for neighbor, datas in tuple(graph[node].items()) :
                     weight = datas.get("weight", 1)
@@ -12,11 +12,19 @@ def compress_graph(graphdata):
     result format:
         "nodes": [{"id":4103, "at":{"cl": 0}, "s":29, "lb":"regard"},...]
         "links": [{"t": 998,"s": 768,"w": 0.042},...]
+
+    NB: filterByBridgeness now directly builds this result format, so this
+        only changes the graphs saved before (the others are left as is)
     """
     for link in graphdata['links']:
-        link['w'] = format(link['w'], '.3f')   # keep only 3 decimals
+        if not isinstance(link['w'], str):
+            link['w'] = format(link['w'], '.3f')   # keep only 3 decimals
 
     for node in graphdata['nodes']:
+        if 'label' not in node:
+            # already in the compact format
+            continue
+
         node['lb'] = node['label']
         del node['label']
         
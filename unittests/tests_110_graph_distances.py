@@ -0,0 +1,162 @@
+"""
+GRAPH DISTANCES: VECTORIZED VS REFERENCE LOOPS
+==============================================
+Checks that the numpy versions of the 'cosine' and 'distributional'
+distances (graph/distances.py) give the same scores and the same graph
+as the former pure python loops (copied below), then prints the timings.
+
+Same for the sparse 'conditional' distance vs the former dense DataFrames.
+
+    ./manage.py test unittests.tests_110_graph_distances -v 2
+"""
+from django.test import TestCase
+
+from collections import defaultdict
+from math        import log, sqrt
+from random      import Random
+from time        import time
+
+import numpy    as np
+import pandas   as pd
+import networkx as nx
+
+
+def random_cooc_matrix(n_terms, density=.1, seed=0):
+    """
+    Same structure as the matrix built in clusterByDistances
+    (symmetric, no diagonal) from random cooc counts
+    """
+    rand = Random(seed)
+    matrix = defaultdict(lambda : defaultdict(float))
+    for i in range(n_terms):
+        for j in range(i+1, n_terms):
+            if rand.random() < density:
+                ccweight = rand.randint(1, 20)
+                matrix[i][j] = ccweight
+                matrix[j][i] = ccweight
+    return matrix
+
+
+def reference_cosine(matrix):
+    scd = defaultdict(lambda : defaultdict(int))
+    for i in matrix.keys():
+        for j in matrix.keys():
+            numerator = sum([ matrix[i][k] * matrix[j][k]
+                                for k in matrix.keys()
+                                if i != j and k != i and k != j ])
+            denominator = sqrt( sum([ matrix[i][k] for k in matrix.keys()
+                                                   if k != i and k != j ])
+                              * sum([ matrix[i][k] for k in matrix.keys()
+                                                   if k != i and k != j ]) )
+            try:
+                scd[i][j] = numerator / denominator
+            except Exception as error:
+                scd[i][j] = 0
+    return scd
+
+
+def reference_distributional(matrix):
+    mi = defaultdict(lambda : defaultdict(int))
+    total_cooc = sum(sum(row.values()) for row in matrix.values())
+    for i in matrix.keys():
+        si = sum([matrix[i][j] for j in matrix[i].keys() if i != j])
+        for j in matrix[i].keys():
+            sj = sum([matrix[j][k] for k in matrix[j].keys() if j != k])
+            if i!=j :
+                mi[i][j] = log( matrix[i][j] / ((si * sj) / total_cooc) )
+
+    r = defaultdict(lambda : defaultdict(int))
+    for i in matrix.keys():
+        for j in matrix.keys():
+            sumMin = sum([ min(mi[i][k], mi[j][k]) for k in matrix.keys()
+                             if i != j and k != i and k != j and mi[i][k] > 0 ])
+            sumMi  = sum([ mi[i][k] for k in matrix.keys()
+                             if k != i and k != j and mi[i][k] > 0 ])
+            try:
+                r[i][j] = sumMin / sumMi
+            except Exception as error:
+                r[i][j] = 0
+    return r
+
+
+def reference_edges(scores):
+    minmax = min([ max([ scores[i][j] for i in scores.keys()]) for j in scores.keys()])
+    return { (i, j) : scores[i][j]
+                for i in scores.keys() for j in scores.keys()
+                if i != j and scores[i][j] > minmax and scores[i][j] > scores[j][i] }
+
+
+def reference_conditional(matrix):
+    x = pd.DataFrame(matrix).fillna(0)
+    x = x / x.sum(axis=1)
+    xs = x.sum(axis=1) - x
+    ys = x.sum(axis=0) - x
+    n = ( xs + ys) / (2 * (x.shape[0] - 1))
+    m = ( xs - ys) / (2 * (x.shape[0] - 1))
+    n = n.sort_index(inplace=False)
+    m = m.sort_index(inplace=False)
+    n_index = pd.Index.intersection(x.index, n.index[:10000])
+    m_index = pd.Index.intersection(x.index, m.index[-10000:])
+    x_index = pd.Index.union(n_index, m_index)
+    xx = x[list(x_index)].T[list(x_index)]
+    xxx = xx.values
+    threshold = min(xxx.max(axis=1))
+    matrix_filtered = np.where(xxx >= threshold, xxx, 0)
+    G = nx.from_numpy_matrix(np.matrix(matrix_filtered))
+    G = nx.relabel_nodes(G, dict(enumerate(list(xx.columns))))
+    return G
+
+
+class GraphDistancesTestCase(TestCase):
+
+    def compare(self, reference, vectorized, n_terms, seed):
+        from graph.distances import _dense_matrix, _minmax_graph
+        matrix = random_cooc_matrix(n_terms, seed=seed)
+
+        t0 = time()
+        expected = reference(matrix)
+        expected_edges = reference_edges(expected)
+        t1 = time()
+        keys, dense = _dense_matrix(matrix)
+        scores = vectorized(dense)
+        G = _minmax_graph(keys, scores)
+        t2 = time()
+
+        for a, i in enumerate(keys):
+            for b, j in enumerate(keys):
+                self.assertAlmostEqual(scores[a, b], expected[i][j], places=9)
+        edges = {(i, j): data['weight'] for i, j, data in G.edges(data=True)}
+        self.assertEqual(set(edges), set(expected_edges))
+        return t1 - t0, t2 - t1
+
+    def benchmark(self, reference, vectorized, name):
+        for n_terms in (25, 50, 100, 150):
+            old_time, new_time = self.compare(reference, vectorized, n_terms, seed=n_terms)
+            print("%s %4i terms: loops %8.3fs  numpy %8.3fs" % (name, n_terms, old_time, new_time))
+
+    def test_111_cosine(self):
+        '''cosine: same scores and edges as the loops'''
+        from graph.distances import cosine_scores
+        self.benchmark(reference_cosine, cosine_scores, "cosine")
+
+    def test_112_distributional(self):
+        '''distributional: same scores and edges as the loops'''
+        from graph.distances import distributional_scores
+        self.benchmark(reference_distributional, distributional_scores, "distributional")
+
+    def test_113_conditional(self):
+        '''conditional: same graph as the dense DataFrames'''
+        from graph.distances import conditional_graph
+        for n_terms in (25, 50, 100, 400):
+            matrix = random_cooc_matrix(n_terms, seed=n_terms)
+            t0 = time()
+            expected = reference_conditional(matrix)
+            t1 = time()
+            G = conditional_graph(matrix)
+            t2 = time()
+            self.assertEqual(set(G.nodes()), set(expected.nodes()))
+            self.assertEqual( set(frozenset(edge) for edge in G.edges())
+                            , set(frozenset(edge) for edge in expected.edges()))
+            for i, j, data in G.edges(data=True):
+                self.assertAlmostEqual(data['weight'], expected[i][j]['weight'], places=12)
+            print("conditional %4i terms: dense %8.3fs  sparse %8.3fs" % (n_terms, t1 - t0, t2 - t1))
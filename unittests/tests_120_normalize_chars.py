@@ -0,0 +1,185 @@
+"""
+NORMALIZE_CHARS: TRANSLATION TABLE VS REFERENCE REGEXPS
+======================================================
+Checks that normalize_chars (toolchain/parsing.py, one translation pass
++ a few regexps) gives exactly the same strings as the former sequence
+of re.sub (copied below) on:
+    - the lines of the mini test samples
+    - every special character alone and between words and spaces
+    - random mixes of special characters, words and spaces
+then prints the timings.
+
+    ./manage.py test unittests.tests_120_normalize_chars -v 2
+"""
+from django.test import TestCase
+
+from os          import listdir
+from os.path     import dirname, join
+from random      import Random
+from re          import sub
+from time        import time
+
+DATA_SAMPLE_DIR = join(dirname(__file__), "mini_test_samples")
+
+# all the characters handled by the reference (+ a few ordinary ones)
+SPECIAL_CHARS = ( [chr(c) for c in range(0x20)]
+                + list('\x7f\x85\x92\x9c\xa0\xaf\u1680\u180e\u2028\u2029\u202f\u205f\u3000\ufeff')
+                + [chr(c) for c in range(0x2000, 0x200C)]
+                + list('‐‑‒–—―−﹣-‘’‚`‛‹›“”„‟«»"\'…€▪►●◘→•·')
+                + list('ꜲꜳÆæǱǲǳﬃﬀﬁﬄﬂﬅĲĳǇǉǊǌŒœﬆꜨꜩ')
+                )
+
+
+def reference_normalize_chars(my_str):
+    """
+    normalize_chars before the translation table (copied as it was)
+    """
+    # print('normalize_chars  IN: "%s"' % my_str)
+    # --------------
+    # E S P A C E S
+    # --------------
+    # tous les caractères de contrôle (dont \t = \x{0009}, \n = \x{000A} et \r = \x{000D}) --> espace
+    my_str = sub(r'[\u0000\u0001\u0002\u0003\u0004\u0005\u0006\u0007\u0008\u0009\u000A\u000B\u000C\u000D\u000E\u000F\u0010\u0011\u0012\u0013\u0014\u0015\u0016\u0017\u0018\u0019\u001A\u001B\u001C\u001D\u001E\u001F\u007F]', ' ', my_str)
+
+    # Line separator
+    my_str = sub(r'\u2028',' ', my_str)
+    my_str = sub(r'\u2029',' ', my_str)
+
+    # U+0092: parfois quote parfois cara de contrôle
+    my_str = sub(r'\u0092', ' ', my_str)
+
+    # tous les espaces alternatifs --> espace
+    my_str = sub(r'[\u00A0\u1680\u180E\u2000\u2001\u2002\u2003\u2004\u2005\u2006\u2007\u2008\u2009\u200A\u200B\u202F\u205F\u3000\uFEFF]', ' ' , my_str)
+
+    # pour finir on enlève les espaces en trop
+    # (dits "trailing spaces")
+    my_str = sub(r'\s+', ' ', my_str)
+    my_str = sub(r'^\s', '', my_str)
+    my_str = sub(r'\s$', '', my_str)
+
+    # ------------------------
+    # P O N C T U A T I O N S
+    # ------------------------
+    # la plupart des tirets alternatifs --> tiret normal (dit "du 6")
+    # (dans l'ordre U+002D U+2010 U+2011 U+2012 U+2013 U+2014 U+2015 U+2212 U+FE63)
+    my_str = sub(r'[‐‑‒–—―−﹣]','-', my_str)
+
+    # le macron aussi parfois comme tiret
+    my_str = sub(r'\u00af','-', my_str)
+
+    # Guillemets
+    # ----------
+    # la plupart des quotes simples --> ' APOSTROPHE
+    my_str = sub(r"[‘’‚`‛]", "'", my_str) # U+2018 U+2019 U+201a U+201b
+    my_str = sub(r'‹ ?',"'", my_str)    # U+2039 plus espace éventuel après
+    my_str = sub(r' ?›',"'", my_str)    # U+203A plus espace éventuel avant
+
+    # la plupart des quotes doubles --> " QUOTATION MARK
+    my_str = sub(r'[“”„‟]', '"', my_str)  # U+201C U+201D U+201E U+201F
+    my_str = sub(r'« ?', '"', my_str)   # U+20AB plus espace éventuel après
+    my_str = sub(r' ?»', '"', my_str)   # U+20AB plus espace éventuel avant
+
+    # deux quotes simples (préparées ci-dessus) => une double
+    my_str = sub(r"''", '"', my_str)
+
+    # Autres
+    # -------
+    my_str = sub(r'…', '...', my_str)
+    # paragraph separator utilisé parfois comme '...'
+    my_str = sub(r'\u0085', '...', my_str)
+    my_str = sub(r'€', 'EUR', my_str)
+
+    # quelques puces courantes (bullets)
+    my_str = sub(r'▪', '*', my_str)
+    my_str = sub(r'►', '*', my_str)
+    my_str = sub(r'●', '*', my_str)
+    my_str = sub(r'◘', '*', my_str)
+    my_str = sub(r'→', '*', my_str)
+    my_str = sub(r'•', '*', my_str)
+    my_str = sub(r'·', '*', my_str)
+
+    # ------------------
+    # L I G A T U R E S
+    # ------------------
+    my_str = sub(r'Ꜳ', 'AA', my_str)
+    my_str = sub(r'ꜳ', 'aa', my_str)
+    my_str = sub(r'Æ', 'AE', my_str)
+    my_str = sub(r'æ', 'ae', my_str)
+    my_str = sub(r'Ǳ', 'DZ', my_str)
+    my_str = sub(r'ǲ', 'Dz', my_str)
+    my_str = sub(r'ǳ', 'dz', my_str)
+    my_str = sub(r'ﬃ', 'ffi', my_str)
+    my_str = sub(r'ﬀ', 'ff', my_str)
+    my_str = sub(r'ﬁ', 'fi', my_str)
+    my_str = sub(r'ﬄ', 'ffl', my_str)
+    my_str = sub(r'ﬂ', 'fl', my_str)
+    my_str = sub(r'ﬅ', 'ft', my_str)
+    my_str = sub(r'Ĳ', 'IJ', my_str)
+    my_str = sub(r'ĳ', 'ij', my_str)
+    my_str = sub(r'Ǉ', 'LJ', my_str)
+    my_str = sub(r'ǉ', 'lj', my_str)
+    my_str = sub(r'Ǌ', 'NJ', my_str)
+    my_str = sub(r'ǌ', 'nj', my_str)
+    my_str = sub(r'Œ', 'OE', my_str)
+    my_str = sub(r'œ', 'oe', my_str)
+    my_str = sub(r'\u009C', 'oe', my_str)   # U+009C (cara contrôle vu comme oe)
+    my_str = sub(r'ﬆ', 'st', my_str)
+    my_str = sub(r'Ꜩ', 'Tz', my_str)
+    my_str = sub(r'ꜩ', 'tz', my_str)
+
+    # print('normalize_chars OUT: "%s"' % my_str)
+
+    return my_str
+
+
+def sample_lines():
+    for format_dir in sorted(listdir(DATA_SAMPLE_DIR)):
+        for filename in sorted(listdir(join(DATA_SAMPLE_DIR, format_dir))):
+            with open(join(DATA_SAMPLE_DIR, format_dir, filename),
+                      encoding='UTF-8', errors='replace') as sample:
+                yield from sample
+
+
+def special_strings():
+    for char in SPECIAL_CHARS:
+        yield char
+        yield 'a%sb' % char
+        yield ' %s ' % char
+        yield 'le %s mot %s%s' % (char, char, char)
+
+
+def random_strings(n, seed=0):
+    rand = Random(seed)
+    alphabet = SPECIAL_CHARS + list('abc éà  ') * 4
+    for i in range(n):
+        yield ''.join(rand.choice(alphabet) for _ in range(rand.randint(0, 16)))
+
+
+class NormalizeCharsTestCase(TestCase):
+
+    def compare(self, strings):
+        from gargantext.util.toolchain.parsing import normalize_chars
+        strings = list(strings)
+        t0 = time()
+        expected = [reference_normalize_chars(my_str) for my_str in strings]
+        t1 = time()
+        results = [normalize_chars(my_str) for my_str in strings]
+        t2 = time()
+        for my_str, result, expected_result in zip(strings, results, expected):
+            self.assertEqual(result, expected_result, msg=repr(my_str))
+        return t1 - t0, t2 - t1
+
+    def test_121_samples(self):
+        '''same output on the lines of the test samples'''
+        lines = list(sample_lines())
+        old_time, new_time = self.compare(lines)
+        print("normalize_chars %5i sample lines: regexps %8.3fs  table %8.3fs"
+                % (len(lines), old_time, new_time))
+
+    def test_122_special_chars(self):
+        '''same output on each special char in context'''
+        self.compare(special_strings())
+
+    def test_123_random_mixes(self):
+        '''same output on random mixes of special chars'''
+        self.compare(random_strings(50000))
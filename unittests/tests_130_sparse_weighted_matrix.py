@@ -0,0 +1,108 @@
+"""
+SPARSE WEIGHTED MATRIX: OPERATORS VS WEIGHTEDMATRIX
+===================================================
+Checks that every operator of SparseWeightedMatrix (util/lists.py) gives
+the same pairs and values as WeightedMatrix on random data, with the
+other operand dense or sparse (ex: WeightedMatrix - SparseWeightedMatrix)
+
+No DB needed (the matrices and lists are built from python data)
+
+    ./manage.py test unittests.tests_130_sparse_weighted_matrix -v 2
+"""
+from django.test import SimpleTestCase
+
+from random import Random
+
+from gargantext.util.lists import WeightedMatrix, SparseWeightedMatrix, \
+                                  UnweightedList, WeightedList, Translations
+
+
+def random_triples(rand, n_keys=30, n_pairs=120):
+    pairs = set()
+    while len(pairs) < n_pairs:
+        pairs.add((rand.randrange(n_keys), rand.randrange(n_keys)))
+    return [(key1, key2, float(rand.randint(1, 20))) for key1, key2 in sorted(pairs)]
+
+
+def random_keys(rand, n_keys=30, n=10):
+    return rand.sample(range(n_keys), n)
+
+
+def as_dict(matrix):
+    return {(key1, key2): value for key1, key2, value in matrix if value != 0.0}
+
+
+class SparseWeightedMatrixTestCase(SimpleTestCase):
+
+    def assertSameMatrix(self, result, expected, operation):
+        self.assertIsNotNone(result, operation)
+        self.assertIsNot(result, NotImplemented, operation)
+        result, expected = as_dict(result), as_dict(expected)
+        self.assertEqual(set(result), set(expected), operation)
+        for key in expected:
+            self.assertAlmostEqual(result[key], expected[key], places=9, msg=operation)
+
+    def cases(self, n_cases=20):
+        for seed in range(n_cases):
+            rand = Random(seed)
+            yield rand, random_triples(rand), random_triples(rand)
+
+    def test_131_matrix_operators(self):
+        '''+ and - between matrices, for each dense/sparse combination'''
+        for rand, triples1, triples2 in self.cases():
+            for name, operator in (('+', lambda a, b: a + b),
+                                   ('-', lambda a, b: a - b)):
+                expected = operator(WeightedMatrix(triples1), WeightedMatrix(triples2))
+                for left in (WeightedMatrix, SparseWeightedMatrix):
+                    for right in (WeightedMatrix, SparseWeightedMatrix):
+                        self.assertSameMatrix(
+                            operator(left(triples1), right(triples2)),
+                            expected,
+                            '%s %s %s' % (left.__name__, name, right.__name__)
+                        )
+
+    def test_132_list_operators(self):
+        '''-, &, * and / with lists, * with translations'''
+        for rand, triples, _ in self.cases():
+            keys = random_keys(rand)
+            unweighted = UnweightedList(keys)
+            weighted = WeightedList((key, float(rand.randint(1, 5))) for key in keys)
+            translations = Translations(
+                (key, rand.randrange(30)) for key in random_keys(rand)
+            )
+            operations = (
+                ('- UnweightedList', lambda m: m - unweighted),
+                ('- WeightedList',   lambda m: m - weighted),
+                ('& UnweightedList', lambda m: m & unweighted),
+                ('& WeightedList',   lambda m: m & weighted),
+                ('* UnweightedList', lambda m: m * unweighted),
+                ('* WeightedList',   lambda m: m * weighted),
+                ('/ WeightedList',   lambda m: m.__div__(weighted)),
+                ('* Translations',   lambda m: m * translations),
+            )
+            for name, operation in operations:
+                self.assertSameMatrix(
+                    operation(SparseWeightedMatrix(triples)),
+                    operation(WeightedMatrix(triples)),
+                    'SparseWeightedMatrix %s' % name
+                )
+
+    def test_133_conversions(self):
+        '''dense => sparse => dense keeps the pairs and values'''
+        for rand, triples, _ in self.cases():
+            dense = WeightedMatrix(triples)
+            self.assertSameMatrix(dense.to_sparse(), dense, 'to_sparse')
+            self.assertSameMatrix(dense.to_sparse().to_weighted_matrix(), dense,
+                                  'to_weighted_matrix')
+
+    def test_134_add_triples(self):
+        '''running sum of partial counts = one matrix of all the rows'''
+        for rand, triples1, triples2 in self.cases():
+            merged = SparseWeightedMatrix()
+            for partial_count in (triples1, triples2, triples1[::3]):
+                merged.add_triples(partial_count)
+            self.assertSameMatrix(
+                merged,
+                SparseWeightedMatrix(triples1 + triples2 + triples1[::3]),
+                'add_triples'
+            )
@@ -0,0 +1,93 @@
+"""
+MELT PIPELINES: POOL, DEADLINE AND FALLBACK
+===========================================
+Checks the long-lived pipelines of MeltTagger.py (MELT_PIPELINES) with
+small perl scripts instead of the MElt ones:
+    - a pipeline dying while other threads wait for one
+    - a stage that never gives the end of a text back (deadline)
+    - the one-run-per-text fallback of MeltTagger._pipe
+
+No DB needed (but perl and the melttagger lib)
+
+    ./manage.py test unittests.tests_140_melt_pipelines -v 2
+"""
+from django.test import SimpleTestCase
+
+from concurrent.futures import ThreadPoolExecutor
+from os                 import chmod
+from os.path            import join
+from shutil             import rmtree
+from tempfile           import mkdtemp
+from time               import time
+from unittest.mock      import patch
+
+from gargantext.util.taggers import MeltTagger as melt
+
+# copies its input, but dies (after a while) on a 'die' line
+ECHO_SCRIPT = '''#!/usr/bin/perl
+while (<STDIN>) {
+    if (/^die$/) { sleep 1; exit 1; }
+    print;
+}
+'''
+
+# copies its input, except the end of the texts
+SWALLOW_SCRIPT = '''#!/usr/bin/perl
+while (<STDIN>) {
+    print unless /_GARG_BLOCK_END/;
+}
+'''
+
+
+class MeltPipelinesTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.dir = mkdtemp()
+        self.echo = self.script('echo.pl', ECHO_SCRIPT)
+        self.swallow = self.script('swallow.pl', SWALLOW_SCRIPT)
+
+    def tearDown(self):
+        rmtree(self.dir)
+
+    def script(self, name, source):
+        path = join(self.dir, name)
+        with open(path, 'w') as f:
+            f.write(source)
+        chmod(path, 0o755)
+        return path
+
+    def test_141_pipeline_dies_while_threads_wait(self):
+        '''the threads waiting for the only pipeline get a new one'''
+        pool = melt._PipelinePool(((self.echo, ), ), size=1, timeout=10)
+        self.addCleanup(pool.close)
+        with ThreadPoolExecutor(4) as executor:
+            dying = executor.submit(pool.process, 'die')
+            waiting = [executor.submit(pool.process, 'text %d' % i)
+                       for i in range(3)]
+            # (a hang would stop the test here)
+            results = [future.result(timeout=20) for future in waiting]
+        with self.assertRaises(RuntimeError):
+            dying.result(timeout=20)
+        self.assertEqual(results, ['text %d\n' % i for i in range(3)])
+        self.assertLessEqual(pool._started, 1)
+
+    def test_142_deadline(self):
+        '''a text that never comes back stops the pipeline'''
+        pool = melt._PipelinePool(((self.swallow, ), ), size=1, timeout=1)
+        start = time()
+        with self.assertRaises(RuntimeError):
+            pool.process('text')
+        self.assertLess(time() - start, 10)
+        self.assertEqual(pool._started, 0)
+
+    def test_143_fallback(self):
+        '''_pipe runs each script once for the text if the pipeline fails'''
+        tagger = melt.MeltTagger.__new__(melt.MeltTagger)
+        tagger.pool_size = 1
+        commands = ((self.swallow, ), (self.echo, ))
+        with patch.object(melt, 'MELT_PIPELINES', True), \
+             patch.dict(melt._pipelines_pools, {}):
+            pool = melt._PipelinePool(commands, 1, timeout=1)
+            self.addCleanup(pool.close)
+            melt._pipelines_pools[commands] = pool
+            self.assertEqual(tagger._pipe('one\ntwo', commands), 'one\ntwo')